@@ -0,0 +1,96 @@
+"""
+Dashboard aggregates computed in one vectorized pass over the ledger.
+
+Dates and amounts come already typed from the store's Ledger (parsed once when it
+is built); everything the Dashboard shows (monthly/category totals, daily/weekly
+series, budget pacing) is derived from small per-bucket series, so rendering cost
+tracks the number of buckets rather than the number of stored expenses.
+"""
+import calendar
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+class LedgerSummary:
+    """Per-day, per-week, per-month and per-category totals of a storage.ledger.Ledger."""
+
+    def __init__(self, ledger):
+        # The ledger's columns are already typed: no date or amount parsing here
+        valid = ~np.isnat(ledger.dates)
+        dates = pd.Series(ledger.dates[valid].astype("datetime64[s]"))
+        amounts = pd.Series(np.nan_to_num(ledger.amounts[valid], nan=0.0))
+        # Category codes to names, blank ones (and code -1) counted as Uncategorized
+        names = np.array([name or "Uncategorized" for name in ledger.categories.categories] + ["Uncategorized"],
+                         dtype=object)
+        categories = pd.Series(names[ledger.categories.codes[valid]])
+
+        days = dates.dt.normalize()
+        months = dates.dt.to_period("M")
+
+        # The only passes over raw rows; everything below works on buckets
+        self.daily = amounts.groupby(days).sum().sort_index()
+        self.by_month_category = amounts.groupby([months, categories]).sum()
+
+        self.monthly = self.by_month_category.groupby(level=0).sum().sort_index()
+        self.by_category = self.by_month_category.groupby(level=1).sum().sort_values(ascending=False)
+        self.weekly = self.daily.groupby(self.daily.index.to_period("W")).sum()
+        self.count = int(valid.sum())
+
+    def monthly_total(self, year, month):
+        return float(self.monthly.get(pd.Period(year=year, month=month, freq="M"), 0.0))
+
+    def category_totals(self, year=None, month=None):
+        """Category totals for one month, or for all time when no month is given."""
+        if year is None:
+            return self.by_category
+        period = pd.Period(year=year, month=month, freq="M")
+        if period not in self.by_month_category.index.get_level_values(0):
+            return pd.Series(dtype=float)
+        return self.by_month_category.loc[period].sort_values(ascending=False)
+
+    def running_budget(self, year, month, budget):
+        """
+        Day-by-day spend for a month against a linear budget pace.
+        Columns: Spent, Cumulative, Budget Pace (index: every day of the month).
+        """
+        days_in_month = calendar.monthrange(year, month)[1]
+        index = pd.date_range(f"{year:04d}-{month:02d}-01", periods=days_in_month, freq="D")
+        spent = self.daily.reindex(index, fill_value=0.0)
+        pace = pd.Series(range(1, days_in_month + 1), index=index) * (budget / days_in_month)
+        return pd.DataFrame({"Spent": spent, "Cumulative": spent.cumsum(), "Budget Pace": pace})
+
+    def month_forecast(self, year, month, today):
+        """Projected month-end spend, extrapolating the average daily spend so far."""
+        days_in_month = calendar.monthrange(year, month)[1]
+        elapsed = min(today.day, days_in_month)
+        return self.monthly_total(year, month) / elapsed * days_in_month
+
+# Summaries memoized per store, valid for one ledger version
+_cache = weakref.WeakKeyDictionary()
+_cache_lock = threading.Lock()
+
+def summarize(store):
+    """
+    Returns the LedgerSummary of a store's ledger, recomputing only when store.version() changes.
+    Stores that do not track versions are summarized on every call.
+    """
+    version = store.version()
+    if version is not None:
+        with _cache_lock:
+            cached = _cache.get(store)
+        if cached is not None and cached[0] == version:
+            metrics.count("cache_hits", cache="ledger_summary")
+            return cached[1]
+
+    # Version read first: a write landing mid-computation just makes the next call recompute
+    metrics.count("cache_misses", cache="ledger_summary")
+    with metrics.timer("ledger_summary"):
+        summary = LedgerSummary(store.get_ledger())
+    if version is not None:
+        with _cache_lock:
+            _cache[store] = (version, summary)
+    return summary
@@ -1,15 +1,32 @@
 import streamlit as st
-import pandas as pd
 import datetime
-from PIL import Image
-import ocr_engine
+import io
+import os
+import re
+import sys
 import database
+import metrics
+
+# pandas, PIL and the OCR modules are imported by the pages that use them, so the first
+# paint of a fresh server does not wait for Tesseract bindings or dataframe machinery.
 
 # Page Setup
 st.set_page_config(page_title="SnapBudget", layout="wide")
 
+# Hidden Diagnostics page, turned on by whoever runs the server (SNAPBUDGET_DIAGNOSTICS=1),
+# never by a visitor: it turns on metrics collection for the process and traces each rerun.
+DIAGNOSTICS = os.environ.get("SNAPBUDGET_DIAGNOSTICS", "0") == "1"
+# Reruns whose breakdown the Diagnostics page keeps, per session.
+DIAGNOSTICS_RERUNS = 20
+if DIAGNOSTICS:
+    metrics.enable()
+    if os.environ.get("SNAPBUDGET_METRICS_PORT"):
+        # Prometheus scrape endpoint at /metrics (and /metrics.json)
+        metrics.serve(int(os.environ["SNAPBUDGET_METRICS_PORT"]))
+rerun_trace = metrics.start_trace()
+
 # FAANG-Level CSS
-st.markdown("""
+PAGE_STYLE = """
     <style>
     /* Import modern font */
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;800&display=swap');
@@ -79,6 +96,11 @@ st.markdown("""
         border-color: rgba(59, 130, 246, 0.3);
         color: #93C5FD;
     }
+    .alert-warning {
+        background-color: rgba(234, 179, 8, 0.2);
+        border-color: rgba(234, 179, 8, 0.3);
+        color: #FDE047;
+    }
     
     /* INPUT FIELDS */
     div[data-testid="stTextInput"] > div > div, 
@@ -145,10 +167,83 @@ st.markdown("""
     }
     
     </style>
-    """, unsafe_allow_html=True)
+"""
+
+@st.cache_resource
+def page_style():
+    """PAGE_STYLE without comments and indentation, built once per server and sent on every run."""
+    style = re.sub(r"/\*.*?\*/", "", PAGE_STYLE, flags=re.S)
+    style = re.sub(r"\s+", " ", style)
+    return re.sub(r"\s*([{};,>])\s*|(:)\s+", r"\1\2", style).strip()
+
+st.markdown(page_style(), unsafe_allow_html=True)
+
+# Expense categories offered in the Dashboard
+CATEGORIES = ["Uncategorized", "Food", "Transport", "Utilities", "Shopping", "Entertainment"]
+
+def show_storage_message(level, message):
+    """Shows storage errors from database.py on the page."""
+    if level == "error":
+        st.error(message)
+    elif level == "warning":
+        st.warning(message)
+    else:
+        st.info(message)
+
+# The store connects on first use by a page (see database.init_db), not on every run
+database.set_reporter(show_storage_message)
+
+def current_ocr_job(uploaded_file):
+    """
+    The background OCR job for the uploaded receipt. A new upload cancels the previous
+    file's job and submits its own. Returns None when the OCR queue is full.
+    """
+    import ocr_jobs
+
+    service = ocr_jobs.get_service()
+    current = st.session_state.get("ocr_job")
+    if current and current[0] == uploaded_file.file_id:
+        job = service.get(current[1])
+        if job is not None:
+            return job
+    if current:
+        service.cancel(current[1])
+    try:
+        job_id = service.submit(uploaded_file.getvalue())
+    except ocr_jobs.QueueFull:
+        st.session_state.pop("ocr_job", None)
+        return None
+    st.session_state["ocr_job"] = (uploaded_file.file_id, job_id)
+    return service.get(job_id)
+
+def upload_image_hash(uploaded_file):
+    """The dedup image hash of the uploaded receipt, computed once per file."""
+    import dedup
+    from PIL import Image
+
+    cached = st.session_state.get("upload_hash")
+    if cached and cached[0] == uploaded_file.file_id:
+        return cached[1]
+    image_hash = dedup.image_hash(Image.open(io.BytesIO(uploaded_file.getvalue())))
+    st.session_state["upload_hash"] = (uploaded_file.file_id, image_hash)
+    return image_hash
+
+def describe_duplicate(match):
+    """One line about a saved receipt an upload looks like."""
+    amount = f" for ${match['amount']:,.2f}" if match.get("amount") is not None else ""
+    saved_on = f" on {match['date']}" if match.get("date") else ""
+    return f"{match['name'] or 'a receipt'}, saved{saved_on}{amount}"
+
+@st.fragment(run_every=0.5)
+def ocr_progress(job_id):
+    """Polls a running OCR job without rerunning the page; reruns it once the result is in."""
+    import ocr_jobs
 
-# Initialize DB
-database.init_db()
+    job = ocr_jobs.get_service().get(job_id)
+    if job is None or not job.pending:
+        st.rerun()
+    label = "Waiting for a free OCR worker..." if job.status == ocr_jobs.QUEUED else "Reading receipt..."
+    st.markdown(f'<div class="alert alert-info">{label}</div>', unsafe_allow_html=True)
 
 # --- HEADER ---
 col1, col2 = st.columns([1, 6])
@@ -164,7 +259,10 @@ st.markdown("---")
 # --- SIDEBAR ---
 with st.sidebar:
     st.markdown("### Navigation")
-    page = st.radio("Menu", ["Upload & Extract", "Dashboard"], label_visibility="collapsed")
+    pages = ["Upload & Extract", "Batch Upload", "Dashboard"] + (["Diagnostics"] if DIAGNOSTICS else [])
+    page = st.radio("Menu", pages, label_visibility="collapsed")
+    if rerun_trace is not None:
+        rerun_trace.name = page
     
     st.markdown("---")
     # Pro Tip (Pure HTML)
@@ -182,6 +280,9 @@ if page == "Upload & Extract":
     uploaded_file = st.file_uploader("Upload Receipt", type=["jpg", "png", "jpeg"], label_visibility="hidden")
     
     if uploaded_file is not None:
+        import dedup
+        import ocr_jobs
+
         st.markdown("<br>", unsafe_allow_html=True)
         col1, col2 = st.columns([1, 1], gap="large")
         
@@ -192,57 +293,182 @@ if page == "Upload & Extract":
         with col2:
             st.markdown("#### Analysis")
             
-            with st.spinner("Processing..."):
-                try:
-                    # OCR
-                    image = Image.open(uploaded_file)
-                    raw_text = ocr_engine.extract_text(image)
+            try:
+                # A receipt that looks like one already saved is held back before paying for OCR
+                image_hash = upload_image_hash(uploaded_file)
+                duplicates = dedup.get_index().find_image(image_hash)
+                held = bool(duplicates) and st.session_state.get("duplicate_ok") != uploaded_file.file_id
+
+                # OCR runs in the background; this page polls the job instead of waiting on it
+                job = None if held else current_ocr_job(uploaded_file)
+
+                if held:
+                    st.markdown(f'<div class="alert alert-warning">This receipt looks like one you already saved: {describe_duplicate(duplicates[0])}.</div>', unsafe_allow_html=True)
+                    if st.button("Read it anyway"):
+                        st.session_state["duplicate_ok"] = uploaded_file.file_id
+                        st.rerun()
+                elif job is None:
+                    st.markdown('<div class="alert alert-error">OCR is busy right now. Please try again in a moment.</div>', unsafe_allow_html=True)
+                elif job.pending:
+                    ocr_progress(job.id)
+                elif job.error == "TESSERACT_MISSING":
+                    st.markdown('<div class="alert alert-error">Error: Tesseract OCR Engine Not Found</div>', unsafe_allow_html=True)
+                elif job.status != ocr_jobs.DONE:
+                    st.markdown(f'<div class="alert alert-error">Analysis Failed: {job.error}</div>', unsafe_allow_html=True)
+                else:
+                    raw_text = job.text
+                    extracted_total = job.total
+                    fields = job.fields
+                    timings = job.timings
+                    text_hash = dedup.text_fingerprint(raw_text)
+                    text_duplicates = dedup.get_index().find_text(text_hash)
+                    if text_duplicates:
+                        st.markdown(f'<div class="alert alert-warning">Possible duplicate of {describe_duplicate(text_duplicates[0])}.</div>', unsafe_allow_html=True)
+
+                    # Metric Card
+                    st.markdown(f"""
+                    <div class="metric-card">
+                        <div class="metric-label">Detected Amount</div>
+                        <div class="metric-value">${extracted_total:,.2f}</div>
+                    </div>
+                    """, unsafe_allow_html=True)
+                    if fields.total is not None and fields.confidence["total"] < 0.6:
+                        st.caption("The amount was hard to read; please check it against the receipt.")
+                    if timings:
+                        # Per-stage cost of this read (empty when served from the cache)
+                        st.caption(" · ".join(f"{stage} {ms:.0f} ms" for stage, ms in timings.items()))
                     
-                    if raw_text == "TESSERACT_MISSING":
-                        st.markdown('<div class="alert alert-error">Error: Tesseract OCR Engine Not Found</div>', unsafe_allow_html=True)
-                    else:
-                        extracted_total = ocr_engine.parse_total(raw_text)
+                    st.markdown("<br>", unsafe_allow_html=True)
+                    
+                    # Form
+                    with st.form("expense_form"):
+                        st.write("**Verify & Save**")
+                        col_f1, col_f2 = st.columns(2)
+                        with col_f1:
+                            date_input = st.date_input("Date", fields.date or datetime.date.today())
+                        with col_f2:
+                            amount_input = st.number_input("Amount ($)", value=extracted_total, step=0.01, format="%.2f")
                         
-                        # Metric Card
-                        st.markdown(f"""
-                        <div class="metric-card">
-                            <div class="metric-label">Detected Amount</div>
-                            <div class="metric-value">${extracted_total:,.2f}</div>
-                        </div>
-                        """, unsafe_allow_html=True)
+                        notes_input = st.text_input("Merchant / Notes", fields.merchant or "")
                         
-                        st.markdown("<br>", unsafe_allow_html=True)
+                        submitted = st.form_submit_button("Confirm Save")
                         
-                        # Form
-                        with st.form("expense_form"):
-                            st.write("**Verify & Save**")
-                            col_f1, col_f2 = st.columns(2)
-                            with col_f1:
-                                date_input = st.date_input("Date", datetime.date.today())
-                            with col_f2:
-                                amount_input = st.number_input("Amount ($)", value=extracted_total, step=0.01, format="%.2f")
-                            
-                            notes_input = st.text_input("Merchant / Notes") 
-                            
-                            submitted = st.form_submit_button("Confirm Save")
-                            
-                            if submitted:
-                                full_text = raw_text + f" [NOTES: {notes_input}]"
-                                database.add_expense(amount_input, date_input, full_text)
+                        if submitted:
+                            full_text = raw_text + f" [NOTES: {notes_input}]"
+                            expense_id = database.new_expense_id()
+                            database.add_expense(amount_input, date_input, full_text, expense_id)
+                            # Send the queued write now and wait for it before confirming
+                            if database.flush_writes():
+                                dedup.get_index().add(image_hash, text_hash, uploaded_file.name, date_input, amount_input, expense_id)
                                 st.markdown(f'<div class="alert alert-success">Successfully recorded ${amount_input}</div>', unsafe_allow_html=True)
-                        
-                        with st.expander("Raw Logs"):
-                            st.code(raw_text, language="text")
+                    
+                    with st.expander("Raw Logs"):
+                        st.code(raw_text, language="text")
+
+            except Exception as e:
+                st.markdown(f'<div class="alert alert-error">Analysis Failed: {e}</div>', unsafe_allow_html=True)
+    elif "ocr_job" in st.session_state:
+        # The receipt was removed: its OCR is no longer needed
+        import ocr_jobs
+        ocr_jobs.get_service().cancel(st.session_state.pop("ocr_job")[1])
 
-                except Exception as e:
-                    st.markdown(f'<div class="alert alert-error">Analysis Failed: {e}</div>', unsafe_allow_html=True)
+# --- PAGE: BATCH UPLOAD ---
+elif page == "Batch Upload":
+    st.markdown("### Batch Upload")
+
+    uploaded_files = st.file_uploader("Upload Receipts", type=["jpg", "png", "jpeg"], accept_multiple_files=True, label_visibility="hidden")
+
+    if uploaded_files:
+        import pandas as pd
+        import batch_ingest
+        import dedup
+        import receipt_parser
+
+        # Only OCR again when the set of files changes, not on every rerun
+        batch_key = tuple((f.name, f.size) for f in uploaded_files)
+        if st.session_state.get("batch_key") != batch_key:
+            progress = st.progress(0.0, text="Processing receipts...")
+            results = []
+            receipts = ((f.name, f.getvalue()) for f in uploaded_files)
+            # Results stream back from the worker pool as each receipt finishes
+            for done, result in enumerate(batch_ingest.ocr_receipts(receipts), start=1):
+                results.append(result)
+                progress.progress(done / len(uploaded_files), text=f"Processed {done}/{len(uploaded_files)}: {result['name']}")
+            progress.empty()
+            batch_ingest.flag_duplicates(results, dedup.get_index())
+            for r in results:
+                # The date printed on the receipt, as on the Upload page (today where none was read)
+                r["date"] = receipt_parser.parse(r["text"]).date
+            st.session_state["batch_key"] = batch_key
+            st.session_state["batch_results"] = results
+
+        results = st.session_state["batch_results"]
+        failed = [r for r in results if r["error"]]
+        if failed:
+            st.markdown(f'<div class="alert alert-error">{len(failed)} receipt(s) could not be read and are unselected.</div>', unsafe_allow_html=True)
+        duplicates = [r for r in results if r["duplicate_of"]]
+        if duplicates:
+            st.markdown(f'<div class="alert alert-warning">{len(duplicates)} receipt(s) look like ones already saved and are unselected.</div>', unsafe_allow_html=True)
+
+        review_df = pd.DataFrame({
+            "Save": [not r["error"] and not r["duplicate_of"] for r in results],
+            "File": [r["name"] for r in results],
+            "Duplicate of": [r["duplicate_of"] or "" for r in results],
+            "Date": [r["date"] or datetime.date.today() for r in results],
+            "Amount": [r["total"] for r in results],
+            "Notes": ["" for _ in results],
+        })
+
+        edited_batch = st.data_editor(
+            review_df,
+            column_config={
+                "Save": st.column_config.CheckboxColumn("Save", width="small"),
+                "File": st.column_config.TextColumn("File", disabled=True),
+                "Duplicate of": st.column_config.TextColumn("Duplicate of", disabled=True),
+                "Date": st.column_config.DateColumn("Date", format="MMM DD, YYYY"),
+                "Amount": st.column_config.NumberColumn("Amount", format="$%.2f"),
+                "Notes": st.column_config.TextColumn("Merchant / Notes"),
+            },
+            hide_index=True,
+            use_container_width=True,
+            key="batch_editor"
+        )
+
+        if st.button("Save Selected"):
+            rows = []
+            selected = edited_batch[edited_batch["Save"]]
+            for i, row in selected.iterrows():
+                full_text = results[i]["text"] + f" [NOTES: {row['Notes']}]"
+                rows.append((row["Amount"], pd.Timestamp(row["Date"]).date(), full_text, database.new_expense_id()))
+            # One append_rows call for the whole batch
+            saved = database.add_expenses(rows)
+            if saved:
+                index = dedup.get_index()
+                for (i, _), (amount, receipt_date, _, expense_id) in zip(selected.iterrows(), rows):
+                    index.add(results[i]["image_hash"], results[i]["text_hash"], results[i]["name"], receipt_date, amount, expense_id)
+                st.markdown(f'<div class="alert alert-success">Successfully recorded {saved} expenses</div>', unsafe_allow_html=True)
 
 # --- PAGE: DASHBOARD ---
 elif page == "Dashboard":
+    import pandas as pd
+
     st.markdown("### Financial Overview")
     
     today = datetime.date.today()
     current_month_total = database.get_monthly_total(today.year, today.month)
+    summary = database.get_ledger_summary()
+    monthly_budget = database.get_monthly_budget()
+
+    # Budget card: pace this month's spend against the configured budget
+    if summary is not None and monthly_budget:
+        forecast = summary.month_forecast(today.year, today.month, today)
+        on_track = forecast <= monthly_budget
+        budget_status = "On Track" if on_track else "Over Pace"
+        budget_color = "#38BDF8" if on_track else "#FCA5A5"
+        budget_detail = f"Forecast ${forecast:,.0f} of ${monthly_budget:,.0f}"
+        budget_opacity = 1.0
+    else:
+        budget_status, budget_color, budget_detail, budget_opacity = "On Track", "#38BDF8", "Forecast Unavailable", 0.7
     
     # Custom Metrics Grid
     st.markdown(f"""
@@ -252,61 +478,229 @@ elif page == "Dashboard":
             <div class="metric-value">${current_month_total:,.2f}</div>
             <div style="color: #64748B; font-size: 12px; margin-top: 8px;">{today.strftime('%B %Y')}</div>
         </div>
-         <div class="metric-card" style="opacity: 0.7;">
+         <div class="metric-card" style="opacity: {budget_opacity};">
             <div class="metric-label">Budget Status</div>
-            <div class="metric-value" style="font-size: 24px; color: #38BDF8;">On Track</div>
-             <div style="color: #64748B; font-size: 12px; margin-top: 8px;">Forecast Unavailable</div>
+            <div class="metric-value" style="font-size: 24px; color: {budget_color};">{budget_status}</div>
+             <div style="color: #64748B; font-size: 12px; margin-top: 8px;">{budget_detail}</div>
         </div>
     </div>
     """, unsafe_allow_html=True)
     
+    sync_status = database.get_sync_status()
+    if sync_status:
+        # Local-first mode: data below is served from the local mirror
+        synced_at = datetime.datetime.fromtimestamp(sync_status["last_sync"]).strftime("%H:%M:%S") if sync_status["last_sync"] else "never"
+        st.caption(f"Last synced with Google Sheets: {synced_at} · {sync_status['pending']} change(s) pending · {sync_status['conflicts']} conflict(s) logged")
+        if sync_status["rejected"]:
+            st.caption(f"{sync_status['rejected']} sheet row(s) have an amount that is not a number and are not shown; fix them in the sheet")
+        if sync_status["last_error"]:
+            st.markdown(f'<div class="alert alert-error">Sync error: {sync_status["last_error"]}</div>', unsafe_allow_html=True)
+
     st.markdown("### Recent Transactions")
+
+    # Full-text search over receipt text, merchant and notes, ranked by relevance
+    col_s1, col_s2, col_s3 = st.columns([4, 1, 1])
+    with col_s1:
+        search_query = st.text_input("Search receipts", placeholder="Merchant, item or note, e.g. costco milk")
+    with col_s2:
+        min_amount = st.number_input("Min amount", min_value=0.0, value=None, step=1.0, format="%.2f")
+    with col_s3:
+        max_amount = st.number_input("Max amount", min_value=0.0, value=None, step=1.0, format="%.2f")
+    searching = bool(search_query.strip()) or min_amount is not None or max_amount is not None
+
+    # Filters and paging: only the rows on the current page are fetched and rendered
+    col_p1, col_p2, col_p3, col_p4 = st.columns([3, 2, 1, 1])
+    with col_p1:
+        date_range = st.date_input("Date range", value=(), format="YYYY-MM-DD")
+    with col_p2:
+        category_filter = st.selectbox("Category", ["All"] + CATEGORIES)
+    with col_p3:
+        page_size = st.selectbox("Rows", [25, 50, 100], index=1)
+    with col_p4:
+        page_number = st.number_input("Page", min_value=1, step=1, key="expense_page")
+
+    start_date = date_range[0] if len(date_range) > 0 else None
+    end_date = date_range[1] if len(date_range) > 1 else None
+    category = None if category_filter == "All" else category_filter
+
+    def load_page(page_number):
+        offset = (page_number - 1) * page_size
+        if searching:
+            return database.search_expenses(
+                search_query, offset=offset, limit=page_size, start_date=start_date, end_date=end_date,
+                category=category, min_amount=min_amount, max_amount=max_amount
+            )
+        return database.get_expenses_page(
+            offset=offset, limit=page_size, start_date=start_date, end_date=end_date, category=category
+        )
+
+    page_df, total_rows = load_page(page_number)
+    page_count = max(1, -(-total_rows // page_size))
+    if page_number > page_count:
+        # Filters shrank the result set; show the last page instead of an empty one
+        page_number = page_count
+        page_df, total_rows = load_page(page_number)
     
-    df = database.get_all_expenses_with_id()
-    
-    if not df.empty:
-        df["Date"] = pd.to_datetime(df["Date"], errors='coerce')
+    if not page_df.empty:
+        noun = "matches" if searching else "transactions"
+        st.caption(f"Page {page_number} of {page_count} · {total_rows} {noun}")
+        page_df["Date"] = pd.to_datetime(page_df["Date"], errors='coerce')
         
         # Table
         edited_df = st.data_editor(
-            df,
+            page_df,
             column_config={
-                "row_index": st.column_config.NumberColumn("ID", width="small", disabled=True),
+                "id": st.column_config.TextColumn("ID", width="small", disabled=True),
                 "Date": st.column_config.DateColumn("Date", format="MMM DD, YYYY", width="medium"),
                 "Amount": st.column_config.NumberColumn("Amount", format="$%.2f", width="medium"),
                 "Category": st.column_config.SelectboxColumn(
                     "Category", 
-                    options=["Uncategorized", "Food", "Transport", "Utilities", "Shopping", "Entertainment"],
+                    options=CATEGORIES,
                     width="medium"
                 ),
-                "Raw Text": st.column_config.TextColumn("Details", width="large")
+                "Match": st.column_config.TextColumn("Match", width="large", disabled=True),
             },
             hide_index=True,
-            num_rows="dynamic",
             use_container_width=True,
             key="expense_editor"
         )
+
+        # Persist table edits: all changed rows go out in a single batch_update
+        edited_positions = sorted(st.session_state.get("expense_editor", {}).get("edited_rows", {}))
+        if edited_positions and st.button(f"Save Changes ({len(edited_positions)})"):
+            changes = []
+            for pos in edited_positions:
+                row = edited_df.iloc[pos]
+                row_date = row["Date"].date() if pd.notna(row["Date"]) else ""
+                # Raw text is not on the page; None leaves the stored text as is
+                changes.append((row["id"], row_date, float(row["Amount"]), row["Category"], None))
+            if database.update_expenses(changes):
+                # Start the editor fresh from the saved data
+                del st.session_state["expense_editor"]
+                st.rerun()
         
         st.markdown("<br>", unsafe_allow_html=True)
+
+        # Receipt text is only loaded for the row being looked at
+        with st.expander("Receipt Details"):
+            detail_id = st.selectbox("Transaction ID", page_df["id"].tolist(), label_visibility="collapsed")
+            raw_text = database.get_expense_raw_text(detail_id)
+            st.code(raw_text or "(no text)", language="text")
         
         # Delete
         with st.expander("Delete Transaction"):
             col_d1, col_d2 = st.columns([3, 1])
             with col_d1:
-                row_to_delete = st.number_input("Transaction ID", min_value=1, step=1, label_visibility="collapsed")
+                row_to_delete = st.selectbox("Transaction ID", page_df["id"].tolist(), key="delete_id", label_visibility="collapsed")
             with col_d2:
                 if st.button("Delete"):
                     database.delete_expense(row_to_delete)
                     st.rerun()
+    else:
+        empty_message = "No receipts match your search." if searching else "No transactions found."
+        st.markdown(f'<div class="alert alert-info">{empty_message}</div>', unsafe_allow_html=True)
 
-        # Chart
-        try:
-            st.markdown("### Spending Trend")
-            chart_data = df[['Date', 'Amount']].copy()
-            chart_data = chart_data.sort_values('Date')
-            st.area_chart(chart_data.set_index('Date'), color=["#38BDF8"])
-        except:
-             pass
-            
+    # Charts are drawn from pre-aggregated buckets, not raw rows
+    if summary is not None and summary.count:
+        st.markdown("### Spending Trend")
+        granularity = st.radio("Granularity", ["Daily", "Weekly", "Monthly"], horizontal=True, label_visibility="collapsed")
+        if granularity == "Daily":
+            trend = summary.daily
+        elif granularity == "Weekly":
+            trend = summary.weekly.set_axis(summary.weekly.index.start_time)
+        else:
+            trend = summary.monthly.set_axis(summary.monthly.index.to_timestamp())
+        st.area_chart(trend.rename("Amount"), color=["#38BDF8"])
+
+        col_c1, col_c2 = st.columns(2, gap="large")
+        with col_c1:
+            st.markdown("### By Category")
+            st.bar_chart(summary.category_totals(today.year, today.month).rename("Amount"), color=["#818CF8"])
+        with col_c2:
+            if monthly_budget:
+                st.markdown("### Budget Pace")
+                st.line_chart(summary.running_budget(today.year, today.month, monthly_budget)[["Cumulative", "Budget Pace"]])
+
+# --- PAGE: DIAGNOSTICS ---
+elif page == "Diagnostics":
+    import pandas as pd
+
+    st.markdown("### Diagnostics")
+
+    def metric_label(name, labels):
+        return f"{name} ({', '.join(str(value) for value in labels.values())})" if labels else name
+
+    traces = st.session_state.get("diagnostics_traces", [])
+    st.markdown("#### Recent Reruns")
+    if traces:
+        # Time outside the instrumented calls is script and Streamlit element work
+        overview = pd.DataFrame([{
+            "Rerun": trace["number"],
+            "Page": trace["name"],
+            "Total ms": trace["seconds"] * 1000.0,
+            "Storage & OCR ms": sum(span["seconds"] for span in trace["spans"] if span["depth"] == 0) * 1000.0,
+        } for trace in reversed(traces)])
+        overview["Streamlit & other ms"] = overview["Total ms"] - overview["Storage & OCR ms"]
+        st.dataframe(overview.round(1), hide_index=True, use_container_width=True)
+
+        chosen = st.selectbox("Breakdown of rerun", overview["Rerun"].tolist())
+        trace = next(trace for trace in traces if trace["number"] == chosen)
+        if trace["spans"]:
+            spans = pd.DataFrame([{
+                # Calls made from inside another timed call are marked, since their time is counted twice
+                "Call": ("↳ " if span["depth"] else "") + metric_label(span["name"], span["labels"]),
+                "ms": span["seconds"] * 1000.0,
+            } for span in trace["spans"]])
+            breakdown = spans.groupby("Call", sort=False)["ms"].agg(Calls="size", Total="sum", Max="max").reset_index()
+            st.dataframe(breakdown.rename(columns={"Total": "Total ms", "Max": "Max ms"}).round(2),
+                         hide_index=True, use_container_width=True)
+        else:
+            st.markdown('<div class="alert alert-info">No storage or OCR calls in this rerun.</div>', unsafe_allow_html=True)
+        if trace["counts"]:
+            st.caption(" · ".join(f"{name}: {value:,}" for name, value in trace["counts"].items()))
     else:
-        st.markdown('<div class="alert alert-info">No transactions found.</div>', unsafe_allow_html=True)
+        st.markdown('<div class="alert alert-info">Use the app (or rerun this page) to see per-rerun breakdowns here.</div>', unsafe_allow_html=True)
+
+    st.markdown("#### Since Startup")
+    snapshot = metrics.get_registry().snapshot()
+    if snapshot["histograms"]:
+        st.dataframe(pd.DataFrame([{
+            "Timer": metric_label(h["name"], h["labels"]),
+            "Calls": h["count"],
+            "Mean ms": h["sum"] / h["count"] * 1000.0 if h["count"] else 0.0,
+            "p50 ms ≤": h["p50"] * 1000.0,
+            "p95 ms ≤": h["p95"] * 1000.0,
+            "Total s": h["sum"],
+        } for h in snapshot["histograms"]]).round(2), hide_index=True, use_container_width=True)
+    if snapshot["counters"]:
+        st.dataframe(pd.DataFrame([{"Counter": metric_label(c["name"], c["labels"]), "Value": c["value"]}
+                                   for c in snapshot["counters"]]), hide_index=True, use_container_width=True)
+    # Looking at the OCR cache should not load the OCR engine into a process that never read a receipt
+    ocr_engine = sys.modules.get("ocr_engine")
+    if ocr_engine is not None:
+        cache = ocr_engine.cache_stats()
+        st.caption(f"OCR cache: {cache['entries']}/{cache['max_entries']} entries · {cache['hits']} hits · "
+                   f"{cache['disk_hits']} disk hits · {cache['misses']} misses")
+    else:
+        st.caption("OCR cache: no receipt read in this process yet")
+
+    col_m1, col_m2, col_m3 = st.columns(3)
+    with col_m1:
+        st.download_button("Prometheus Metrics", metrics.to_prometheus(), file_name="snapbudget.prom", mime="text/plain")
+    with col_m2:
+        st.download_button("JSON Metrics", metrics.to_json(), file_name="snapbudget-metrics.json", mime="application/json")
+    with col_m3:
+        if st.button("Reset Metrics"):
+            metrics.reset()
+            st.session_state.pop("diagnostics_traces", None)
+            st.rerun()
+
+# Keep this rerun's breakdown for the Diagnostics page (reruns cut short by st.rerun are not
+# kept, nor are the Diagnostics page's own, so its list holds still while it is being read)
+finished_trace = metrics.end_trace()
+if finished_trace is not None and page != "Diagnostics":
+    traces = st.session_state.setdefault("diagnostics_traces", [])
+    record = finished_trace.as_dict()
+    record["number"] = traces[-1]["number"] + 1 if traces else 1
+    traces.append(record)
+    del traces[:-DIAGNOSTICS_RERUNS]
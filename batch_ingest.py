@@ -0,0 +1,153 @@
+"""
+Bulk receipt ingestion: OCR many receipts in parallel and save them in one write.
+
+Each receipt goes through preprocess_image + Tesseract + parse_total in a separate
+worker process, so throughput scales with the number of cores.
+
+CLI usage (the same as `snapbudget ocr`, see cli.py):
+    python batch_ingest.py path/to/receipts/          # a directory (searched recursively)
+    python batch_ingest.py trip.zip --save            # a zip archive, saved to the configured store
+"""
+import io
+import multiprocessing
+import os
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Environment the worker processes start with. Tesseract spawns its own OpenMP threads,
+# and with one process per core that oversubscribes the CPU, so each worker keeps
+# Tesseract single-threaded (OMP_THREAD_LIMIT is read when Tesseract loads, so it has to
+# be there from the start) and holds a single warm instance: it reads one receipt at a time.
+# The settings are applied in each worker by _init_worker; the app's own environment is
+# left alone, since other sessions read it when they first import the OCR modules.
+WORKER_ENV = {"OMP_THREAD_LIMIT": "1", "SNAPBUDGET_OCR_WORKERS": "1"}
+
+# Workers are spawned, not forked: the app server is multithreaded, and a forked child
+# can inherit a lock some other thread held at the time, and deadlock on it.
+_mp_context = multiprocessing.get_context("spawn")
+
+def default_workers():
+    """Number of cores this process may actually run on."""
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        # Not available on Windows/macOS
+        return max(1, os.cpu_count() or 1)
+
+def iter_receipt_files(path):
+    """
+    Yields (name, bytes) for every receipt image in a directory tree or a zip archive.
+    Files are read one at a time so large batches are never held in memory at once.
+    """
+    if os.path.isdir(path):
+        for root, _dirs, files in os.walk(path):
+            for filename in sorted(files):
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    full_path = os.path.join(root, filename)
+                    with open(full_path, "rb") as f:
+                        yield os.path.relpath(full_path, path), f.read()
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    yield info.filename, archive.read(info)
+    else:
+        raise ValueError(f"{path} is neither a directory nor a zip archive")
+
+def _init_worker(env):
+    """Runs first in each worker process: applies `env` before Tesseract is imported."""
+    os.environ.update(env)
+
+def process_receipt(name, data, two_pass=None):
+    """
+    Runs the full OCR pipeline on one receipt and returns a result dict.
+    With two_pass only the totals lines are read in full (default: ocr_engine.TWO_PASS).
+    Top-level (picklable) so it can run in a worker process.
+    """
+    from PIL import Image
+    import dedup
+    import ocr_engine
+
+    if two_pass is None:
+        two_pass = ocr_engine.TWO_PASS
+    result = {"name": name, "text": "", "total": 0.0, "error": None, "image_hash": None, "text_hash": None, "duplicate_of": None}
+    try:
+        image = Image.open(io.BytesIO(data))
+        result["image_hash"] = dedup.image_hash(image)
+        text = ocr_engine.extract_text(image, image_bytes=data, two_pass=two_pass)
+    except Exception as e:
+        result["error"] = f"Could not read image: {e}"
+        return result
+
+    if text == "TESSERACT_MISSING" or text.startswith("Error extracting text"):
+        result["error"] = text
+        return result
+    # Two-pass text only covers the totals, which is not enough to compare receipts by
+    result.update(text=text, total=ocr_engine.parse_total(text), text_hash=None if two_pass else dedup.text_fingerprint(text))
+    return result
+
+def flag_duplicates(results, index, batch=None):
+    """
+    Sets each result's "duplicate_of" to the name of an already saved receipt (from the
+    dedup index) or an earlier receipt of the same batch that it looks like. Pass the
+    same `batch` index (an in-memory dedup.ReceiptIndex) to flag results as they stream in.
+    """
+    import dedup
+
+    if batch is None:
+        batch = dedup.ReceiptIndex(":memory:")
+    for result in results:
+        matches = []
+        for lookup in (index, batch):
+            matches += lookup.find_image(result["image_hash"]) + lookup.find_text(result["text_hash"])
+        result["duplicate_of"] = min(matches, key=lambda match: match["distance"])["name"] if matches else None
+        batch.add(result["image_hash"], result["text_hash"], result["name"])
+    return results
+
+def ocr_receipts(receipts, max_workers=None, two_pass=None):
+    """
+    OCRs an iterable of (name, bytes) receipts across a process pool.
+    `two_pass` is passed on to process_receipt.
+    Yields each result dict as soon as it finishes (completion order, not input order).
+    At most two receipts per worker are in flight, which bounds memory for big batches.
+    """
+    max_workers = max_workers or default_workers()
+    receipts = iter(receipts)
+
+    if max_workers == 1:
+        # No pool overhead for single-core machines
+        for name, data in receipts:
+            yield process_receipt(name, data, two_pass)
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=_mp_context,
+                             initializer=_init_worker, initargs=(WORKER_ENV,)) as pool:
+        pending = set()
+
+        def submit_next():
+            for name, data in receipts:
+                pending.add(pool.submit(process_receipt, name, data, two_pass))
+                return True
+            return False
+
+        for _ in range(max_workers * 2):
+            if not submit_next():
+                break
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                submit_next()
+                yield future.result()
+
+def main(argv=None):
+    """Same as `snapbudget ocr` (see cli.py), kept for existing scripts."""
+    import cli
+    return cli.main(["ocr"] + list(sys.argv[1:] if argv is None else argv))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Duplicate detection benchmark: lookup latency of the receipt index as it grows, and
+how well the fingerprints pair a phone photo with a clean scan of the same receipt.
+
+    python benchmarks/dedup_benchmark.py
+    python benchmarks/dedup_benchmark.py --receipts 100000 --pairs 20 --json results.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import dedup
+import synthetic
+
+def lookup_latency(receipts, queries, seed=0):
+    """Median and worst lookup time (ms) for image and text fingerprints in an index of `receipts`."""
+    rng = random.Random(seed)
+    index = dedup.ReceiptIndex(":memory:")
+    stored = []
+    for i in range(receipts):
+        image_value, text_value = rng.getrandbits(64), rng.getrandbits(64)
+        # Bypass SQLite: only the in-memory lookup is being measured
+        index._remember(image_value, text_value, {"name": f"r{i}", "date": None, "amount": None})
+        stored.append((image_value, text_value))
+
+    results = {}
+    for kind, find, radius in (("image", index.find_image, dedup.IMAGE_DISTANCE), ("text", index.find_text, dedup.TEXT_DISTANCE)):
+        column = 0 if kind == "image" else 1
+        timings = []
+        for q in range(queries):
+            # Half near-duplicates of stored receipts, half new receipts
+            value = rng.choice(stored)[column] ^ (1 << rng.randrange(64)) if q % 2 else rng.getrandbits(64)
+            started = time.perf_counter()
+            find(value, radius)
+            timings.append((time.perf_counter() - started) * 1000.0)
+        results[kind] = {"median_ms": statistics.median(timings), "max_ms": max(timings)}
+    return results
+
+def pair_distances(pairs, size):
+    """Image-hash distances between photo and scan of the same receipt, and between different receipts."""
+    photos, scans = [], []
+    for seed in range(pairs):
+        photo, fields = synthetic.make_photo(seed, size)
+        photos.append(dedup.image_hash(photo))
+        scans.append(dedup.image_hash(synthetic.render_receipt(fields).convert("RGB")))
+    same = [dedup.hamming(a, b) for a, b in zip(photos, scans)]
+    different = [dedup.hamming(photos[i], scans[j]) for i in range(pairs) for j in range(pairs) if i != j]
+    return same, different
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark duplicate receipt detection.")
+    parser.add_argument("--receipts", type=int, default=50000, help="Fingerprints in the index (default: 50000).")
+    parser.add_argument("--queries", type=int, default=1000, help="Lookups to time (default: 1000).")
+    parser.add_argument("--pairs", type=int, default=10, help="Synthetic photo/scan pairs (default: 10).")
+    parser.add_argument("--size", default="1512x2016", help="Synthetic photo size WxH (default: 1512x2016).")
+    parser.add_argument("--json", help="Write the results to this file.")
+    args = parser.parse_args(argv)
+
+    # Build the probe tables outside the timings
+    dedup._chunk_masks(dedup.TEXT_DISTANCE // dedup.CHUNKS)
+    latency = lookup_latency(args.receipts, args.queries)
+    print(f"== lookups in an index of {args.receipts:,} receipts")
+    for kind, result in latency.items():
+        print(f"  {kind:<5} median {result['median_ms']:.3f} ms, worst {result['max_ms']:.3f} ms")
+
+    size = tuple(int(v) for v in args.size.lower().split("x"))
+    same, different = pair_distances(args.pairs, size)
+    caught = sum(d <= dedup.IMAGE_DISTANCE for d in same)
+    false = sum(d <= dedup.IMAGE_DISTANCE for d in different)
+    print(f"== image hash, photo vs scan ({args.pairs} receipts, threshold {dedup.IMAGE_DISTANCE} bits)")
+    print(f"  same receipt flagged:       {caught}/{len(same)} (distances {sorted(same)})")
+    print(f"  different receipts flagged: {false}/{len(different)}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"latency": latency, "same": same, "different": different}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Memory and read cost of the shared ledger snapshot: the Ledger (storage/ledger.py)
+against the DataFrame the Sheets backend used to keep, built from the same
+get_all_records output of a fake sheet.
+
+The DataFrame is measured twice: as pandas builds it here (string columns may be
+Arrow-backed on recent pandas) and with object columns, as older pandas builds it.
+Reported: bytes held, build time, and the per-call cost of a filtered listing page
+and of reading dates for a summary.
+
+    python benchmarks/ledger_benchmark.py --sizes 10000,100000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import pandas as pd
+
+from tests import fake_sheets
+import synthetic
+from storage.base import HEADERS, PAGE_COLUMNS, filter_ledger
+from storage.ledger import Ledger
+
+def median_ms(call, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return statistics.median(timings)
+
+def frame_page(df):
+    """A filtered listing page the way the DataFrame snapshot served it (see ExpenseStore.get_page)."""
+    filtered = filter_ledger(df.copy(), "2026-03-01", "2026-05-31", "Food").iloc[::-1]
+    return filtered.iloc[0:50][PAGE_COLUMNS]
+
+def bench_size(size, repeat):
+    rows = synthetic.ledger_rows(size)
+    worksheet = fake_sheets.FakeWorksheet([HEADERS] + [list(row) + [f"bench{i:07d}"] for i, row in enumerate(rows)])
+    records = worksheet.get_all_records(numericise_ignore=[5])
+    results = {}
+
+    for name, dtype in (("dataframe", None), ("dataframe_object", object)):
+        started = time.perf_counter()
+        df = pd.DataFrame(records, dtype=dtype).rename(columns={"ID": "id"})
+        build_ms = (time.perf_counter() - started) * 1000.0
+        results[name] = {
+            "bytes": int(df.memory_usage(deep=True).sum()),
+            "build_ms": build_ms,
+            "page_ms": median_ms(lambda: frame_page(df), repeat),
+            "summary_dates_ms": median_ms(lambda: pd.to_datetime(df["Date"], errors="coerce"), repeat),
+        }
+
+    started = time.perf_counter()
+    ledger = Ledger.from_records(records)
+    build_ms = (time.perf_counter() - started) * 1000.0
+    raw_id = ledger.expense_ids([size // 2])[0]
+    results["ledger"] = {
+        "bytes": ledger.nbytes,
+        "text_bytes": ledger.texts.nbytes,
+        "build_ms": build_ms,
+        "page_ms": median_ms(lambda: ledger.page(0, 50, "2026-03-01", "2026-05-31", "Food", PAGE_COLUMNS), repeat),
+        # Already datetime64: a summary reads the column as is
+        "summary_dates_ms": median_ms(lambda: ledger.dates[~pd.isna(ledger.dates)], repeat),
+        "raw_text_ms": median_ms(lambda: ledger.raw_text(raw_id), repeat),
+    }
+    for name in ("dataframe", "dataframe_object"):
+        results["ledger"][f"smaller_than_{name}"] = results[name]["bytes"] / results["ledger"]["bytes"]
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the Ledger snapshot with a DataFrame snapshot.")
+    parser.add_argument("--sizes", default="10000,100000", help="Ledger sizes (default: 10000,100000).")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per timing; the median is kept (default: 10).")
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for size in [int(size) for size in args.sizes.split(",") if size]:
+        results[str(size)] = bench_size(size, args.repeat)
+        print(f"== {size} expenses")
+        print(f"  {'':<18}{'MB':>10}{'build ms':>12}{'page ms':>10}{'dates ms':>10}")
+        for name, values in results[str(size)].items():
+            print(f"  {name:<18}{values['bytes'] / 1e6:>10.1f}{values['build_ms']:>12.1f}"
+                  f"{values['page_ms']:>10.2f}{values['summary_dates_ms']:>10.2f}")
+        ledger = results[str(size)]["ledger"]
+        print(f"  ledger is {ledger['smaller_than_dataframe']:.1f}x smaller than the DataFrame "
+              f"({ledger['smaller_than_dataframe_object']:.1f}x with object columns); "
+              f"receipt text {ledger['text_bytes'] / 1e6:.1f} MB compressed; one raw text {ledger['raw_text_ms']:.2f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
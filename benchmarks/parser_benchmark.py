@@ -0,0 +1,118 @@
+"""
+Receipt parser benchmark: throughput of receipt_parser on synthetic receipt texts, and its
+accuracy on the hand-written receipts in tests/receipt_corpus.py, both against the original
+line-by-line parse_total.
+
+The synthetic texts come from the same templates the parser was written against, so they are
+only used for timing. Accuracy is the share of hand-written receipts where a field matches
+the printed value; tests/test_receipt_parser.py requires every one of them to be right, and
+`--min-accuracy` fails the run when any field falls below the given share.
+
+    python benchmarks/parser_benchmark.py --count 5000
+    python benchmarks/parser_benchmark.py --count 2000 --min-accuracy 0.95 --json results.json
+"""
+import argparse
+import datetime
+import json
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import receipt_parser
+import synthetic
+from tests.receipt_corpus import CORPUS
+
+def legacy_parse_total(text):
+    """parse_total as it was before receipt_parser: a per-line re.search with a lazy match."""
+    total_candidates = []
+    pattern = r"(?i)(?:total|grand total|amount due|balance|subtotal).*?(\d{1,5}\.\d{2})"
+    for line in text.split('\n'):
+        match = re.search(pattern, line.strip())
+        if match:
+            total_candidates.append(float(match.group(1)))
+    return total_candidates[-1] if total_candidates else 0.0
+
+def field_matches(name, parsed, expected):
+    if parsed is None or expected is None:
+        return parsed is expected
+    if name == "date":
+        return parsed == datetime.date.fromisoformat(expected)
+    if name in ("total", "subtotal", "tax"):
+        return abs(parsed - expected) < 0.005
+    return parsed == expected
+
+def time_parser(parse, texts, repeat):
+    """Best-of-`repeat` receipts per second for parse over all texts."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for text in texts:
+            parse(text)
+        best = min(best, time.perf_counter() - started)
+    return len(texts) / best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark receipt text parsing.")
+    parser.add_argument("--count", type=int, default=5000, help="Number of synthetic receipts timed (default: 5000).")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing runs; the best is kept (default: 3).")
+    parser.add_argument("--min-accuracy", type=float, help="Exit with an error if any field is less accurate than this.")
+    parser.add_argument("--json", help="Write the results to this file.")
+    args = parser.parse_args(argv)
+
+    texts = [text for _, text, _ in synthetic.text_corpus(args.count)]
+
+    fields = ("total", "subtotal", "tax", "date", "merchant", "currency")
+    correct = {name: 0 for name in fields}
+    confidence = {name: [0.0, 0] for name in fields}
+    legacy_correct = 0
+    failures = []
+    for sample, text, expected in CORPUS:
+        parsed = receipt_parser.parse(text)
+        for name in fields:
+            ok = field_matches(name, getattr(parsed, name), expected[name])
+            correct[name] += ok
+            if not ok:
+                if len(failures) < 20:
+                    failures.append({"sample": sample, "field": name, "expected": str(expected[name]), "parsed": str(getattr(parsed, name))})
+            elif expected[name] is not None:
+                confidence[name][0] += parsed.confidence[name]
+                confidence[name][1] += 1
+        legacy_correct += field_matches("total", legacy_parse_total(text), expected["total"])
+
+    accuracy = {name: correct[name] / len(CORPUS) for name in fields}
+    results = {
+        "receipts": len(CORPUS),
+        "timed_receipts": len(texts),
+        "accuracy": accuracy,
+        "mean_confidence_when_correct": {name: total / n if n else 0.0 for name, (total, n) in confidence.items()},
+        "legacy_total_accuracy": legacy_correct / len(CORPUS),
+        "receipts_per_second": time_parser(receipt_parser.parse, texts, args.repeat),
+        "legacy_receipts_per_second": time_parser(legacy_parse_total, texts, args.repeat),
+        "failures": failures,
+    }
+
+    print(f"== accuracy on {len(CORPUS)} hand-written receipts")
+    for name in fields:
+        print(f"  {name:<9} {accuracy[name]:7.1%}  (mean confidence when right {results['mean_confidence_when_correct'][name]:.2f})")
+    print(f"  legacy parse_total total accuracy: {results['legacy_total_accuracy']:.1%}")
+    print(f"== throughput on {len(texts)} synthetic receipts")
+    print(f"  {results['receipts_per_second']:,.0f} receipts/s "
+          f"(legacy parse_total, total only: {results['legacy_receipts_per_second']:,.0f}/s)")
+    for failure in failures[:5]:
+        print(f"  miss: {failure}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.min_accuracy is not None and min(accuracy.values()) < args.min_accuracy:
+        print(f"Accuracy below {args.min_accuracy:.0%}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Preprocessing benchmark: the original path (grayscale + contrast boost at full
+resolution) against the configured pipeline, on demo_images/ and synthetic receipts.
+
+Reports per-stage preprocessing time, Tesseract time, end-to-end latency and how
+often parse_total finds the right amount. Without a Tesseract install only the
+preprocessing numbers are measured.
+
+    python benchmarks/preprocess_benchmark.py --synthetic 10
+    python benchmarks/preprocess_benchmark.py --synthetic 5 --size 1512x2016 --json results.json
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import pytesseract
+from PIL import Image
+
+import ocr_engine
+import preprocessing
+import synthetic
+
+# Known totals of the bundled demo receipts.
+DEMO_TOTALS = {
+    "sample_receipt.png": 24.50,
+}
+
+VARIANTS = {
+    "original": {"stages": ("contrast",)},
+    "pipeline": {"stages": preprocessing.PREPROCESS_STAGES, "binarize": preprocessing.BINARIZE_METHOD},
+}
+
+def tesseract_available():
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+def load_corpus(synthetic_count, size):
+    """(name, image, expected total or None) for the demo images, then the synthetic receipts."""
+    samples = []
+    for path in sorted(glob.glob(os.path.join(ROOT, "demo_images", "*"))):
+        if path.lower().endswith((".png", ".jpg", ".jpeg")):
+            name = os.path.basename(path)
+            samples.append((name, Image.open(path).convert("RGB"), DEMO_TOTALS.get(name)))
+    for name, image, fields in synthetic.corpus(synthetic_count, size):
+        samples.append((name, image, fields["total"]))
+    return samples
+
+def run_sample(image, variant, with_ocr):
+    """Times one receipt through one variant. Returns a result dict."""
+    started = time.perf_counter()
+    result = preprocessing.run(image, **variant)
+    preprocess_ms = (time.perf_counter() - started) * 1000.0
+    row = {
+        "pixels": result.image.width * result.image.height,
+        "preprocess_ms": preprocess_ms,
+        "stages": result.timings,
+    }
+    if with_ocr:
+        started = time.perf_counter()
+        text = pytesseract.image_to_string(result.image, config=ocr_engine.TESSERACT_CONFIG)
+        row["ocr_ms"] = (time.perf_counter() - started) * 1000.0
+        row["total_ms"] = preprocess_ms + row["ocr_ms"]
+        row["parsed_total"] = ocr_engine.parse_total(text)
+    return row
+
+def summarize(rows, with_ocr):
+    summary = {
+        "samples": len(rows),
+        "median_pixels": statistics.median(r["pixels"] for r in rows),
+        "median_preprocess_ms": statistics.median(r["preprocess_ms"] for r in rows),
+    }
+    stages = {}
+    for r in rows:
+        for stage, ms in r["stages"].items():
+            stages.setdefault(stage, []).append(ms)
+    summary["median_stage_ms"] = {stage: statistics.median(values) for stage, values in stages.items()}
+    if with_ocr:
+        summary["median_ocr_ms"] = statistics.median(r["ocr_ms"] for r in rows)
+        summary["median_total_ms"] = statistics.median(r["total_ms"] for r in rows)
+        scored = [r for r in rows if r["expected_total"] is not None]
+        summary["parse_total_correct"] = sum(abs(r["parsed_total"] - r["expected_total"]) < 0.005 for r in scored)
+        summary["parse_total_scored"] = len(scored)
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark receipt preprocessing against the original path.")
+    parser.add_argument("--synthetic", type=int, default=10, help="Number of synthetic receipts (default: 10).")
+    parser.add_argument("--size", default="3024x4032", help="Synthetic photo size WxH (default: 12 MP).")
+    parser.add_argument("--no-ocr", action="store_true", help="Only time preprocessing.")
+    parser.add_argument("--json", help="Write per-sample results and the summary to this file.")
+    args = parser.parse_args(argv)
+
+    size = tuple(int(v) for v in args.size.lower().split("x"))
+    with_ocr = not args.no_ocr and tesseract_available()
+    if not args.no_ocr and not with_ocr:
+        print("Tesseract not found: measuring preprocessing only.\n")
+
+    samples = load_corpus(args.synthetic, size)
+    results = {name: [] for name in VARIANTS}
+    for sample_name, image, expected in samples:
+        for variant_name, variant in VARIANTS.items():
+            row = run_sample(image, variant, with_ocr)
+            row.update({"sample": sample_name, "expected_total": expected})
+            results[variant_name].append(row)
+
+    summaries = {name: summarize(rows, with_ocr) for name, rows in results.items()}
+    for name, summary in summaries.items():
+        print(f"== {name} ({summary['samples']} receipts)")
+        print(f"  pixels to OCR (median): {summary['median_pixels']:,.0f}")
+        print(f"  preprocess (median):    {summary['median_preprocess_ms']:.1f} ms")
+        for stage, ms in summary["median_stage_ms"].items():
+            print(f"    {stage:<10} {ms:8.1f} ms")
+        if with_ocr:
+            print(f"  tesseract (median):     {summary['median_ocr_ms']:.1f} ms")
+            print(f"  end to end (median):    {summary['median_total_ms']:.1f} ms")
+            print(f"  parse_total correct:    {summary['parse_total_correct']}/{summary['parse_total_scored']}")
+        print()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"ocr": with_ocr, "summary": summaries, "results": results}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+"""
+SnapBudget benchmark suite: the latencies that matter to a user, measured the same way
+on every commit so regressions in database.py, the stores or ocr_engine.py show up.
+
+Scenarios:
+- save:      saving one expense and a batch of 100 through database.py, on SQLite and
+             on a fake Google Sheet (tests/fake_sheets.py) with injected latency;
+- dashboard: what a Dashboard run reads (month total, ledger summary, first page),
+             cold and on a rerun, at 1k / 10k / 100k expenses on both backends;
+- ocr:       one receipt photo, and a batch through batch_ingest's process pool
+             (skipped when Tesseract is not installed);
+- parse:     parse_total and receipt_parser.parse throughput over synthetic texts.
+
+Results are written as JSON (`--json`). `--compare baseline.json` prints the change of
+every timing against an earlier run and fails when one got worse than --tolerance.
+
+    python benchmarks/run_benchmarks.py --json results.json
+    python benchmarks/run_benchmarks.py --scenarios save,dashboard --sizes 1000,10000 --compare results.json
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import aggregates
+import database
+from storage.sqlite import SQLiteStore
+from tests import fake_sheets
+import synthetic
+
+SCENARIOS = ["save", "dashboard", "ocr", "parse"]
+
+def median_ms(call, repeat):
+    """Median wall time of `repeat` calls, in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return statistics.median(timings)
+
+def sqlite_store(directory, rows, name):
+    store = SQLiteStore(os.path.join(directory, f"{name}.db"))
+    if rows:
+        store.add(rows)
+    return store
+
+# --- save ---
+
+def bench_save(args, directory):
+    rows = synthetic.ledger_rows(args.save_count + 100, seed=7)
+    batch = [(amount, d, text) for d, amount, text, _ in rows[-100:]]
+    results = {}
+    for backend in ("sqlite", "sheets"):
+        if backend == "sqlite":
+            worksheet, store = None, sqlite_store(directory, [], "save")
+        else:
+            worksheet, store = fake_sheets.fake_store(latency=args.latency_ms / 1000.0)
+        previous = database.set_store(store)
+        try:
+            single = iter(rows)
+
+            def save_one():
+                d, amount, text, _ = next(single)
+                database.add_expense(amount, d, text)
+                database.flush_writes()
+
+            calls_before = worksheet.api_calls if worksheet else 0
+            single_ms = median_ms(save_one, args.save_count)
+            calls_single = (worksheet.api_calls - calls_before) / args.save_count if worksheet else None
+            calls_before = worksheet.api_calls if worksheet else 0
+            batch_ms = median_ms(lambda: database.add_expenses(batch), 1)
+            results[backend] = {
+                "single_ms": single_ms,
+                "batch_100_ms": batch_ms,
+            }
+            if worksheet:
+                results[backend]["api_calls_single"] = calls_single
+                results[backend]["api_calls_batch_100"] = worksheet.api_calls - calls_before
+        finally:
+            database.set_store(previous)
+            store.close()
+    fake_sheets.uninstall()
+    return results
+
+# --- dashboard ---
+
+def dashboard_run():
+    """The reads of one Dashboard script run."""
+    today = datetime.date(2026, 6, 15)
+    database.get_monthly_total(today.year, today.month)
+    summary = database.get_ledger_summary()
+    summary.category_totals(today.year, today.month)
+    database.get_expenses_page(0, 50)
+
+def bench_dashboard(args, directory):
+    results = {"sqlite": {}, "sheets": {}}
+    for size in args.sizes:
+        rows = synthetic.ledger_rows(size)
+        for backend in ("sqlite", "sheets"):
+            if backend == "sqlite":
+                worksheet, store = None, sqlite_store(directory, rows, f"dashboard-{size}")
+            else:
+                worksheet, store = fake_sheets.fake_store(rows, latency=args.latency_ms / 1000.0)
+            previous = database.set_store(store)
+            try:
+                def cold():
+                    # A new ledger version (SQLite) / expired snapshot (Sheets): nothing cached
+                    aggregates._cache.pop(store, None)
+                    if worksheet:
+                        store.invalidate()
+                    dashboard_run()
+
+                cold_ms = median_ms(cold, args.repeat)
+                if worksheet:
+                    worksheet.reset_calls()
+                    cold()
+                    cold_calls = worksheet.api_calls
+                    worksheet.reset_calls()
+                warm_ms = median_ms(dashboard_run, args.repeat)
+                results[backend][str(size)] = {"cold_ms": cold_ms, "warm_ms": warm_ms}
+                if worksheet:
+                    results[backend][str(size)].update(api_calls_cold=cold_calls,
+                                                       api_calls_warm=worksheet.api_calls / args.repeat)
+            finally:
+                database.set_store(previous)
+                store.close()
+    fake_sheets.uninstall()
+    return results
+
+# --- ocr ---
+
+def bench_ocr(args, directory):
+    import batch_ingest
+    import ocr_engine
+    from preprocess_benchmark import tesseract_available
+
+    if ocr_engine.tesserocr is None and not tesseract_available():
+        return {"skipped": "Tesseract not installed"}
+
+    size = tuple(int(v) for v in args.ocr_size.lower().split("x"))
+    photos = [(name, image) for name, image, _ in synthetic.corpus(args.ocr_batch, size)]
+
+    def read_one():
+        ocr_engine.clear_cache()
+        ocr_engine.extract_text(photos[0][1])
+
+    receipts = []
+    for name, image in photos:
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=90)
+        receipts.append((name, buffer.getvalue()))
+    started = time.perf_counter()
+    done = sum(1 for _ in batch_ingest.ocr_receipts(receipts))
+    elapsed = time.perf_counter() - started
+    return {
+        "single_ms": median_ms(read_one, args.repeat),
+        "batch_receipts": done,
+        "batch_ms": elapsed * 1000.0,
+        "batch_receipts_per_s": done / elapsed,
+    }
+
+# --- parse ---
+
+def bench_parse(args, directory):
+    import ocr_engine
+    import receipt_parser
+
+    texts = [text for _, text, _ in synthetic.text_corpus(args.parse_count)]
+    results = {}
+    for name, parse in (("parse_total", ocr_engine.parse_total), ("parse", receipt_parser.parse)):
+        best = min(median_ms(lambda: [parse(text) for text in texts], 1) for _ in range(args.repeat))
+        results[f"{name}_per_s"] = len(texts) / (best / 1000.0)
+    return results
+
+BENCHMARKS = {"save": bench_save, "dashboard": bench_dashboard, "ocr": bench_ocr, "parse": bench_parse}
+
+def environment():
+    """Where the numbers come from, so runs are only compared like for like."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+def metrics(results, prefix=""):
+    """Flattens results into {"scenario.backend.size.metric": value} for the timing metrics."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(metrics(value, name + "."))
+        elif isinstance(value, (int, float)) and (key.endswith("_ms") or key.endswith("_per_s")):
+            flat[name] = value
+    return flat
+
+def compare(baseline, current, tolerance):
+    """Prints the change of every shared metric. Returns the names that regressed beyond tolerance."""
+    old, new = metrics(baseline["scenarios"]), metrics(current["scenarios"])
+    regressed = []
+    print(f"\nAgainst {baseline['environment'].get('commit') or 'baseline'}:")
+    for name in sorted(old.keys() & new.keys()):
+        if not old[name]:
+            continue
+        # For throughput higher is better; for latency lower is
+        worse = old[name] / new[name] - 1.0 if name.endswith("_per_s") else new[name] / old[name] - 1.0
+        flag = ""
+        if worse > tolerance:
+            flag = "  REGRESSION"
+            regressed.append(name)
+        change = f"{abs(worse):.0%} {'worse' if worse > 0 else 'better'}"
+        print(f"  {name:<48}{old[name]:>12.2f} -> {new[name]:>12.2f}  ({change}){flag}")
+    return regressed
+
+def print_results(results, indent=""):
+    for key, value in results.items():
+        if isinstance(value, dict):
+            print(f"{indent}{key}")
+            print_results(value, indent + "  ")
+        elif isinstance(value, float):
+            print(f"{indent}{key:<24}{value:>12.2f}")
+        else:
+            print(f"{indent}{key:<24}{value!s:>12}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the SnapBudget benchmark suite.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated subset of {SCENARIOS}.")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Ledger sizes for the dashboard scenario.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per timing; the median is kept (default: 5).")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Injected latency per fake Sheets API call (default: 50).")
+    parser.add_argument("--save-count", type=int, default=20, help="Single saves timed (default: 20).")
+    parser.add_argument("--ocr-size", default="1512x2016", help="Synthetic photo size WxH for OCR (default: 1512x2016).")
+    parser.add_argument("--ocr-batch", type=int, default=8, help="Receipts in the OCR batch (default: 8).")
+    parser.add_argument("--parse-count", type=int, default=5000, help="Texts parsed per throughput run (default: 5000).")
+    parser.add_argument("--json", help="Write the results to this file.")
+    parser.add_argument("--compare", help="Results of an earlier run to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="With --compare, fail when a metric is this much worse (default: 0.2 = 20%%).")
+    args = parser.parse_args(argv)
+    args.sizes = [int(size) for size in args.sizes.split(",") if size]
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = {"environment": environment(), "settings": vars(args), "scenarios": {}}
+    with tempfile.TemporaryDirectory() as directory:
+        for name in scenarios:
+            started = time.perf_counter()
+            results["scenarios"][name] = BENCHMARKS[name](args, directory)
+            print(f"== {name} ({time.perf_counter() - started:.1f} s)")
+            print_results(results["scenarios"][name], "  ")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressed = compare(json.load(f), results, args.tolerance)
+        if regressed:
+            print(f"{len(regressed)} metrics regressed by more than {args.tolerance:.0%}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Receipt search benchmark: query latency of the SQLite FTS5 index and of the in-memory
+index (used for Google Sheets) over a synthetic ledger, and the cost of keeping each
+one current as expenses are added, edited and deleted. In-memory writes include
+deriving the patched Ledger, as SheetsStore does.
+
+    python benchmarks/search_benchmark.py
+    python benchmarks/search_benchmark.py --expenses 100000 --json results.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from storage.ledger import Ledger
+from storage.search import SearchIndex
+from storage.sqlite import SQLiteStore
+import synthetic
+
+# (label, query, filters): a rare word, common words, a prefix, and filtered searches.
+QUERIES = [
+    ("rare word", "costco", {}),
+    ("merchant", "pharmacy", {}),
+    ("two words", "market milk", {}),
+    ("common word", "total", {}),
+    ("prefix", "batt", {}),
+    ("word + month", "coffee", {"start_date": "2026-03-01", "end_date": "2026-03-31"}),
+    ("word + amount", "cafe", {"min_amount": 20, "max_amount": 60}),
+    ("filters only", "", {"category": "Food", "min_amount": 100}),
+]
+
+def time_queries(search, repeat):
+    """Median and worst latency (ms) and match count of every query."""
+    results = {}
+    for label, query, filters in QUERIES:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            _, total = search(query, limit=50, **filters)
+            timings.append((time.perf_counter() - started) * 1000.0)
+        results[label] = {"median_ms": statistics.median(timings), "max_ms": max(timings), "matches": total}
+    return results
+
+def time_writes(add, update, delete, ids, count, seed=0):
+    """Median latency (ms) of single-expense adds, edits and deletes, index upkeep included."""
+    rng = random.Random(seed)
+    rows = synthetic.ledger_rows(count, seed=seed + 1)
+    timings = {"add": [], "update": [], "delete": []}
+    for row, expense_id in zip(rows, rng.sample(ids, count)):
+        for kind, call in (("add", lambda: add(row)), ("update", lambda: update(expense_id, row)), ("delete", lambda: delete(expense_id))):
+            started = time.perf_counter()
+            call()
+            timings[kind].append((time.perf_counter() - started) * 1000.0)
+    return {kind: statistics.median(values) for kind, values in timings.items()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark full-text receipt search.")
+    parser.add_argument("--expenses", type=int, default=100000, help="Expenses in the ledger (default: 100000).")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs of each query (default: 20).")
+    parser.add_argument("--writes", type=int, default=200, help="Adds/edits/deletes timed (default: 200).")
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    rows = synthetic.ledger_rows(args.expenses)
+    results = {"expenses": args.expenses}
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteStore(os.path.join(directory, "search.db"))
+        started = time.perf_counter()
+        store.add(rows)
+        results["sqlite_load_s"] = time.perf_counter() - started
+        ledger = Ledger.from_frame(store.get_all())
+
+        started = time.perf_counter()
+        index = SearchIndex.from_ledger(ledger)
+        results["memory_build_s"] = time.perf_counter() - started
+
+        results["sqlite"] = time_queries(store.search, args.repeat)
+        results["memory"] = time_queries(index.search, args.repeat)
+
+        ids = ledger.expense_ids()
+        results["sqlite_writes"] = time_writes(
+            lambda row: store.add([row]),
+            lambda expense_id, row: store.update([(expense_id, row)]),
+            store.delete, ids, args.writes,
+        )
+        current = {"ledger": ledger}
+
+        def memory_add(row):
+            current["ledger"] = current["ledger"].append([list(row) + [os.urandom(6).hex()]])
+            index.add(current["ledger"], [len(current["ledger"]) - 1])
+
+        def memory_update(expense_id, row):
+            current["ledger"] = current["ledger"].update(expense_id, row)
+            index.add(current["ledger"], [current["ledger"].position(expense_id)])
+
+        def memory_delete(expense_id):
+            current["ledger"] = current["ledger"].remove(expense_id)
+            index.remove(expense_id)
+
+        results["memory_writes"] = time_writes(memory_add, memory_update, memory_delete, ids, args.writes)
+        store.close()
+
+    print(f"{args.expenses} expenses · SQLite load {results['sqlite_load_s']:.1f} s · in-memory index build {results['memory_build_s']:.1f} s")
+    print(f"{'query':<16}{'matches':>9}{'FTS5 median':>14}{'FTS5 max':>11}{'memory median':>16}{'memory max':>13}")
+    for label, _, _ in QUERIES:
+        fts, memory = results["sqlite"][label], results["memory"][label]
+        print(f"{label:<16}{fts['matches']:>9}{fts['median_ms']:>11.2f} ms{fts['max_ms']:>8.2f} ms"
+              f"{memory['median_ms']:>13.2f} ms{memory['max_ms']:>10.2f} ms")
+    for kind in ("add", "update", "delete"):
+        print(f"{kind:<16}{'':>9}{results['sqlite_writes'][kind]:>11.2f} ms{'':>11}{results['memory_writes'][kind]:>13.3f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""
+App startup and rerun cost: how long a fresh server process takes to paint the first
+page, and how long each page's script run takes on a rerun.
+
+Each measurement runs app.py under Streamlit's AppTest in its own Python process, so
+module imports are paid the way a newly started server pays them. The app reads a
+seeded SQLite ledger (no network). Reported per tree:
+
+- first_paint_ms:  the first script run of the default page in a fresh process
+                   (imports, store connection, styling, rendering);
+- import_streamlit_ms: importing Streamlit itself, for scale;
+- heavy_modules:   which of pandas, PIL, pytesseract, gspread, oauth2client the
+                   first run loaded;
+- rerun_ms:        median script run of each page on a rerun, once warmed up.
+
+`--compare-ref REF` measures the tree at a git ref as well (e.g. the commit before a
+change), exported to a temporary directory, and prints both side by side.
+
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --compare-ref HEAD~1 --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import synthetic
+
+# Modules a page should only load when it needs them.
+HEAVY_MODULES = ["pandas", "PIL", "pytesseract", "gspread", "oauth2client"]
+
+# Runs inside the measured process: argv is (app root, reruns per page).
+FIRST_PAINT = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+app = AppTest.from_file(sys.argv[1] + "/app.py", default_timeout=120)
+painted_from = time.perf_counter()
+app.run()
+painted = time.perf_counter()
+print(json.dumps({
+    "import_streamlit_ms": (imported - started) * 1000.0,
+    "first_paint_ms": (painted - painted_from) * 1000.0,
+    "errors": [str(e.value) for e in app.exception],
+    "heavy_modules": [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+RERUNS = """
+import json, statistics, sys, time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(sys.argv[1] + "/app.py", default_timeout=120)
+app.run()
+reruns = int(sys.argv[2])
+results = {}
+for page in app.sidebar.radio[0].options:
+    app.sidebar.radio[0].set_value(page).run()
+    timings = []
+    for _ in range(reruns):
+        started = time.perf_counter()
+        app.run()
+        timings.append((time.perf_counter() - started) * 1000.0)
+    results[page] = statistics.median(timings)
+print(json.dumps(results))
+"""
+
+def run_child(code, root, env, *args):
+    out = subprocess.run([sys.executable, "-c", code, root, *map(str, args)], cwd=root, env=env,
+                         capture_output=True, text=True, timeout=600)
+    if out.returncode != 0:
+        raise RuntimeError(f"measurement failed in {root}:\n{out.stderr[-2000:]}")
+    # AppTest may log to stdout; the result is the last line
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def seed_ledger(path, size):
+    from storage.sqlite import SQLiteStore
+
+    store = SQLiteStore(path)
+    store.add(synthetic.ledger_rows(size))
+    store.close()
+
+def measure(root, db_path, args):
+    """The startup numbers of the app in `root`."""
+    env = dict(os.environ, SNAPBUDGET_STORAGE="sqlite", SNAPBUDGET_SQLITE_PATH=db_path,
+               SNAPBUDGET_DEDUP_PATH=":memory:", PYTHONDONTWRITEBYTECODE="1")
+    # Warm the OS file cache and bytecode once, so the first sample is not an outlier
+    run_child(FIRST_PAINT, root, env)
+    cold = [run_child(FIRST_PAINT, root, env) for _ in range(args.repeat)]
+    if cold[0]["errors"]:
+        raise RuntimeError(f"app.py raised in {root}: {cold[0]['errors']}")
+    return {
+        "import_streamlit_ms": statistics.median(run["import_streamlit_ms"] for run in cold),
+        "first_paint_ms": statistics.median(run["first_paint_ms"] for run in cold),
+        "heavy_modules": cold[0]["heavy_modules"],
+        "rerun_ms": run_child(RERUNS, root, env, args.reruns),
+    }
+
+def export_ref(ref, directory):
+    """Writes the tree at `ref` into directory (the benchmark's ledger is separate)."""
+    archive = subprocess.run(["git", "archive", ref], cwd=ROOT, capture_output=True, check=True).stdout
+    subprocess.run(["tar", "-x", "-C", directory], input=archive, check=True)
+    return directory
+
+def print_results(results):
+    labels = list(results)
+    print(f"{'':<28}" + "".join(f"{label:>16}" for label in labels))
+    for key in ("import_streamlit_ms", "first_paint_ms"):
+        print(f"{key:<28}" + "".join(f"{results[label][key]:>16.1f}" for label in labels))
+    pages = list(dict.fromkeys(page for label in labels for page in results[label]["rerun_ms"]))
+    for page in pages:
+        values = [results[label]["rerun_ms"].get(page) for label in labels]
+        print(f"{'rerun ' + page:<28}" + "".join(f"{v:>16.1f}" if v is not None else f"{'-':>16}" for v in values))
+    for label in labels:
+        print(f"heavy modules at first paint ({label}): {', '.join(results[label]['heavy_modules']) or 'none'}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure SnapBudget's time to first paint and per-rerun script time.")
+    parser.add_argument("--size", type=int, default=10000, help="Expenses in the seeded ledger (default: 10000).")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh processes timed for first paint (default: 5).")
+    parser.add_argument("--reruns", type=int, default=10, help="Reruns timed per page (default: 10).")
+    parser.add_argument("--compare-ref", help="Also measure the app at this git ref (e.g. HEAD~1).")
+    parser.add_argument("--json", help="Write the results to this file.")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "startup.db")
+        seed_ledger(db_path, args.size)
+        if args.compare_ref:
+            tree = os.path.join(directory, "ref")
+            os.makedirs(tree)
+            results[args.compare_ref] = measure(export_ref(args.compare_ref, tree), db_path, args)
+        results["working tree"] = measure(ROOT, db_path, args)
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
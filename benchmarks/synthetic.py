@@ -0,0 +1,168 @@
+"""
+Synthetic receipt photos with known contents, for benchmarks.
+
+Each receipt is rendered as crisp text on paper, then made to look like a phone
+photo: a 12 MP frame, a darker table around the paper, a few degrees of rotation,
+uneven lighting and sensor noise. The expected fields come back alongside the image.
+"""
+import random
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+MERCHANTS = ["DAILY MARKET", "CORNER CAFE", "CITY PHARMACY", "FRESH GROCER", "METRO HARDWARE", "SUNRISE DINER"]
+ITEMS = ["MILK", "BREAD", "EGGS", "COFFEE", "BANANAS", "SOAP", "BATTERIES", "PASTA", "APPLES", "TEA", "RICE", "CHEESE"]
+
+# A 12 MP phone photo, portrait.
+PHOTO_SIZE = (3024, 4032)
+
+def receipt_fields(seed):
+    """The contents of receipt `seed`: merchant, date, items, subtotal, tax and total."""
+    rng = random.Random(seed)
+    items = [(rng.choice(ITEMS), round(rng.uniform(0.5, 40.0), 2)) for _ in range(rng.randint(3, 9))]
+    subtotal = round(sum(price for _, price in items), 2)
+    tax = round(subtotal * rng.choice([0.0, 0.05, 0.07, 0.0825]), 2)
+    return {
+        "merchant": rng.choice(MERCHANTS),
+        "date": f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "items": items,
+        "subtotal": subtotal,
+        "tax": tax,
+        "total": round(subtotal + tax, 2),
+    }
+
+def render_receipt(fields, font_size=64):
+    """The receipt as a clean grayscale image (white paper, black text)."""
+    font = ImageFont.load_default(size=font_size)
+    big = ImageFont.load_default(size=int(font_size * 1.4))
+    width = font_size * 16
+    lines = [(fields["merchant"], big), (fields["date"], font), ("", font)]
+    lines += [(f"{name:<14}{price:>8.2f}", font) for name, price in fields["items"]]
+    lines += [("", font), (f"{'SUBTOTAL':<14}{fields['subtotal']:>8.2f}", font)]
+    lines += [(f"{'TAX':<14}{fields['tax']:>8.2f}", font), ("", font)]
+    lines += [(f"{'TOTAL':<14}{fields['total']:>8.2f}", big)]
+
+    line_height = int(font_size * 1.5)
+    height = line_height * (len(lines) + 4)
+    paper = Image.new("L", (width, height), 245)
+    draw = ImageDraw.Draw(paper)
+    y = line_height * 2
+    for text, line_font in lines:
+        draw.text((font_size, y), text, fill=20, font=line_font)
+        y += line_height
+    return paper
+
+def make_photo(seed, size=PHOTO_SIZE):
+    """
+    Receipt `seed` photographed on a table. Returns (RGB image, fields).
+    `size` is the photo resolution; the receipt fills roughly half the frame.
+    """
+    rng = np.random.default_rng(seed)
+    fields = receipt_fields(seed)
+    paper = render_receipt(fields)
+
+    # Fit the paper to ~60% of the frame height, then tilt it
+    scale = 0.6 * size[1] / paper.height
+    paper = paper.resize((int(paper.width * scale), int(paper.height * scale)), Image.Resampling.BILINEAR)
+    angle = float(rng.uniform(-5, 5))
+    mask = Image.new("L", paper.size, 255).rotate(angle, expand=True)
+    paper = paper.rotate(angle, expand=True, fillcolor=0)
+
+    photo = Image.new("L", size, int(rng.integers(60, 120)))
+    left = (size[0] - paper.width) // 2 + int(rng.integers(-size[0] // 20, size[0] // 20 + 1))
+    top = (size[1] - paper.height) // 2 + int(rng.integers(-size[1] // 20, size[1] // 20 + 1))
+    photo.paste(paper, (left, top), mask)
+
+    # Light falling off across the frame, plus sensor noise
+    pixels = np.asarray(photo, dtype=np.float32)
+    ramp = np.linspace(1.0, float(rng.uniform(0.6, 0.85)), size[0], dtype=np.float32)
+    pixels *= ramp[None, :]
+    pixels += rng.normal(0, 6, pixels.shape).astype(np.float32)
+    gray = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    return Image.merge("RGB", (gray, gray, gray)), fields
+
+def corpus(count, size=PHOTO_SIZE, first_seed=0):
+    """Yields (name, image, fields) for `count` synthetic receipts."""
+    for seed in range(first_seed, first_seed + count):
+        image, fields = make_photo(seed, size)
+        yield f"synthetic-{seed:03d}", image, fields
+
+# Currency symbol and ISO code of the synthetic text receipts.
+CURRENCIES = [("$", "USD"), ("€", "EUR"), ("£", "GBP")]
+TOTAL_LABELS = ["TOTAL", "Total:", "GRAND TOTAL", "Amount Due", "TOTAL DUE", "Balance Due"]
+FOOTERS = ["THANK YOU!", "PLEASE COME AGAIN", "Returns within 30 days", "Cashier: 04  Reg 2"]
+
+def _format_date(date, style):
+    year, month, day = (int(part) for part in date.split("-"))
+    month_name = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"][month - 1]
+    return [
+        date,
+        f"{month:02d}/{day:02d}/{year}",
+        f"{month_name} {day}, {year}",
+        f"{day} {month_name} {year}",
+    ][style]
+
+def receipt_text(seed):
+    """
+    Receipt `seed` as OCR might read it: varied labels, date formats, currencies and
+    thousands separators, with card and footer lines that also mention amounts.
+    Returns (text, fields) where fields adds "currency" to receipt_fields() ; "tax" and
+    "currency" are None when the receipt does not print them.
+    """
+    rng = random.Random(seed)
+    fields = receipt_fields(seed)
+    if rng.random() < 0.2:
+        # Large purchases exercise the thousands separator
+        fields["items"] = [(name, round(price * 100, 2)) for name, price in fields["items"]]
+        fields["subtotal"] = round(sum(price for _, price in fields["items"]), 2)
+        fields["tax"] = round(fields["subtotal"] * 0.05, 2)
+        fields["total"] = round(fields["subtotal"] + fields["tax"], 2)
+    symbol, code = rng.choice(CURRENCIES)
+    fields["currency"] = code
+    # Month-first numeric dates are ambiguous for days <= 12, so only use them when they are not
+    styles = [0, 2, 3] + ([1] if int(fields["date"][-2:]) > 12 else [])
+
+    def money(value):
+        return f"{symbol}{value:,.2f}" if rng.random() < 0.5 else f"{value:,.2f}"
+
+    lines = [fields["merchant"], f"{rng.randint(10, 999)} Main St.", f"Tel {rng.randint(200, 999)}-{rng.randint(1000, 9999)}"]
+    lines.append(f"{_format_date(fields['date'], rng.choice(styles))}  {rng.randint(7, 21)}:{rng.randint(0, 59):02d}")
+    lines += [f"{name:<14}{money(price):>10}" for name, price in fields["items"]]
+    lines.append(f"TOTAL ITEMS {len(fields['items'])}")
+    lines.append(f"SUBTOTAL      {money(fields['subtotal'])}")
+    if fields["tax"] or rng.random() < 0.5:
+        lines.append(f"TAX {rng.choice(['', '5%  ', '8.25% '])}{money(fields['tax'])}")
+    else:
+        # Not printed, so a parser cannot know it
+        fields["tax"] = None
+    lines.append(f"{rng.choice(TOTAL_LABELS)}  {money(fields['total'])}")
+    lines.append(f"VISA **** {rng.randint(1000, 9999)}  {money(fields['total'])}")
+    lines.append(rng.choice(FOOTERS))
+    text = "\n".join(lines)
+    if symbol not in text:
+        fields["currency"] = None
+    return text, fields
+
+def text_corpus(count, first_seed=0):
+    """Yields (name, text, fields) for `count` synthetic receipt texts."""
+    for seed in range(first_seed, first_seed + count):
+        text, fields = receipt_text(seed)
+        yield f"text-{seed:05d}", text, fields
+
+# Categories and notes of the synthetic ledger rows.
+CATEGORIES = ["Food", "Transport", "Utilities", "Entertainment", "Shopping", "Health", "Other"]
+NOTES = ["team lunch", "costco run", "birthday gift", "office supplies", "weekend trip", "refund pending"]
+
+def ledger_rows(count, seed=0):
+    """
+    `count` saved expenses as [date, amount, raw_text, category] rows, the shape the
+    stores take: synthetic receipt text, a fifth of them with notes appended.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        text, fields = receipt_text(seed * 1000003 + i)
+        if rng.random() < 0.2:
+            text += f" [NOTES: {rng.choice(NOTES)}]"
+        rows.append([fields["date"], fields["total"], text, rng.choice(CATEGORIES)])
+    return rows
@@ -0,0 +1,89 @@
+"""
+Two-pass OCR benchmark: reading the whole receipt against the quick first pass plus a
+full-quality read of the totals band, on demo_images/ and synthetic receipts.
+
+Reports median and total OCR latency per mode, the saving, how often the two-pass path
+had to fall back to the whole image, and how often parse_total finds the right amount.
+Needs Tesseract (the command line or tesserocr).
+
+    python benchmarks/two_pass_benchmark.py
+    python benchmarks/two_pass_benchmark.py --synthetic 20 --size 1512x2016 --json results.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import ocr_engine
+from preprocess_benchmark import load_corpus, tesseract_available
+
+MODES = {"full": False, "two-pass": True}
+
+def run_sample(image, two_pass):
+    """Times one uncached read. Returns a result dict."""
+    ocr_engine.clear_cache()
+    timings = {}
+    started = time.perf_counter()
+    text = ocr_engine.extract_text(image, timings=timings, two_pass=two_pass)
+    return {
+        "ms": (time.perf_counter() - started) * 1000.0,
+        "stages": timings,
+        "fallback": "fallback" in timings,
+        "parsed_total": ocr_engine.parse_total(text),
+        "error": text if text == "TESSERACT_MISSING" or text.startswith("Error extracting text") else None,
+    }
+
+def summarize(rows):
+    scored = [r for r in rows if r["expected_total"] is not None]
+    return {
+        "samples": len(rows),
+        "median_ms": statistics.median(r["ms"] for r in rows),
+        "total_ms": sum(r["ms"] for r in rows),
+        "fallbacks": sum(r["fallback"] for r in rows),
+        "parse_total_correct": sum(abs(r["parsed_total"] - r["expected_total"]) < 0.005 for r in scored),
+        "parse_total_scored": len(scored),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark two-pass OCR of receipt totals against a full read.")
+    parser.add_argument("--synthetic", type=int, default=10, help="Number of synthetic receipts (default: 10).")
+    parser.add_argument("--size", default="3024x4032", help="Synthetic photo size WxH (default: 12 MP).")
+    parser.add_argument("--json", help="Write per-sample results and the summary to this file.")
+    args = parser.parse_args(argv)
+
+    if ocr_engine.tesserocr is None and not tesseract_available():
+        print("Tesseract not found: nothing to measure.")
+        return 0
+
+    size = tuple(int(v) for v in args.size.lower().split("x"))
+    results = {mode: [] for mode in MODES}
+    for sample_name, image, expected in load_corpus(args.synthetic, size):
+        for mode, two_pass in MODES.items():
+            row = run_sample(image, two_pass)
+            row.update({"sample": sample_name, "expected_total": expected})
+            results[mode].append(row)
+
+    summaries = {mode: summarize(rows) for mode, rows in results.items()}
+    for mode, summary in summaries.items():
+        print(f"== {mode} ({summary['samples']} receipts)")
+        print(f"  OCR latency (median):   {summary['median_ms']:.1f} ms")
+        print(f"  parse_total correct:    {summary['parse_total_correct']}/{summary['parse_total_scored']}")
+        if MODES[mode]:
+            print(f"  fell back to full read: {summary['fallbacks']}/{summary['samples']}")
+        print()
+    saving = 1.0 - summaries["two-pass"]["total_ms"] / max(summaries["full"]["total_ms"], 1e-9)
+    print(f"Two-pass latency saving over all receipts: {saving:.0%}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"summary": summaries, "saving": saving, "results": results}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,383 @@
+"""
+SnapBudget from the command line, for bulk loads and scheduled jobs without the UI:
+
+    snapbudget ocr path/to/receipts/ --save       # OCR a directory or zip of receipts
+    snapbudget import history.csv                 # load a CSV or Parquet ledger
+    snapbudget export --output ledger.parquet     # the ledger as CSV, Parquet or JSON lines
+    snapbudget stats --month 2026-03              # totals by month and by category
+
+Every command uses the app's configured store (`[storage]` in `.streamlit/secrets.toml`,
+or SNAPBUDGET_STORAGE / SNAPBUDGET_SQLITE_PATH) unless --storage / --sqlite-path say
+otherwise. Records are streamed in chunks of --chunk-size and each chunk is written
+with one store call (a single append_rows on Google Sheets), so a large file is never
+held in memory whole. Streamlit is never imported, and pandas, the storage backends and
+the OCR engine are only loaded by the commands that use them.
+"""
+import argparse
+import json
+import os
+import sys
+from contextlib import contextmanager
+from datetime import date
+
+# Rows per chunk read, written or exported at a time.
+CHUNK_SIZE = 5000
+# Receipts OCR'd between two saves: a failure midway loses at most this many.
+OCR_CHUNK_SIZE = 50
+# Seconds a command waits for writes the sheet keeps refusing (rate limits) before giving
+# up: queued writes do not outlive the process.
+FLUSH_TIMEOUT = 600
+
+# Column names accepted by `import` (compared lowercased, "_" read as a space).
+IMPORT_COLUMNS = {"date": "Date", "amount": "Amount", "category": "Category", "raw text": "Raw Text"}
+
+EXPORT_FORMATS = {".csv": "csv", ".parquet": "parquet", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+class CommandError(Exception):
+    """A problem with the command's input or setup, printed without a traceback."""
+
+def _add_storage_options(parser):
+    parser.add_argument("--storage", choices=["sheets", "sqlite", "synced"],
+                        help="Storage backend (default: the app's configuration)")
+    parser.add_argument("--sqlite-path", help="SQLite database for the sqlite and synced backends")
+
+@contextmanager
+def open_store(args):
+    """
+    The configured store, connected, with --storage / --sqlite-path applied. Buffered
+    writes are flushed (and pushed to the sheet for the synced backend) on the way out.
+    """
+    import database
+    from storage import StoreUnavailable, WritesPending
+
+    config = database.storage_config()
+    if args.storage:
+        config["backend"] = args.storage
+    if args.sqlite_path:
+        config["sqlite_path"] = args.sqlite_path
+    try:
+        store = database.create_store(config)
+        store.connect()
+    except StoreUnavailable as e:
+        raise CommandError(str(e))
+    try:
+        yield store
+        store.flush(FLUSH_TIMEOUT)
+        if hasattr(store, "sync_now"):
+            # A one-shot command should not exit before the background sync catches up
+            store.sync_now()
+    except WritesPending as e:
+        raise CommandError(f"{e} and were not saved")
+    finally:
+        store.close()
+
+def _progress(message):
+    print(message, file=sys.stderr, flush=True)
+
+# --- ocr ---
+
+def _receipt_date(result, default):
+    """The date printed on the receipt, else `default`."""
+    import receipt_parser
+
+    parsed = receipt_parser.parse(result["text"]).date
+    return parsed.isoformat() if parsed else default
+
+def cmd_ocr(args):
+    import batch_ingest
+    import dedup
+    from storage.base import new_expense_id
+
+    index = dedup.get_index()
+    batch = dedup.ReceiptIndex(":memory:")
+    failed = saved = 0
+    saving = []
+
+    with (open_store(args) if args.save else _no_store()) as store:
+        def save():
+            nonlocal saved
+            rows = [[r["date"], r["total"], r["text"] + f" [FILE: {r['name']}]", "Uncategorized", new_expense_id()] for r in saving]
+            store.add(rows)
+            store.flush(FLUSH_TIMEOUT)
+            for r, row in zip(saving, rows):
+                index.add(r["image_hash"], r["text_hash"], r["name"], r["date"], r["total"], row[4])
+            saved += len(rows)
+            saving.clear()
+
+        receipts = batch_ingest.iter_receipt_files(args.path)
+        for result in batch_ingest.ocr_receipts(receipts, args.workers, args.two_pass):
+            batch_ingest.flag_duplicates([result], index, batch)
+            print(json.dumps({"name": result["name"], "total": result["total"], "error": result["error"],
+                              "duplicate_of": result["duplicate_of"]}), flush=True)
+            if result["error"]:
+                failed += 1
+            elif store is not None and (args.keep_duplicates or not result["duplicate_of"]):
+                result["date"] = args.date or _receipt_date(result, date.today().isoformat())
+                saving.append(result)
+                if len(saving) >= args.chunk_size:
+                    save()
+        if saving:
+            save()
+
+    if args.save:
+        _progress(f"Saved {saved} expenses")
+    return 1 if failed else 0
+
+@contextmanager
+def _no_store():
+    yield None
+
+# --- import ---
+
+def _read_chunks(path, file_format, chunk_size):
+    """DataFrames of at most chunk_size rows from a CSV or Parquet file."""
+    import pandas as pd
+
+    if file_format == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise CommandError("Reading Parquet needs pyarrow: pip install pyarrow")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        # Everything as text: coercion below decides what is valid
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False)
+
+def _amounts(values):
+    """
+    Float Series of a column of amounts, NaN where a value is not one. Numbers convert
+    in one pass; the rest ("1,234.00", "$12.50", "(3.00)") go through the receipt parser's
+    amount reader, so files read back the way the app writes and shows amounts.
+    """
+    import pandas as pd
+    import receipt_parser
+
+    amounts = pd.to_numeric(values, errors="coerce").astype(float)
+    retry = amounts.isna() & values.notna()
+    if retry.any():
+        amounts[retry] = values[retry].map(receipt_parser.parse_amount_text).astype(float)
+    return amounts
+
+def _import_rows(df):
+    """
+    [date, amount, raw_text, category] rows from one chunk, plus the number of rows
+    skipped for a missing or invalid date or amount.
+    """
+    import pandas as pd
+
+    columns = {}
+    for column in df.columns:
+        name = IMPORT_COLUMNS.get(str(column).strip().lower().replace("_", " "))
+        if name and name not in columns.values():
+            columns[column] = name
+    df = df[list(columns)].rename(columns=columns)
+    missing = [name for name in ("Date", "Amount") if name not in df.columns]
+    if missing:
+        raise CommandError(f"Missing column(s): {', '.join(missing)}")
+
+    dates = pd.to_datetime(df["Date"], errors="coerce", format="mixed").dt.strftime("%Y-%m-%d")
+    amounts = _amounts(df["Amount"])
+    if "Category" in df.columns:
+        categories = df["Category"].fillna("").astype(str).str.strip().replace("", "Uncategorized")
+    else:
+        categories = pd.Series("Uncategorized", index=df.index)
+    texts = df["Raw Text"].fillna("").astype(str) if "Raw Text" in df.columns else pd.Series("", index=df.index)
+
+    valid = dates.notna() & amounts.notna()
+    rows = [
+        [d, float(amount), text, category]
+        for d, amount, text, category in zip(dates[valid], amounts[valid], texts[valid], categories[valid])
+    ]
+    return rows, int((~valid).sum())
+
+def _file_format(path, file_format, formats):
+    if file_format:
+        return file_format
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in formats:
+        raise CommandError(f"Cannot tell the format of {path}; pass --format")
+    return formats[extension]
+
+def cmd_import(args):
+    file_format = _file_format(args.file, args.format, {".csv": "csv", ".parquet": "parquet", ".pq": "parquet"})
+    imported = skipped = 0
+
+    if args.dry_run:
+        for chunk in _read_chunks(args.file, file_format, args.chunk_size):
+            rows, invalid = _import_rows(chunk)
+            imported += len(rows)
+            skipped += invalid
+        _progress(f"Would import {imported} expenses ({skipped} invalid rows skipped)")
+        return 0
+
+    with open_store(args) as store:
+        for chunk in _read_chunks(args.file, file_format, args.chunk_size):
+            rows, invalid = _import_rows(chunk)
+            skipped += invalid
+            if rows:
+                # One write per chunk; flushing keeps at most one chunk queued in memory
+                store.add(rows)
+                store.flush(FLUSH_TIMEOUT)
+                imported += len(rows)
+            _progress(f"Imported {imported} expenses...")
+    _progress(f"Imported {imported} expenses ({skipped} invalid rows skipped)")
+    return 0
+
+# --- export ---
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    return pa.schema([("id", pa.string()), ("Date", pa.string()), ("Amount", pa.float64()),
+                      ("Category", pa.string()), ("Raw Text", pa.string())])
+
+def cmd_export(args):
+    to_stdout = args.output in (None, "-")
+    file_format = args.format or ("csv" if to_stdout else _file_format(args.output, None, EXPORT_FORMATS))
+    if file_format == "parquet" and to_stdout:
+        raise CommandError("Parquet output needs a file: pass --output")
+
+    exported = 0
+    with open_store(args) as store:
+        chunks = store.iter_ledger(args.chunk_size, args.start_date, args.end_date, args.category)
+        if file_format == "parquet":
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise CommandError("Writing Parquet needs pyarrow: pip install pyarrow")
+            schema = _parquet_schema()
+            with pq.ParquetWriter(args.output, schema) as writer:
+                for chunk in chunks:
+                    chunk = chunk.astype({"Amount": "float64"})
+                    writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+                    exported += len(chunk)
+        else:
+            out = sys.stdout if to_stdout else open(args.output, "w", newline="", encoding="utf-8")
+            try:
+                for chunk in chunks:
+                    if file_format == "jsonl":
+                        out.write(chunk.to_json(orient="records", lines=True, force_ascii=False).rstrip("\n") + "\n")
+                    else:
+                        chunk.to_csv(out, index=False, header=exported == 0)
+                    exported += len(chunk)
+            finally:
+                if not to_stdout:
+                    out.close()
+    _progress(f"Exported {exported} expenses")
+    return 0
+
+# --- stats ---
+
+def _month_category_totals(store, chunk_size):
+    """(month, category, total, count) DataFrame: the store's rollups, else one pass over the ledger."""
+    import pandas as pd
+
+    if hasattr(store, "rollups"):
+        return store.rollups()
+    parts = []
+    for chunk in store.iter_ledger(chunk_size):
+        frame = pd.DataFrame({
+            "month": chunk["Date"].astype(str).str[:7],
+            "category": chunk["Category"].fillna("").replace("", "Uncategorized"),
+            "amount": _amounts(chunk["Amount"]).fillna(0.0),
+        })
+        parts.append(frame.groupby(["month", "category"])["amount"].agg(total="sum", count="size").reset_index())
+    if not parts:
+        return pd.DataFrame(columns=["month", "category", "total", "count"])
+    # Per-chunk sums are small; combining them never needs the whole ledger
+    return pd.concat(parts).groupby(["month", "category"], as_index=False)[["total", "count"]].sum()
+
+def _rows(grouped):
+    return {name: {"total": round(float(total), 2), "count": int(count)}
+            for name, total, count in zip(grouped.index, grouped["total"], grouped["count"])}
+
+def cmd_stats(args):
+    with open_store(args) as store:
+        totals = _month_category_totals(store, args.chunk_size)
+    if args.month:
+        totals = totals[totals["month"] == args.month]
+
+    by_month = totals.groupby("month")[["total", "count"]].sum().sort_index()
+    by_category = totals.groupby("category")[["total", "count"]].sum().sort_values("total", ascending=False)
+    summary = {
+        "total": round(float(totals["total"].sum()), 2),
+        "count": int(totals["count"].sum()),
+        "months": _rows(by_month),
+        "categories": _rows(by_category),
+    }
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return 0
+
+    print(f"{summary['count']} expenses, total ${summary['total']:,.2f}")
+    for title, rows in (("Month", summary["months"]), ("Category", summary["categories"])):
+        if rows:
+            print(f"\n{title:<16}{'Total':>14}{'Count':>9}")
+            for name, row in rows.items():
+                print(f"{name:<16}{row['total']:>14,.2f}{row['count']:>9}")
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="snapbudget", description="SnapBudget without the web UI.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ocr = commands.add_parser("ocr", help="OCR a directory or zip of receipt images")
+    ocr.add_argument("path", help="Directory or .zip file containing receipt images")
+    ocr.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    ocr.add_argument("--save", action="store_true", help="Save all successfully read receipts (likely duplicates are skipped)")
+    ocr.add_argument("--date", default=None,
+                     help="Expense date for saved rows (YYYY-MM-DD; default: the receipt's date, else today)")
+    ocr.add_argument("--two-pass", action="store_true", default=None,
+                     help="Find the totals with a quick first pass and read only those lines in full")
+    ocr.add_argument("--keep-duplicates", action="store_true", help="Also save receipts that look like ones already saved")
+    ocr.add_argument("--chunk-size", type=int, default=OCR_CHUNK_SIZE,
+                     help=f"Receipts saved per write (default: {OCR_CHUNK_SIZE})")
+    ocr.set_defaults(run=cmd_ocr)
+
+    load = commands.add_parser("import", help="Load expenses from a CSV or Parquet file",
+                               description="Load expenses from a CSV or Parquet file with Date and Amount columns "
+                                           "and optional Category and Raw Text columns (case-insensitive).")
+    load.add_argument("file", help="CSV or Parquet file")
+    load.add_argument("--format", choices=["csv", "parquet"],
+                      help="File format (default: from the extension); Parquet needs pyarrow (pip install pyarrow)")
+    load.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help=f"Rows per write (default: {CHUNK_SIZE})")
+    load.add_argument("--dry-run", action="store_true", help="Only validate the file and count the rows")
+    load.set_defaults(run=cmd_import)
+
+    export = commands.add_parser("export", help="Write the ledger as CSV, Parquet or JSON lines")
+    export.add_argument("--output", "-o", help="Output file (default: CSV on stdout)")
+    export.add_argument("--format", choices=["csv", "parquet", "jsonl"],
+                        help="Output format (default: from the extension); Parquet needs pyarrow (pip install pyarrow)")
+    export.add_argument("--start-date", help="Only expenses on or after this date (YYYY-MM-DD)")
+    export.add_argument("--end-date", help="Only expenses on or before this date (YYYY-MM-DD)")
+    export.add_argument("--category", help="Only expenses in this category")
+    export.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help=f"Rows read at a time (default: {CHUNK_SIZE})")
+    export.set_defaults(run=cmd_export)
+
+    stats = commands.add_parser("stats", help="Totals by month and by category")
+    stats.add_argument("--month", help="Only this month (YYYY-MM)")
+    stats.add_argument("--json", action="store_true", help="Print JSON instead of tables")
+    stats.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help=f"Rows read at a time (default: {CHUNK_SIZE})")
+    stats.set_defaults(run=cmd_stats)
+
+    for command in (ocr, load, export, stats):
+        _add_storage_options(command)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if getattr(args, "chunk_size", 1) < 1:
+        print("error: --chunk-size must be at least 1", file=sys.stderr)
+        return 2
+    try:
+        return args.run(args)
+    except (CommandError, ValueError, OSError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+
+if __name__ == "__main__":
+    sys.exit(main())
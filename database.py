@@ -1,217 +1,472 @@
-import streamlit as st
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-import pandas as pd
 from datetime import date
-import json
-
-# Name of the Google Sheet to use.
-# Ideally this is in secrets, but a default constant is fine for the code structure.
-SHEET_NAME = "SnapBudget Expenses"
-
-def get_client():
-    """Context manager to authenticate with Google Sheets using Streamlit secrets."""
-    # Based on Streamlit secrets format:
-    # [gsheets]
-    # service_account = { ... json content ... }
-    
-    # Alternatively, look for specific keys directly.
-    # We will assume a 'connections' style or direct 'gcp_service_account' in secrets.
-    
-    try:
-        # Load credentials from Streamlit secrets
-        # We expect st.secrets["gcp_service_account"] to be a dictionary
-        creds_dict = st.secrets["gcp_service_account"]
-        
-        # Define the scope
-        scope = [
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive"
-        ]
-        
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-        client = gspread.authorize(creds)
-        return client
-    except Exception as e:
-        st.error(f"Failed to authenticate with Google Sheets: {e}")
-        st.help("Make sure you have set up `.streamlit/secrets.toml` correctly with `[gcp_service_account]`.")
-        return None
+import os
+import sys
+import argparse
+import threading
+
+try:
+    import tomllib
+except ImportError:
+    # Python < 3.11; Streamlit depends on the toml package
+    import toml as tomllib
+
+import metrics
+
+# Which backend holds the expenses. Configure in `.streamlit/secrets.toml`:
+# [storage]
+# backend = "sheets"        # or "sqlite", or "synced" (local SQLite mirror of the sheet)
+# sqlite_path = "expenses.db"
+# sync_interval = 30         # synced only: seconds between background syncs
+# conflict_policy = "local"  # synced only: "local" or "remote" wins when both sides changed a row
+# The SNAPBUDGET_STORAGE / SNAPBUDGET_SQLITE_PATH environment variables take precedence.
+DEFAULT_BACKEND = "sheets"
+
+# Where Streamlit looks for secrets (the project's file wins). Read directly when
+# running outside the app, e.g. from cli.py, so scripts do not have to import Streamlit.
+SECRETS_PATHS = [os.path.expanduser("~/.streamlit/secrets.toml"), os.path.join(".streamlit", "secrets.toml")]
+
+# The configured store, created once per process and shared by every session.
+_store = None
+_store_lock = threading.Lock()
+
+_file_secrets = None
+
+def get_secret(section, default=None):
+    """
+    One section of the app's secrets: st.secrets inside the Streamlit app, otherwise
+    the same secrets.toml files, read once.
+    """
+    global _file_secrets
+    if "streamlit" in sys.modules:
+        import streamlit as st
+        try:
+            return st.secrets.get(section, default)
+        except Exception:
+            # No secrets file at all; fall back to defaults
+            return default
+    if _file_secrets is None:
+        secrets = {}
+        for path in SECRETS_PATHS:
+            try:
+                with open(path, "rb") as f:
+                    secrets.update(tomllib.loads(f.read().decode("utf-8")))
+            except (OSError, ValueError):
+                continue
+        _file_secrets = secrets
+    return _file_secrets.get(section, default)
+
+def _service_account():
+    from storage import StoreUnavailable
+
+    creds = get_secret("gcp_service_account")
+    if not creds:
+        raise StoreUnavailable("Google Sheets storage needs a [gcp_service_account] section in `.streamlit/secrets.toml`.")
+    return creds
 
+# Where user-facing storage errors go: reporter(level, message), level being "error",
+# "warning" or "hint". The app shows them on the page (see set_reporter); anywhere
+# else they are printed to stderr.
+def _print_report(level, message):
+    print(f"{level}: {message}", file=sys.stderr)
+
+_reporter = _print_report
+
+def set_reporter(reporter=None):
+    """Routes storage errors to reporter(level, message); None restores stderr. Returns the previous one."""
+    global _reporter
+    previous, _reporter = _reporter, reporter or _print_report
+    return previous
+
+def _report(level, message):
+    _reporter(level, message)
+
+def storage_config():
+    """The [storage] section of the secrets, with environment overrides applied."""
+    config = dict(get_secret("storage", {}) or {})
+    config["backend"] = os.environ.get("SNAPBUDGET_STORAGE", config.get("backend", DEFAULT_BACKEND)).lower()
+    config["sqlite_path"] = os.environ.get("SNAPBUDGET_SQLITE_PATH", config.get("sqlite_path", "expenses.db"))
+    return config
+
+def create_store(config=None):
+    """
+    Builds the storage backend named in config. Backends are imported here, so the
+    Google client libraries are only loaded when a Sheets backend is configured.
+    """
+    config = config or storage_config()
+    backend = config["backend"]
+    if backend == "sqlite":
+        from storage.sqlite import SQLiteStore
+        return SQLiteStore(config["sqlite_path"])
+    if backend == "sheets":
+        from storage.sheets import SheetsStore, SHEET_NAME
+        # The [gcp_service_account] section is the service account's JSON key as a table
+        return SheetsStore(_service_account(), config.get("sheet_name", SHEET_NAME))
+    if backend == "synced":
+        from storage.sheets import SHEET_NAME
+        from storage.sync import SyncedStore, SYNC_INTERVAL
+        return SyncedStore(
+            _service_account(),
+            path=config["sqlite_path"],
+            sheet_name=config.get("sheet_name", SHEET_NAME),
+            interval=float(config.get("sync_interval", SYNC_INTERVAL)),
+            conflict_policy=config.get("conflict_policy", "local"),
+        )
+    raise ValueError(f"Unknown storage backend '{backend}' (expected 'sheets', 'sqlite' or 'synced')")
+
+def get_store():
+    """Returns the process-wide store, creating it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = create_store()
+        return _store
+
+def set_store(store):
+    """Swaps the active store (e.g. for an offline deployment or a benchmark). Returns the previous one."""
+    global _store
+    with _store_lock:
+        previous, _store = _store, store
+        return previous
+
+@metrics.instrument("db_call")
 def init_db():
     """
-    Ensures the Google Sheet exists and has the correct headers.
-    Returns the Sheet object.
+    Connects the configured storage backend and makes sure it is ready to use.
+    Returns the store, or None if it is unavailable.
     """
-    client = get_client()
-    if not client:
-        return None
+    from storage import StoreUnavailable
 
     try:
-        # Try to open the sheet
-        spreadsheet = client.open(SHEET_NAME)
-        return spreadsheet.sheet1
-    except gspread.exceptions.SpreadsheetNotFound:
-        # If not found, creating it might require higher permissions or manual creation.
-        # Usually service accounts can only create sheets in their own Drive.
-        # Easier workflow: User creates sheet and shares it with service account email.
-        st.warning(f"Spreadsheet '{SHEET_NAME}' not found. Please create it and share it with the service account email.")
+        store = get_store()
+        store.connect()
+        return store
+    except StoreUnavailable as e:
+        _report("warning", str(e))
         return None
     except Exception as e:
-        st.error(f"Error accessing sheet: {e}")
+        _report("error", f"Failed to connect to storage: {e}")
+        if storage_config()["backend"] in ("sheets", "synced"):
+            _report("hint", "Make sure you have set up `.streamlit/secrets.toml` correctly with `[gcp_service_account]`.")
+        return None
+
+def get_monthly_budget():
+    """
+    Monthly budget from `[budget] monthly = ...` in secrets (or SNAPBUDGET_MONTHLY_BUDGET).
+    Returns None when no budget is configured.
+    """
+    value = os.environ.get("SNAPBUDGET_MONTHLY_BUDGET")
+    if value is None:
+        value = (get_secret("budget", {}) or {}).get("monthly")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+@metrics.instrument("db_call")
+def get_ledger_summary():
+    """
+    Dashboard aggregates (monthly, category, daily/weekly series) for the whole ledger.
+    Memoized per ledger version, so reruns without new writes cost nothing.
+    Returns None if storage is unavailable.
+    """
+    store = init_db()
+    if not store:
         return None
+    import aggregates
 
-def ensure_headers(sheet):
-    """Check if headers exist, if not, create them."""
-    if not sheet:
-        return
-        
-    try:
-        # Check first row
-        headers = sheet.row_values(1)
-        expected_headers = ["Date", "Amount", "Raw Text", "Category"]
-        
-        if not headers:
-            sheet.insert_row(expected_headers, 1)
-        elif headers != expected_headers:
-            # If different, we might just append or warn. Let's just assume it's okay for now.
-            pass
+    try:
+        return aggregates.summarize(store)
     except Exception as e:
-        st.error(f"Error checking headers: {e}")
+        _report("error", f"Error calculating totals: {e}")
+        return None
+
+def get_sync_status():
+    """Background sync status for the local-first store, or None for other backends."""
+    store = init_db()
+    if not store or not hasattr(store, "sync_status"):
+        return None
+    try:
+        return store.sync_status()
+    except Exception:
+        return None
 
-def add_expense(amount, expense_date, raw_text=""):
-    """Appends a new expense row to the Google Sheet."""
-    sheet = init_db()
-    ensure_headers(sheet)
-    
-    if not sheet:
-        return
+@metrics.instrument("db_call")
+def flush_writes(timeout=None):
+    """
+    Sends all queued writes now and waits for them to land.
+    Returns True on success; failures are reported in the UI.
+    """
+    from storage import WritesPending
 
+    store = init_db()
+    if not store:
+        return False
+    try:
+        store.flush(timeout)
+        return True
+    except WritesPending as e:
+        # Kept and retried by the store: saving again would only duplicate them
+        _report("warning", f"{e}. They will be saved automatically; there is no need to save again.")
+        return False
+    except Exception as e:
+        _report("error", f"Failed to save expenses: {e}")
+        return False
+
+def _expense_row(amount, expense_date, raw_text, category="Uncategorized", expense_id=None):
     if isinstance(expense_date, date):
         expense_date = expense_date.isoformat()
+    row = [expense_date, amount, raw_text, category]
+    return row + [expense_id] if expense_id else row
+
+def new_expense_id():
+    """A fresh expense id, for callers that need to know it before saving (see add_expense)."""
+    from storage.base import new_expense_id
+    return new_expense_id()
+
+def _update_receipts(change):
+    """Applies `change` to the duplicate receipt index (dedup.py); its failures never fail the expense write."""
+    import dedup
 
-    # Append row
     try:
-        sheet.append_row([expense_date, amount, raw_text, "Uncategorized"])
+        change(dedup.get_index())
     except Exception as e:
-        st.error(f"Failed to save to Google Sheets: {e}")
+        _report("warning", f"Could not update the duplicate receipt index: {e}")
 
+@metrics.instrument("db_call")
+def add_expense(amount, expense_date, raw_text="", expense_id=None):
+    """
+    Queues a new expense, under `expense_id` if given (see new_expense_id).
+    Returns the Future of the write (None if storage is unavailable);
+    call flush_writes() to send it immediately and wait.
+    """
+    store = init_db()
+    if not store:
+        return None
+    try:
+        return store.add([_expense_row(amount, expense_date, raw_text, expense_id=expense_id)])
+    except Exception as e:
+        _report("error", f"Failed to save expense: {e}")
+        return None
+
+@metrics.instrument("db_call")
+def add_expenses(expenses):
+    """
+    Saves many expenses with a single write and waits for it.
+    `expenses` is an iterable of (amount, expense_date, raw_text) tuples, optionally
+    followed by the expense id (see new_expense_id).
+    Returns the number of rows saved.
+    """
+    store = init_db()
+    if not store:
+        return 0
+
+    rows = [_expense_row(*expense[:3], expense_id=expense[3] if len(expense) > 3 else None) for expense in expenses]
+    if not rows:
+        return 0
+
+    try:
+        store.add(rows)
+    except Exception as e:
+        _report("error", f"Failed to save expenses: {e}")
+        return 0
+    return len(rows) if flush_writes() else 0
+
+@metrics.instrument("db_call")
 def get_recent_expenses(limit=10):
-    """Fetches expenses from Google Sheet."""
-    sheet = init_db()
-    if not sheet:
+    """Fetches the most recent expenses."""
+    import pandas as pd
+
+    store = init_db()
+    if not store:
         return pd.DataFrame() # Empty
 
     try:
-        data = sheet.get_all_records()
-        df = pd.DataFrame(data)
-        
-        # If empty
-        if df.empty:
-            return pd.DataFrame(columns=["Date", "Amount", "Raw Text", "Category"])
-            
-        # Standardize column names strictly for internal use if needed, 
-        # but here we just use what's in the sheet.
-        # df keys: 'Date', 'Amount', ...
-        
+        df = store.get_all().drop(columns=["id"])
+
         # Rename to lower case for consistency with previous app logic if we want
         df.columns = [c.lower() for c in df.columns]
-        
-        # Sort by date usually? Or just invert index to show newest first?
-        # Sheet appends to bottom, so newest is last.
-        df = df.iloc[::-1].head(limit)
-        
-        return df
+
+        # Newest rows are last, so invert and take the head.
+        return df.iloc[::-1].head(limit)
     except Exception as e:
-        # If headers exist but no data, get_all_records might fail or return empty.
-        st.error(f"Error reading data: {e}")
+        _report("error", f"Error reading data: {e}")
         return pd.DataFrame()
 
+@metrics.instrument("db_call")
 def get_monthly_total(year, month):
-    """Calculates monthly total from data frame."""
-    sheet = init_db()
-    if not sheet:
-        return 0.0
-        
-    try:
-        data = sheet.get_all_records()
-        df = pd.DataFrame(data)
-        
-        if df.empty:
-            return 0.0
-            
-        # Ensure we have Date and Amount
-        if "Date" not in df.columns or "Amount" not in df.columns:
-            return 0.0
-
-        # Filter
-        # Parse Dates
-        df["Date"] = pd.to_datetime(df["Date"], errors='coerce')
-        
-        # Filter by month/year
-        mask = (df['Date'].dt.year == year) & (df['Date'].dt.month == month)
-        monthly_df = df[mask]
-        
-        total = monthly_df["Amount"].sum()
+    """Calculates the total spent in a month."""
+    store = init_db()
+    if not store:
         return 0.0
+
+    try:
+        return store.monthly_total(year, month)
     except Exception as e:
-        st.error(f"Error calculating total: {e}")
+        _report("error", f"Error calculating total: {e}")
         return 0.0
 
-def delete_expense(row_index):
-    """Deletes a row from the Google Sheet (1-based index)."""
-    sheet = init_db()
-    if not sheet:
+@metrics.instrument("db_call")
+def delete_expense(expense_id):
+    """Deletes an expense by its 'id', and the fingerprints of its receipt."""
+    store = init_db()
+    if not store:
         return False
     try:
-        sheet.delete_rows(row_index)
-        return True
+        store.delete(expense_id)
     except Exception as e:
-        st.error(f"Error deleting row {row_index}: {e}")
+        _report("error", f"Error deleting expense {expense_id}: {e}")
         return False
+    # A deleted receipt may be uploaded again without being flagged as a duplicate
+    _update_receipts(lambda index: index.remove([expense_id]))
+    return True
+
+def update_expense(expense_id, date_val, amount, category, raw_text):
+    """Updates one expense and waits for the write."""
+    return update_expenses([(expense_id, date_val, amount, category, raw_text)])
 
-def update_expense(row_index, date_val, amount, category, raw_text):
-    """Updates a row in the Google Sheet."""
-    sheet = init_db()
-    if not sheet:
+@metrics.instrument("db_call")
+def update_expenses(changes):
+    """
+    Updates many expenses with a single write and waits for it.
+    `changes` is an iterable of (expense_id, date, amount, category, raw_text) tuples.
+    """
+    store = init_db()
+    if not store:
         return False
+    # Columns: Date, Amount, Raw Text, Category
+    changes = [
+        (expense_id, _expense_row(amount, date_val, raw_text, category))
+        for expense_id, date_val, amount, category, raw_text in changes
+    ]
     try:
-        # Check if date is date object
-        if isinstance(date_val, date):
-            date_val = date_val.isoformat()
-            
-        # Update the specific cells. 
-        # Optimize: update_row is better if we update all columns.
-        # Columns: Date, Amount, Raw Text, Category
-        sheet.update(range_name=f"A{row_index}:D{row_index}", values=[[date_val, amount, raw_text, category]])
-        return True
+        store.update(changes)
     except Exception as e:
-        st.error(f"Error updating row {row_index}: {e}")
+        _report("error", f"Error updating expenses: {e}")
         return False
+    if not flush_writes():
+        return False
+    # Duplicate warnings name the saved receipt's date and amount; keep them current
+    _update_receipts(lambda index: index.update([(expense_id, row[0], row[1]) for expense_id, row in changes]))
+    return True
 
+@metrics.instrument("db_call")
+def get_expenses_page(offset=0, limit=50, start_date=None, end_date=None, category=None):
+    """
+    One page of expenses, newest entries first, without the raw OCR text.
+    Optional inclusive date range and exact category filters.
+    Returns (DataFrame, total matching expenses).
+    """
+    import pandas as pd
+
+    store = init_db()
+    if not store:
+        return pd.DataFrame(), 0
+
+    if isinstance(start_date, date):
+        start_date = start_date.isoformat()
+    if isinstance(end_date, date):
+        end_date = end_date.isoformat()
+    try:
+        return store.get_page(offset, limit, start_date, end_date, category)
+    except Exception as e:
+        _report("error", f"Error fetching data: {e}")
+        return pd.DataFrame(), 0
+
+@metrics.instrument("db_call")
+def search_expenses(query, offset=0, limit=50, start_date=None, end_date=None, category=None,
+                    min_amount=None, max_amount=None):
+    """
+    Expenses whose receipt text, merchant or notes match `query`, best matches first,
+    with the listing filters plus an inclusive amount range.
+    Returns (DataFrame with a "Match" excerpt column, total matching expenses).
+    """
+    import pandas as pd
+
+    store = init_db()
+    if not store:
+        return pd.DataFrame(), 0
+
+    if isinstance(start_date, date):
+        start_date = start_date.isoformat()
+    if isinstance(end_date, date):
+        end_date = end_date.isoformat()
+    try:
+        return store.search(query, offset, limit, start_date, end_date, category, min_amount, max_amount)
+    except Exception as e:
+        _report("error", f"Error searching expenses: {e}")
+        return pd.DataFrame(), 0
+
+@metrics.instrument("db_call")
+def get_expense_raw_text(expense_id):
+    """The stored OCR text (plus notes) of one expense."""
+    store = init_db()
+    if not store:
+        return None
+    try:
+        return store.get_raw_text(expense_id)
+    except Exception as e:
+        _report("error", f"Error fetching receipt text: {e}")
+        return None
+
+@metrics.instrument("db_call")
 def get_all_expenses_with_id():
     """
-    Fetches all expenses and returns a DataFrame WITH a 'Row Number' column.
-    Useful for edit/delete operations.
+    Fetches all expenses and returns a DataFrame WITH an 'id' column.
+    The id is permanent, so it stays valid for edit/delete operations while others write.
     """
-    sheet = init_db()
-    if not sheet:
+    import pandas as pd
+
+    store = init_db()
+    if not store:
         return pd.DataFrame()
 
     try:
-        data = sheet.get_all_records()
-        df = pd.DataFrame(data)
-        
-        # Add 1-based Row Number (approximate, assumes get_all_records aligns with sheet rows starting at 2)
-        # get_all_records uses header at row 1. Data starts at row 2.
-        # df index 0 -> Sheet Row 2.
-        df['row_index'] = df.index + 2 
-        
-        # Sort by date desc (optional, but good for UI)
-        # Reorder columns
-        if not df.empty:
-            df = df[['row_index', 'Date', 'Amount', 'Category', 'Raw Text']]
-            
-        return df
+        return store.get_all()
     except Exception as e:
-        st.error(f"Error fetching data: {e}")
+        _report("error", f"Error fetching data: {e}")
         return pd.DataFrame()
+
+def rebuild_rollups():
+    """Recomputes the month x category rollups from the raw expenses. Returns the rollup row count."""
+    store = get_store()
+    if not hasattr(store, "rebuild_rollups"):
+        raise ValueError(f"The '{store.name}' backend does not keep rollups")
+    return store.rebuild_rollups()
+
+def verify_rollups():
+    """Returns the rollup rows that drifted from the raw expenses (empty when consistent)."""
+    store = get_store()
+    if not hasattr(store, "verify_rollups"):
+        raise ValueError(f"The '{store.name}' backend does not keep rollups")
+    return store.verify_rollups()
+
+def rebuild_search_index():
+    """Re-indexes every expense for full-text search. Returns the number of expenses indexed."""
+    store = get_store()
+    if not getattr(store, "full_text", False):
+        raise ValueError(f"The '{store.name}' backend does not keep a full-text index")
+    return store.rebuild_search_index()
+
+def main(argv=None):
+    """Storage maintenance commands: python database.py {verify-rollups,rebuild-rollups,rebuild-search}"""
+    parser = argparse.ArgumentParser(description="SnapBudget storage maintenance.")
+    parser.add_argument("command", choices=["verify-rollups", "rebuild-rollups", "rebuild-search"])
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild-rollups":
+        print(f"Rebuilt {rebuild_rollups()} rollup rows")
+        return 0
+    if args.command == "rebuild-search":
+        print(f"Re-indexed {rebuild_search_index()} expenses")
+        return 0
+
+    drift = verify_rollups()
+    if drift.empty:
+        print("Rollups are consistent")
+        return 0
+    print(drift.to_string(index=False))
+    print(f"{len(drift)} rollup rows drifted; run `python database.py rebuild-rollups` to repair")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,305 @@
+"""
+Duplicate receipt detection.
+
+Every saved receipt leaves two 64-bit fingerprints:
+
+- an image hash: the ink layout of the levelled receipt (text block split into a
+  16 x 4 grid, one bit per cell for "more ink than the median cell"). Lighting,
+  resolution, JPEG quality and the background around the paper do not change it,
+  so a re-upload or a second photo of the same receipt lands within a few bits;
+- a text fingerprint: a simhash of the normalized OCR text, which stays close when
+  a few characters are misread, e.g. a phone photo against an emailed scan.
+
+Fingerprints are kept in multi-index hash tables (one per kind), which answer
+"anything within d bits of this hash?" with a few hundred dictionary lookups instead
+of a scan, so a check stays well under a millisecond with tens of thousands of saved
+receipts. They are stored in a small SQLite file so they survive restarts, keyed by the
+expense the receipt was saved as: database.py drops them when that expense is deleted and
+updates them when it is edited. An upload is checked by its image hash before OCR and by
+its text fingerprint before saving.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+
+import numpy as np
+from PIL import Image
+
+import preprocessing
+
+# Where receipt fingerprints are kept (":memory:" for none).
+DEDUP_PATH = os.environ.get("SNAPBUDGET_DEDUP_PATH", "receipt_hashes.db")
+
+# Most differing bits for two receipts to count as the same, per fingerprint.
+IMAGE_DISTANCE = 3
+TEXT_DISTANCE = 10
+
+# Image hash grid: rows x columns of the text block.
+HASH_ROWS = 16
+HASH_COLS = 4
+# Longest side of the thumbnail the image hash is computed on.
+HASH_SIZE = 400
+
+# Stripped before fingerprinting: notes the app appends and anything that is not a word.
+NOTES_RE = re.compile(r"\s*\[(?:NOTES|FILE):[^\]]*\]")
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)?")
+DIGIT_RE = re.compile(r"[0-9]")
+
+# Text fingerprint weight of a feature that contains a digit.
+DIGIT_WEIGHT = 3
+
+def hamming(a, b):
+    """Number of differing bits between two hashes."""
+    return (a ^ b).bit_count()
+
+def image_hash(image):
+    """
+    64-bit layout hash of a receipt photo or scan. Runs on a HASH_SIZE thumbnail, so the
+    cost barely depends on the camera resolution.
+    """
+    # Shrink before converting: most of the pixels of a camera photo are thrown away anyway
+    factor = max(1, max(image.size) // (2 * HASH_SIZE))
+    small = image.reduce(factor) if factor > 1 else image
+    thumb, _ = preprocessing.thumbnail(small.convert("L"), HASH_SIZE)
+    ink = preprocessing.find_ink(thumb)
+    angle, _ = preprocessing.measure_lines(ink)
+    if abs(angle) >= preprocessing.MIN_SKEW:
+        level = Image.fromarray(thumb).rotate(-angle, resample=Image.Resampling.BILINEAR, expand=True, fillcolor=255)
+        thumb = np.asarray(level)
+        ink = preprocessing.find_ink(thumb)
+
+    rows = np.flatnonzero(ink.mean(axis=1) > 0.01)
+    cols = np.flatnonzero(ink.mean(axis=0) > 0.01)
+    if rows.size < HASH_ROWS or cols.size < HASH_COLS:
+        # No text to speak of: hash the whole frame
+        block = ink.astype(np.float32)
+    else:
+        block = ink[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1].astype(np.float32)
+
+    h, w = block.shape
+    ys = np.linspace(0, h, HASH_ROWS + 1).astype(int)[:-1]
+    xs = np.linspace(0, w, HASH_COLS + 1).astype(int)[:-1]
+    cells = np.add.reduceat(np.add.reduceat(block, ys, axis=0), xs, axis=1)
+    bits = (cells > np.median(cells)).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def normalize_text(text):
+    """OCR text without the app's notes, lowercased and split into word tokens."""
+    return TOKEN_RE.findall(NOTES_RE.sub("", text).lower())
+
+def text_fingerprint(text):
+    """
+    64-bit simhash of the receipt text over character trigrams, so one misread letter
+    only touches three features. Trigrams with digits (prices, dates) tell receipts
+    apart better than the shared wording, so they weigh DIGIT_WEIGHT times as much.
+    Returns None for text too short to compare meaningfully.
+    """
+    normalized = " ".join(normalize_text(text))
+    if len(normalized) < 20:
+        return None
+    features = [normalized[i:i + 3] for i in range(len(normalized) - 2)]
+    weights = np.array([DIGIT_WEIGHT if DIGIT_RE.search(feature) else 1 for feature in features], dtype=np.int32)
+    digests = np.frombuffer(
+        b"".join(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest() for feature in features),
+        dtype=">u8",
+    )
+    # Each feature votes +weight/-weight on every bit; the sign of the sum is the fingerprint
+    bits = np.unpackbits(digests.view(np.uint8).reshape(-1, 8), axis=1).astype(np.int32)
+    votes = ((2 * bits - 1) * weights[:, None]).sum(axis=0)
+    return int.from_bytes(np.packbits(votes > 0).tobytes(), "big")
+
+# Hashes are split into this many 16-bit chunks for the lookup tables.
+CHUNKS = 4
+CHUNK_BITS = 64 // CHUNKS
+
+_flip_masks = {}
+
+def _chunk_masks(radius):
+    """Every CHUNK_BITS-bit mask with at most `radius` bits set (the neighbours to probe)."""
+    if radius not in _flip_masks:
+        _flip_masks[radius] = [mask for mask in range(1 << CHUNK_BITS) if mask.bit_count() <= radius]
+    return _flip_masks[radius]
+
+class HashIndex:
+    """
+    Multi-index hashing over 64-bit hashes: one table per 16-bit chunk. If two hashes
+    differ in at most r bits, then by the pigeonhole principle at least one of the four
+    chunks differs in at most r // 4 bits, so probing each table with the chunk and its
+    neighbours within r // 4 bits finds every match; the candidates are then checked on
+    the full hash. For r <= 3 that is four exact lookups, for r <= 11 a few hundred.
+    """
+
+    def __init__(self):
+        self._tables = [{} for _ in range(CHUNKS)]
+        self._values = []
+        self._items = []
+        self._removed = 0
+
+    @property
+    def size(self):
+        return len(self._values) - self._removed
+
+    def add(self, value, item):
+        """Stores `item` under hash `value`. Returns its position, for remove()."""
+        position = len(self._values)
+        self._values.append(value)
+        self._items.append(item)
+        for chunk, table in enumerate(self._tables):
+            table.setdefault((value >> (chunk * CHUNK_BITS)) & 0xFFFF, []).append(position)
+        return position
+
+    def remove(self, position):
+        """Forgets the hash stored at `position`; its slot is not reused."""
+        if self._items[position] is None:
+            return
+        value = self._values[position]
+        for chunk, table in enumerate(self._tables):
+            key = (value >> (chunk * CHUNK_BITS)) & 0xFFFF
+            table[key].remove(position)
+            if not table[key]:
+                del table[key]
+        self._items[position] = None
+        self._removed += 1
+
+    def search(self, value, radius):
+        """(distance, item) for every stored hash within `radius` bits, closest first."""
+        candidates = set()
+        masks = _chunk_masks(radius // CHUNKS)
+        for chunk, table in enumerate(self._tables):
+            key = (value >> (chunk * CHUNK_BITS)) & 0xFFFF
+            for mask in masks:
+                bucket = table.get(key ^ mask)
+                if bucket:
+                    candidates.update(bucket)
+        found = []
+        for position in candidates:
+            distance = (self._values[position] ^ value).bit_count()
+            if distance <= radius:
+                found.append((distance, self._items[position]))
+        found.sort(key=lambda match: match[0])
+        return found
+
+class ReceiptIndex:
+    """
+    Fingerprints of saved receipts, in memory as HashIndex tables and on disk in SQLite.
+    Shared by every session, so access is locked. Matches are dicts with the saved
+    receipt's `name`, `date`, `amount`, `expense_id` and the bit `distance`.
+    """
+
+    def __init__(self, path=DEDUP_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._images = HashIndex()
+        self._texts = HashIndex()
+        # Hash positions of each saved expense's receipt, for remove() and update()
+        self._saved = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS receipt_hashes ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, image_hash TEXT, text_hash TEXT,"
+            " name TEXT, date TEXT, amount REAL, created TEXT DEFAULT CURRENT_TIMESTAMP, expense_id TEXT)"
+        )
+        if "expense_id" not in {row[1] for row in self._conn.execute("PRAGMA table_info(receipt_hashes)")}:
+            # Index from before fingerprints were tied to expenses; older rows stay unkeyed
+            self._conn.execute("ALTER TABLE receipt_hashes ADD COLUMN expense_id TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_receipt_hashes_expense ON receipt_hashes(expense_id)")
+        self._conn.commit()
+        for image_value, text_value, name, date, amount, expense_id in self._conn.execute(
+                "SELECT image_hash, text_hash, name, date, amount, expense_id FROM receipt_hashes ORDER BY id"):
+            self._remember(_from_hex(image_value), _from_hex(text_value),
+                           {"name": name, "date": date, "amount": amount, "expense_id": expense_id})
+
+    def __len__(self):
+        with self._lock:
+            return max(self._images.size, self._texts.size)
+
+    def find_image(self, value, radius=IMAGE_DISTANCE):
+        """Saved receipts whose image hash is within `radius` bits, closest first."""
+        return self._find(self._images, value, radius)
+
+    def find_text(self, value, radius=TEXT_DISTANCE):
+        """Saved receipts whose text fingerprint is within `radius` bits, closest first."""
+        return self._find(self._texts, value, radius)
+
+    def add(self, image_value, text_value, name="", date=None, amount=None, expense_id=None):
+        """Records a saved receipt, under the id of the expense it was saved as. Either hash may be None."""
+        if image_value is None and text_value is None:
+            return
+        date = None if date is None else str(date)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO receipt_hashes (image_hash, text_hash, name, date, amount, expense_id) VALUES (?, ?, ?, ?, ?, ?)",
+                (_to_hex(image_value), _to_hex(text_value), name, date, amount, expense_id),
+            )
+            self._conn.commit()
+            self._remember(image_value, text_value, {"name": name, "date": date, "amount": amount, "expense_id": expense_id})
+
+    def remove(self, expense_ids):
+        """Forgets the receipts saved as these expenses (after they were deleted)."""
+        expense_ids = list(expense_ids)
+        with self._lock:
+            self._conn.executemany("DELETE FROM receipt_hashes WHERE expense_id = ?", [(expense_id,) for expense_id in expense_ids])
+            self._conn.commit()
+            for expense_id in expense_ids:
+                for item, image_position, text_position in self._saved.pop(expense_id, []):
+                    if image_position is not None:
+                        self._images.remove(image_position)
+                    if text_position is not None:
+                        self._texts.remove(text_position)
+
+    def update(self, changes):
+        """Applies (expense_id, date, amount) edits of saved expenses to their receipts."""
+        changes = [(expense_id, None if date is None else str(date), amount) for expense_id, date, amount in changes]
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE receipt_hashes SET date = ?, amount = ? WHERE expense_id = ?",
+                [(date, amount, expense_id) for expense_id, date, amount in changes],
+            )
+            self._conn.commit()
+            for expense_id, date, amount in changes:
+                for item, _, _ in self._saved.get(expense_id, []):
+                    item.update(date=date, amount=amount)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _find(self, tree, value, radius):
+        if value is None:
+            return []
+        with self._lock:
+            return [dict(item, distance=distance) for distance, item in tree.search(value, radius)]
+
+    def _remember(self, image_value, text_value, item):
+        image_position = None if image_value is None else self._images.add(image_value, item)
+        text_position = None if text_value is None else self._texts.add(text_value, item)
+        if item["expense_id"] is not None:
+            self._saved.setdefault(item["expense_id"], []).append((item, image_position, text_position))
+
+def _to_hex(value):
+    # SQLite integers are signed, so 64-bit hashes are stored as hex text
+    return None if value is None else f"{value:016x}"
+
+def _from_hex(value):
+    return None if value is None else int(value, 16)
+
+# The process-wide index, shared by every session.
+_index = None
+_index_lock = threading.Lock()
+
+def get_index():
+    """Returns the process-wide receipt index, loading it on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ReceiptIndex()
+        return _index
+
+def set_index(index):
+    """Swaps the active index (e.g. for a benchmark). Returns the previous one."""
+    global _index
+    with _index_lock:
+        previous, _index = _index, index
+        return previous
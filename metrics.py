@@ -0,0 +1,331 @@
+"""
+Lightweight timings and counters for the hot paths: storage calls, Sheets API calls,
+cache hits, OCR stages.
+
+Off by default. While disabled every hook is a flag check and a shared no-op, so the
+instrumented code pays nothing measurable; turn it on with SNAPBUDGET_METRICS=1,
+enable(), or by starting the app with SNAPBUDGET_DIAGNOSTICS=1.
+
+    @metrics.instrument("db_call")              # histogram db_call_seconds{function="..."}
+    def get_expenses_page(...): ...
+
+    with metrics.timer("sheets_api", method="get_all_records"):
+        ...
+    metrics.count("cache_hits", cache="ocr")    # counter cache_hits_total{cache="ocr"}
+
+Everything lands in one process-wide registry, exported as Prometheus text
+(to_prometheus, or serve() for scraping) or as JSON (to_json). A trace started with
+start_trace() additionally collects every timing taken on the current thread, which
+is how the app's Diagnostics page breaks down a single rerun.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from functools import wraps
+
+# Prefix of every exported metric name.
+NAMESPACE = "snapbudget"
+
+# Histogram bucket bounds in seconds (Prometheus `le`), from a cache hit to a slow OCR.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Most spans kept in one trace; a runaway loop should not grow it without bound.
+TRACE_LIMIT = 500
+
+_enabled = os.environ.get("SNAPBUDGET_METRICS", "0") == "1"
+
+def enabled():
+    return _enabled
+
+def enable(on=True):
+    """Turns collection on (or off) for the whole process."""
+    global _enabled
+    _enabled = bool(on)
+
+class Histogram:
+    """Cumulative-bucket histogram of observations in seconds."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (inf past the last bound)."""
+        rank = q * self.count
+        seen = 0
+        for bound, hits in zip(BUCKETS + (float("inf"),), self.buckets):
+            seen += hits
+            if seen >= rank and hits:
+                return bound
+        return 0.0
+
+class Registry:
+    """Counters and histograms keyed by (name, sorted label items). Shared by every session, so locked."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def count(self, name, value, labels):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, labels):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        """{"counters": [...], "histograms": [...]}: plain data, safe to serialize."""
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            histograms = [{
+                "name": name, "labels": dict(labels), "count": h.count, "sum": h.sum,
+                "p50": h.quantile(0.5), "p95": h.quantile(0.95),
+                "buckets": dict(zip([str(b) for b in BUCKETS] + ["+Inf"], _cumulative(h.buckets))),
+            } for (name, labels), h in sorted(self._histograms.items())]
+        return {"counters": counters, "histograms": histograms}
+
+def _cumulative(buckets):
+    total, out = 0, []
+    for hits in buckets:
+        total += hits
+        out.append(total)
+    return out
+
+_registry = Registry()
+_registry_lock = threading.Lock()
+
+def get_registry():
+    return _registry
+
+def set_registry(registry):
+    """Swaps the active registry (e.g. for a benchmark). Returns the previous one."""
+    global _registry
+    with _registry_lock:
+        previous, _registry = _registry, registry
+        return previous
+
+def reset():
+    _registry.reset()
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+# --- Traces: the timings of one Streamlit rerun (or any unit of work) on one thread ---
+
+_local = threading.local()
+
+class Trace:
+    """Spans recorded on one thread between start_trace() and end_trace()."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.seconds = None
+        self.spans = []  # (depth, name, labels, seconds), in the order they finished
+        self.counts = {}
+        self.depth = 0
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "seconds": self.seconds,
+            "spans": [{"depth": depth, "name": name, "labels": dict(labels), "seconds": seconds}
+                      for depth, name, labels, seconds in self.spans],
+            "counts": {f"{name}{_format_labels(labels)}": value for (name, labels), value in self.counts.items()},
+        }
+
+def start_trace(name=""):
+    """Starts collecting this thread's timings (a no-op returning None while disabled)."""
+    if not _enabled:
+        return None
+    _local.trace = Trace(name)
+    return _local.trace
+
+def end_trace():
+    """Stops the thread's trace and returns it, or None if none was running."""
+    trace = getattr(_local, "trace", None)
+    _local.trace = None
+    if trace is not None:
+        trace.seconds = time.perf_counter() - trace.started
+    return trace
+
+def _current_trace():
+    return getattr(_local, "trace", None)
+
+# --- Recording ---
+
+def count(name, value=1, **labels):
+    """Adds `value` to the counter `name` (exported as name_total)."""
+    if not _enabled:
+        return
+    key = _labels(labels)
+    _registry.count(name, value, key)
+    trace = _current_trace()
+    if trace is not None:
+        trace.counts[(name, key)] = trace.counts.get((name, key), 0) + value
+
+def observe(name, seconds, **labels):
+    """Records one duration (exported as the histogram name_seconds)."""
+    if not _enabled:
+        return
+    _observe(name, seconds, _labels(labels), 0)
+
+def observe_stages(name, stage_ms, label="stage"):
+    """Records a {stage: milliseconds} dict (the `timings` the OCR code fills) as one histogram per stage."""
+    if not _enabled:
+        return
+    depth = _current_trace().depth if _current_trace() is not None else 0
+    for stage, ms in stage_ms.items():
+        _observe(name, ms / 1000.0, ((label, stage),), depth)
+
+def _observe(name, seconds, key, depth):
+    _registry.observe(name, seconds, key)
+    trace = _current_trace()
+    if trace is not None and len(trace.spans) < TRACE_LIMIT:
+        trace.spans.append((depth, name, key, seconds))
+
+class _Timer:
+    __slots__ = ("name", "key", "started", "depth")
+
+    def __init__(self, name, key):
+        self.name = name
+        self.key = key
+
+    def __enter__(self):
+        trace = _current_trace()
+        self.depth = trace.depth if trace is not None else 0
+        if trace is not None:
+            trace.depth += 1
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        trace = _current_trace()
+        if trace is not None:
+            trace.depth = self.depth
+        _observe(self.name, seconds, self.key, self.depth)
+        if exc_type is not None:
+            _registry.count(f"{self.name}_errors", 1, self.key)
+        return False
+
+class _NoTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NO_TIMER = _NoTimer()
+
+def timer(name, **labels):
+    """Context manager timing its block into the histogram name_seconds (errors counted too)."""
+    if not _enabled:
+        return _NO_TIMER
+    return _Timer(name, _labels(labels))
+
+def instrument(name, **labels):
+    """Decorator: times every call of the function as timer(name, function=<its name>, **labels)."""
+    def decorate(fn):
+        key = _labels(dict(labels, function=fn.__name__))
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Timer(name, key):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+# --- Export ---
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    escaped = ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in items
+    )
+    return "{" + escaped + "}"
+
+def to_prometheus(registry=None):
+    """The registry in the Prometheus text exposition format (version 0.0.4)."""
+    snapshot = (registry or _registry).snapshot()
+    lines = []
+    typed = set()
+    for counter in snapshot["counters"]:
+        name = f"{NAMESPACE}_{counter['name']}_total"
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_format_labels(counter['labels'].items())} {counter['value']}")
+    for histogram in snapshot["histograms"]:
+        name = f"{NAMESPACE}_{histogram['name']}_seconds"
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        labels = list(histogram["labels"].items())
+        for bound, hits in histogram["buckets"].items():
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {hits}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+def to_json(registry=None, indent=2):
+    return json.dumps((registry or _registry).snapshot(), indent=indent)
+
+_server = None
+
+def serve(port, host="127.0.0.1"):
+    """
+    Serves to_prometheus() at http://host:port/metrics from a daemon thread, for a
+    Prometheus scraper. Started once per process; later calls return the same server.
+    """
+    global _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/metrics.json"):
+                self.send_error(404)
+                return
+            as_json = self.path.startswith("/metrics.json")
+            body = (to_json() if as_json else to_prometheus()).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json" if as_json else "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes every few seconds would flood the app's log
+            pass
+
+    with _registry_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), Handler)
+            threading.Thread(target=_server.serve_forever, name="snapbudget-metrics", daemon=True).start()
+        return _server
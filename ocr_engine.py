@@ -1,90 +1,612 @@
 import pytesseract
-from PIL import Image, ImageEnhance, ImageFilter
-import re
+from PIL import Image
+import os
+import time
+import queue
+import shlex
+import hashlib
+import threading
+from collections import OrderedDict
+
+import metrics
+import ocr_layout
+import preprocessing
+import receipt_parser
+
+try:
+    # Optional: binds libtesseract directly, so a loaded model can be reused across images
+    import tesserocr
+except ImportError:
+    tesserocr = None
 
 # IMPORTANT: Windows users need to point to the tesseract executable
 # If strictly necessary, we could add auto-detection, but usually this is set in PATH or manually.
 # For this environment, we'll try to rely on PATH or a standard location.
 # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
-def preprocess_image(image):
+# Extra flags passed to Tesseract (e.g. "--psm 6"). Part of the OCR cache key.
+TESSERACT_CONFIG = ""
+
+# Bump whenever the preprocessing code changes so cached results from older code are not reused.
+# (The configured stages are part of the cache key on their own.)
+PREPROCESS_VERSION = 2
+
+# Max number of OCR results kept in memory.
+OCR_CACHE_SIZE = 256
+
+# Optional directory for a persistent OCR cache that survives restarts.
+OCR_CACHE_DIR = os.environ.get("SNAPBUDGET_OCR_CACHE_DIR")
+
+# Which OCR backend runs Tesseract:
+#   "tesserocr"   - warm libtesseract instances kept in a pool; images stay in memory
+#   "pytesseract" - the tesseract command line, one process (and temp file) per image
+#   "auto"        - tesserocr when it is installed and loads, otherwise pytesseract
+OCR_BACKEND = os.environ.get("SNAPBUDGET_OCR_BACKEND", "auto").lower()
+
+# Most loaded Tesseract instances the tesserocr backend keeps (each holds its own model).
+OCR_WORKERS = int(os.environ.get("SNAPBUDGET_OCR_WORKERS", min(4, os.cpu_count() or 1)))
+
+# How the upload page reads receipts:
+#   "layout" - word boxes and confidences (image_to_data); totals are matched to their labels by position
+#   "text"   - plain text (image_to_string) parsed line by line
+OCR_MODE = os.environ.get("SNAPBUDGET_OCR_MODE", "layout").lower()
+
+# Layout mode: a total Tesseract is less sure of than this (0-100) is read again from a
+# sharper crop of its line. 0 turns the second read off.
+REOCR_CONFIDENCE = float(os.environ.get("SNAPBUDGET_REOCR_CONFIDENCE", 60))
+# Resolution of that crop, relative to the image the first read saw.
+REOCR_ZOOM = 2.0
+
+# Two-pass reading of just the total (batch ingestion): a quick pass over a smaller copy
+# of the image finds the totals lines, then only that band is OCR'd at full quality.
+# SNAPBUDGET_TWO_PASS=1 makes it the batch default (also: batch_ingest.py --two-pass).
+TWO_PASS = os.environ.get("SNAPBUDGET_TWO_PASS", "0") == "1"
+# Size of the first-pass image relative to the preprocessed one.
+COARSE_SCALE = 0.5
+# First pass: sparse text, LSTM only, and only the characters of amounts and of the
+# receipt_parser keywords (total, subtotal, tax, amount due, balance...).
+COARSE_CONFIG = "--psm 11 --oem 1 -c tessedit_char_whitelist=0123456789.,$:ABCDEGHLMNORSTUVXabcdeghlmnorstuvx"
+# Lines of context kept above and below the totals in the second-pass crop.
+TOTALS_MARGIN = 1.5
+
+class OCRCache:
     """
-    Convert image to grayscale and apply mild processing to improve OCR accuracy.
+    LRU cache of OCR text keyed by a content hash, with an optional on-disk store.
+    Shared by all Streamlit sessions in the process, so access is locked.
     """
-    # Convert to grayscale
-    img = image.convert('L')
-    
-    # Increase contrast roughly
-    enhancer = ImageEnhance.Contrast(img)
-    img = enhancer.enhance(1.5)
-    
-    # Optional: Apply mild sharpening if needed, but sometimes it adds noise.
-    # img = img.filter(ImageFilter.SHARPEN)
-    
-    return img
 
-def extract_text(image):
+    def __init__(self, max_entries=OCR_CACHE_SIZE, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".txt")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.count("cache_hits", cache="ocr")
+                return self._entries[key]
+
+        if self.cache_dir:
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as f:
+                    text = f.read()
+            except OSError:
+                text = None
+            if text is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, text)
+                metrics.count("cache_hits", cache="ocr_disk")
+                return text
+
+        with self._lock:
+            self.misses += 1
+        metrics.count("cache_misses", cache="ocr")
+        return None
+
+    def put(self, key, text):
+        with self._lock:
+            self._remember(key, text)
+
+        if self.cache_dir:
+            # Write to a temp file first so a crash never leaves a truncated entry
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(tmp_path, path)
+            except OSError:
+                pass
+
+    def _remember(self, key, text):
+        self._entries[key] = text
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+_ocr_cache = OCRCache(cache_dir=OCR_CACHE_DIR)
+
+def cache_stats():
+    """Hit/miss counters of the OCR result cache."""
+    return _ocr_cache.stats()
+
+def clear_cache():
+    """Empties the in-memory OCR cache (the on-disk store is left alone)."""
+    _ocr_cache.clear()
+
+def ocr_cache_key(image, image_bytes=None, mode="text"):
     """
-    Run Tesseract OCR on the image.
+    Content hash identifying an OCR result: the image plus every setting that changes the output.
+    Hashing the original file bytes (when the caller has them) avoids decoding the image.
     """
-    try:
-        processed_img = preprocess_image(image)
-        text = pytesseract.image_to_string(processed_img)
-        return text
-    except Exception as e:
-        # Check if tesseract is not found, try pointing to default location
-        if "tesseract is not installed" in str(e).lower() or "not found" in str(e).lower():
+    h = hashlib.sha256()
+    stages = ",".join(preprocessing.PREPROCESS_STAGES)
+    # tesserocr and the tesseract command line do not read an image the same way
+    backend = get_backend()
+    settings = (f"{PREPROCESS_VERSION}|{stages}|{preprocessing.BINARIZE_METHOD}|{TESSERACT_CONFIG}|"
+                f"{backend.name}|{backend.version()}|")
+    if mode == "layout":
+        settings += f"{mode}|{REOCR_CONFIDENCE}|{REOCR_ZOOM}|"
+    elif mode == "two-pass":
+        settings += f"{mode}|{COARSE_SCALE}|{COARSE_CONFIG}|{TOTALS_MARGIN}|"
+    h.update(settings.encode("utf-8"))
+    if image_bytes is not None:
+        h.update(image_bytes)
+    else:
+        h.update(f"{image.mode}|{image.size}|".encode("utf-8"))
+        h.update(image.tobytes())
+    return h.hexdigest()
+
+class TesseractMissing(Exception):
+    """No usable Tesseract installation was found."""
+
+class OCRBackend:
+    """Turns a preprocessed PIL image into text. Shared by every session, so it must be thread-safe."""
+
+    name = "base"
+
+    def image_to_string(self, image):
+        raise NotImplementedError
+
+    def image_to_data(self, image):
+        """Tesseract's TSV output for the image: one row per word with its box and confidence."""
+        raise NotImplementedError
+
+    def configured(self, config):
+        """The same kind of backend running Tesseract with another command-line config."""
+        return self
+
+    def version(self):
+        """Version of the backend and the Tesseract it runs; part of the OCR cache key."""
+        return ""
+
+    def close(self):
+        """Releases whatever the backend holds (loaded models, processes)."""
+
+class PytesseractBackend(OCRBackend):
+    """Runs the tesseract command line through pytesseract: a new process per image."""
+
+    name = "pytesseract"
+
+    def __init__(self, config=TESSERACT_CONFIG):
+        self.config = config
+        self._version = None
+
+    def image_to_string(self, image):
+        return self._call(pytesseract.image_to_string, image)
+
+    def version(self):
+        # Asking runs tesseract once; a missing install is asked again next time
+        if self._version is None:
+            try:
+                self._version = f"{getattr(pytesseract, '__version__', '')}/{pytesseract.get_tesseract_version()}"
+            except Exception:
+                return ""
+        return self._version
+
+    def image_to_data(self, image):
+        return self._call(pytesseract.image_to_data, image)
+
+    def configured(self, config):
+        return PytesseractBackend(config)
+
+    def _call(self, function, image):
+        try:
+            return function(image, config=self.config)
+        except Exception as e:
+            # Check if tesseract is not found, try pointing to default location
+            if "tesseract is not installed" not in str(e).lower() and "not found" not in str(e).lower():
+                raise
             try:
                 # Common default installation path on Windows
                 default_path = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
                 pytesseract.pytesseract.tesseract_cmd = default_path
-                return pytesseract.image_to_string(preprocess_image(image))
+                return function(image, config=self.config)
             except Exception as e2:
-                # If still failing, return the missing error
-                if "not found" in str(e2).lower() or "permission denied" in str(e2).lower():
-                     return "TESSERACT_MISSING"
-                return f"Error extracting text (Retry failed): {e2}"
+                # If still failing, report the install as missing
+                if (isinstance(e2, pytesseract.TesseractNotFoundError)
+                        or "not found" in str(e2).lower() or "permission denied" in str(e2).lower()):
+                    raise TesseractMissing(str(e2))
+                raise RuntimeError(f"Retry failed: {e2}")
+
+def _tesseract_options(config):
+    """(language, page segmentation mode, engine mode, {variable: value}) from a tesseract command-line config string."""
+    lang, psm, oem, variables = "eng", None, None, {}
+    args = shlex.split(config)
+    for i, arg in enumerate(args[:-1]):
+        value = args[i + 1]
+        if arg == "-l":
+            lang = value
+        elif arg == "--psm":
+            psm = int(value)
+        elif arg == "--oem":
+            oem = int(value)
+        elif arg == "-c" and "=" in value:
+            key, _, val = value.partition("=")
+            variables[key] = val
+    return lang, psm, oem, variables
+
+class TesserocrBackend(OCRBackend):
+    """
+    A pool of loaded libtesseract instances (tesserocr). Each keeps its language model
+    between images, and images are handed over in memory, so the per-image cost is the
+    recognition itself. tesserocr releases the GIL, so pooled instances run in parallel.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self, size=None, config=TESSERACT_CONFIG):
+        if tesserocr is None:
+            raise TesseractMissing("tesserocr is not installed")
+        self.size = max(1, size or OCR_WORKERS)
+        self.config = config
+        self.lang, self.psm, self.oem, self.variables = _tesseract_options(config)
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        # Load one model now: fails fast on a broken install, and the first receipt finds it warm
+        self._idle.put(self._new_api())
+        self._created = 1
 
+    def _new_api(self):
+        kwargs = {"lang": self.lang}
+        if self.psm is not None:
+            kwargs["psm"] = self.psm
+        if self.oem is not None:
+            kwargs["oem"] = self.oem
+        try:
+            api = tesserocr.PyTessBaseAPI(**kwargs)
+        except RuntimeError as e:
+            # Raised when the language data cannot be loaded
+            raise TesseractMissing(str(e))
+        for key, value in self.variables.items():
+            api.SetVariable(key, value)
+        return api
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        # Grow the pool up to `size` under load, then wait for a free instance
+        with self._lock:
+            grow = self._created < self.size
+            if grow:
+                self._created += 1
+        if not grow:
+            return self._idle.get()
+        try:
+            return self._new_api()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def image_to_string(self, image):
+        api = self._acquire()
+        try:
+            api.SetImage(image)
+            return api.GetUTF8Text()
+        finally:
+            api.Clear()
+            self._idle.put(api)
+
+    def configured(self, config):
+        # A pool of its own: a loaded instance keeps the settings it was created with
+        return TesserocrBackend(self.size, config)
+
+    def version(self):
+        return f"{getattr(tesserocr, '__version__', '')}/{tesserocr.tesseract_version()}"
+
+    def image_to_data(self, image):
+        api = self._acquire()
+        try:
+            api.SetImage(image)
+            api.Recognize()
+            return api.GetTSVText(0)
+        finally:
+            api.Clear()
+            self._idle.put(api)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().End()
+            except queue.Empty:
+                break
+
+# The process-wide OCR backend, created on first use.
+_backend = None
+_backend_lock = threading.Lock()
+# (backend, the same backend with COARSE_CONFIG) for the first of the two passes.
+_coarse_backend = None
+
+def create_backend(name=None):
+    """Builds the OCR backend named by `name` (default: OCR_BACKEND)."""
+    name = name or OCR_BACKEND
+    if name == "pytesseract":
+        return PytesseractBackend()
+    if name == "tesserocr":
+        return TesserocrBackend()
+    if name == "auto":
+        try:
+            return TesserocrBackend()
+        except TesseractMissing:
+            return PytesseractBackend()
+    raise ValueError(f"Unknown OCR backend '{name}' (expected 'auto', 'tesserocr' or 'pytesseract')")
+
+def get_backend():
+    """Returns the process-wide OCR backend, creating it on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend()
+        return _backend
+
+def set_backend(backend):
+    """Swaps the active OCR backend (e.g. for a benchmark). Returns the previous one."""
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, backend
+        return previous
+
+def get_coarse_backend():
+    """The active backend configured for the quick first pass (COARSE_CONFIG), created on first use."""
+    global _coarse_backend
+    backend = get_backend()
+    with _backend_lock:
+        if _coarse_backend is None or _coarse_backend[0] is not backend:
+            _coarse_backend = (backend, backend.configured(COARSE_CONFIG))
+        return _coarse_backend[1]
+
+@metrics.instrument("ocr")
+def preprocess_image(image):
+    """
+    Crop, deskew, downscale and binarize the image for OCR (see preprocessing.py).
+    """
+    return preprocessing.run(image).image
+
+@metrics.instrument("ocr")
+def extract_text(image, image_bytes=None, timings=None, two_pass=False):
+    """
+    Run Tesseract OCR on the image.
+    Results are memoized by content hash, so Streamlit reruns on the same receipt skip Tesseract.
+    Pass the uploaded file's bytes as image_bytes to make the lookup cheaper.
+    Pass a dict as `timings` to get milliseconds per preprocessing stage and for Tesseract
+    (empty when the result came from the cache).
+    With two_pass=True only the totals lines are read at full quality (see _run_two_pass),
+    so the text is enough for parse_total but not the whole receipt.
+    """
+    key = ocr_cache_key(image, image_bytes, mode="two-pass" if two_pass else "text")
+    cached = _ocr_cache.get(key)
+    if cached is not None:
+        return cached
+
+    stages = {}
+    text = _run_two_pass(image, stages) if two_pass else _run_tesseract(image, stages)
+    if timings is not None:
+        timings.update(stages)
+    metrics.observe_stages("ocr_stage", stages)
+    # Only successful reads are cached; a missing Tesseract install may get fixed
+    if text != "TESSERACT_MISSING" and not text.startswith("Error extracting text"):
+        _ocr_cache.put(key, text)
+    return text
+
+def _run_tesseract(image, timings=None):
+    """Preprocesses the image and runs the OCR backend on it (uncached)."""
+    try:
+        result = preprocessing.run(image)
+        if timings is not None:
+            timings.update(result.timings)
+        started = time.perf_counter()
+        text = get_backend().image_to_string(result.image)
+        if timings is not None:
+            timings["tesseract"] = (time.perf_counter() - started) * 1000.0
+        return text
+    except TesseractMissing:
+        return "TESSERACT_MISSING"
+    except Exception as e:
         return f"Error extracting text: {e}"
 
+def _run_two_pass(image, timings=None):
+    """
+    Reads the totals of a receipt in two passes (uncached). The first pass runs a fast
+    Tesseract configuration on a COARSE_SCALE copy of the preprocessed image to find
+    where the total labels are; the second reads just that band at full quality. Falls
+    back to reading the whole image when no label is found or the band has no total.
+    """
+    try:
+        result = preprocessing.run(image)
+        if timings is not None:
+            timings.update(result.timings)
+
+        started = time.perf_counter()
+        full = result.image
+        coarse = full.resize((max(1, round(full.width * COARSE_SCALE)), max(1, round(full.height * COARSE_SCALE))),
+                             Image.Resampling.BILINEAR)
+        band = _totals_band(ocr_layout.OCRWords.from_tsv(get_coarse_backend().image_to_data(coarse)))
+        if timings is not None:
+            timings["coarse"] = (time.perf_counter() - started) * 1000.0
+
+        if band is not None:
+            started = time.perf_counter()
+            top, bottom = (min(full.height, max(0, round(y / COARSE_SCALE))) for y in band)
+            text = get_backend().image_to_string(full.crop((0, top, full.width, bottom)))
+            if timings is not None:
+                timings["tesseract"] = (time.perf_counter() - started) * 1000.0
+            if receipt_parser.parse(text).total is not None:
+                return text
+
+        # Nothing usable in the band: read the whole receipt as usual
+        started = time.perf_counter()
+        text = get_backend().image_to_string(full)
+        if timings is not None:
+            timings["fallback"] = (time.perf_counter() - started) * 1000.0
+        return text
+    except TesseractMissing:
+        return "TESSERACT_MISSING"
+    except Exception as e:
+        return f"Error extracting text: {e}"
+
+def _totals_band(words):
+    """
+    (top, bottom) of the lines from the first subtotal/tax/total label to the last total
+    label, with TOTALS_MARGIN lines of context, in the coordinates of `words`; None when
+    there is no total label.
+    """
+    labels, totals = [], []
+    for i, word in enumerate(words.text):
+        keyword = receipt_parser.KEYWORD_RE.search(word)
+        if keyword is not None:
+            labels.append(i)
+            if keyword.lastgroup in ("grand", "total", "balance"):
+                totals.append(i)
+    if not totals:
+        return None
+    # Totals follow the subtotal and tax; labels far above the last total are line items
+    last = totals[-1]
+    line = float(words.height[last])
+    first = min((i for i in labels if words.top[last] - words.top[i] < 6 * line), key=lambda i: words.top[i])
+    return words.top[first] - TOTALS_MARGIN * line, words.bottom[last] + TOTALS_MARGIN * line
+
+class LayoutResult:
+    """
+    A receipt read in layout mode: the OCR `words` (ocr_layout.OCRWords), their `text`,
+    the parsed `fields` (receipt_parser.ParsedReceipt) and whether the total was read
+    again from a sharper crop (`reocr`). On failure `text` holds the same error strings
+    extract_text returns and `fields` is None.
+    """
+
+    def __init__(self, words=None, text="", fields=None, reocr=False):
+        self.words = words if words is not None else ocr_layout.OCRWords()
+        self.text = text
+        self.fields = fields
+        self.reocr = reocr
+
+@metrics.instrument("ocr")
+def extract_layout(image, image_bytes=None, timings=None):
+    """
+    Run Tesseract for word boxes and confidences and read the receipt from its layout.
+    A total read with low confidence is read again from just its line, re-rendered from
+    the original photo at REOCR_ZOOM times the resolution. Cached like extract_text.
+    """
+    key = ocr_cache_key(image, image_bytes, mode="layout")
+    cached = _ocr_cache.get(key)
+    if cached is not None:
+        tsv, _, reocr_text = cached.partition("\f")
+        return _read_layout(ocr_layout.OCRWords.from_tsv(tsv), reocr_text or None)
+
+    stages = {}
+    try:
+        result = preprocessing.run(image)
+        stages.update(result.timings)
+        started = time.perf_counter()
+        tsv = get_backend().image_to_data(result.image)
+        stages["tesseract"] = (time.perf_counter() - started) * 1000.0
+
+        words = ocr_layout.OCRWords.from_tsv(tsv)
+        layout = _read_layout(words)
+        reocr_text = ""
+        box = _reocr_box(layout)
+        if box is not None:
+            started = time.perf_counter()
+            reocr_text = get_backend().image_to_string(preprocessing.region(image, result, box, REOCR_ZOOM))
+            stages["reocr"] = (time.perf_counter() - started) * 1000.0
+            layout = _read_layout(words, reocr_text)
+    except TesseractMissing:
+        return LayoutResult(text="TESSERACT_MISSING")
+    except Exception as e:
+        return LayoutResult(text=f"Error extracting text: {e}")
+    finally:
+        if timings is not None:
+            timings.update(stages)
+        metrics.observe_stages("ocr_stage", stages)
+
+    # Form feed never appears in TSV output, so it can separate the second read
+    _ocr_cache.put(key, f"{tsv}\f{reocr_text}")
+    return layout
+
+def _reocr_box(layout):
+    """The line to read again when the total is unsure, as a box of the OCR'd image; else None."""
+    item = layout.fields.labelled.get("total")
+    if item is None or item.conf >= REOCR_CONFIDENCE:
+        return None
+    words = layout.words
+    left, top, right, bottom = words.box([item.label, item.amount])
+    # Some room around the line so descenders and a slightly tilted baseline fit
+    pad = (bottom - top) // 2
+    return left - pad, top - pad, right + pad, bottom + pad
+
+def _read_layout(words, reocr_text=None):
+    """Parses OCR words (plus the second read of the total line, if any) into a LayoutResult."""
+    fields = ocr_layout.parse(words)
+    layout = LayoutResult(words, words.to_text(), fields)
+    if reocr_text:
+        reread = receipt_parser.parse(reocr_text)
+        # Only a labelled total counts; a neighbouring subtotal line caught in the crop does not
+        if reread.total is not None and reread.confidence["total"] >= receipt_parser.TOTAL_CONFIDENCE["balance"]:
+            layout.reocr = True
+            # The sharper read wins; both reads agreeing settles it
+            agree = fields.total is not None and abs(reread.total - fields.total) < 0.005
+            fields.confidence["total"] = max(fields.confidence["total"], 0.95 if agree else reread.confidence["total"] * 0.9)
+            fields.total = reread.total
+            if fields.subtotal is not None and fields.tax is not None and abs(fields.subtotal + fields.tax - fields.total) < 0.005:
+                fields.confidence["total"] = max(fields.confidence["total"], 0.98)
+    return layout
+
 def parse_total(text):
     """
-    Attempt to find the 'Total' amount from OCR text using Regex.
+    The receipt total from OCR text (see receipt_parser for the other fields).
     Returns the float amount or 0.0 if not found.
     """
-    lines = text.split('\n')
-    total_candidates = []
-
-    # Common patterns for total lines
-    # Look for "Total", "Amount Due", "Grand Total" followed by digits
-    # Regex explanations:
-    # 1. (?:Total|Amount|Due|Pay)... matches keywords
-    # 2. [^0-9\.]* matches any non-digit/dot chars (like currency symbols, spaces, colons)
-    # 3. (\d+\.\d{2}) captures the number (assuming 2 decimal places usually)
-    
-    pattern = r"(?i)(?:total|grand total|amount due|balance|subtotal).*?(\d{1,5}\.\d{2})"
-    
-    for line in lines:
-        cleaned_line = line.strip()
-        match = re.search(pattern, cleaned_line)
-        if match:
-            try:
-                amount = float(match.group(1))
-                total_candidates.append(amount)
-            except ValueError:
-                continue
-                
-    # Fallback: Just look for the largest number that looks like a price at the bottom of the receipt?
-    # This is risky. Let's stick to explicit keywords first.
-    
-    # If multiple matches, usually the last "Total" is the Grand Total (after tax etc)
-    if total_candidates:
-        return total_candidates[-1]
-    
-    # Strategy B: If no keyword found, look for isolated prices and take the max? 
-    # Or just return 0.0 and let user fill it. Better to be safe.
-    
-    return 0.0
+    total = receipt_parser.parse(text).total
+    return total if total is not None else 0.0
 
 if __name__ == "__main__":
     # Test stub
@@ -0,0 +1,233 @@
+"""
+Background OCR jobs for the Streamlit app.
+
+Submitting a receipt returns a job id straight away. OCR runs on a bounded thread
+pool (the OCR backends release the GIL or run Tesseract in a subprocess), and the
+page polls the job for its status and result, so a script thread never waits on
+Tesseract. The number of queued + running jobs is capped, jobs that run too long
+are reported as timed out, and a job can be cancelled when its upload is replaced.
+A running OCR call cannot be interrupted, so timed-out and cancelled jobs keep
+counting toward the cap until their worker is actually free.
+"""
+import io
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+import ocr_engine
+import receipt_parser
+
+# Receipts OCR'd at the same time. Defaults to the OCR backend's pool size.
+OCR_JOB_WORKERS = int(os.environ.get("SNAPBUDGET_OCR_JOB_WORKERS", ocr_engine.OCR_WORKERS))
+
+# Most jobs queued or running at once (abandoned ones still running included);
+# further submissions are refused with QueueFull.
+MAX_QUEUE_DEPTH = 16
+
+# Seconds a job may run before it is reported as timed out (its result is then discarded).
+JOB_TIMEOUT = 60.0
+
+# Seconds a finished job stays available for polling.
+JOB_TTL = 600.0
+
+# Job states.
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed_out"
+
+class QueueFull(Exception):
+    """Too many OCR jobs are waiting; try again shortly."""
+
+class OCRJob:
+    """
+    One receipt's OCR. Read `status`; once it is DONE, `text`, `total`, `fields`
+    (a receipt_parser.ParsedReceipt) and `timings` hold the result, and FAILED / TIMED_OUT jobs carry an `error` message.
+    """
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = QUEUED
+        self.text = None
+        self.total = None
+        self.fields = None
+        self.timings = {}
+        self.error = None
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self._callbacks = []
+        self._finished = threading.Event()
+
+    @property
+    def pending(self):
+        return self.status in (QUEUED, RUNNING)
+
+    def wait(self, timeout=None):
+        """Blocks until the job has finished (in any state). Returns False on timeout."""
+        return self._finished.wait(timeout)
+
+class OCRJobService:
+    """Runs OCR jobs on a bounded thread pool and keeps their state for polling."""
+
+    def __init__(self, workers=None, max_queue_depth=MAX_QUEUE_DEPTH, timeout=JOB_TIMEOUT, ttl=JOB_TTL):
+        self.max_queue_depth = max_queue_depth
+        self.timeout = timeout
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max(1, workers or OCR_JOB_WORKERS), thread_name_prefix="snapbudget-ocr")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, image_bytes):
+        """Queues OCR of an image file's bytes. Returns the job id; raises QueueFull when saturated."""
+        with self._lock:
+            timed_out = self._expire()
+            active = sum(1 for job in self._jobs.values() if self._busy(job))
+            if active < self.max_queue_depth:
+                job = OCRJob(uuid.uuid4().hex)
+                self._jobs[job.id] = job
+                job.future = self._executor.submit(self._run, job, image_bytes)
+        for expired_job, callbacks in timed_out:
+            self._notify(expired_job, callbacks)
+        if active >= self.max_queue_depth:
+            raise QueueFull(f"{active} receipts are already waiting for OCR")
+        return job.id
+
+    def get(self, job_id):
+        """The job with this id, or None if it is unknown or expired."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            callbacks = self._check_timeout(job) if job is not None else []
+        self._notify(job, callbacks)
+        return job
+
+    def cancel(self, job_id):
+        """
+        Cancels a queued or running job. A running Tesseract call cannot be interrupted;
+        it finishes in the background, still counting toward max_queue_depth, and its
+        result is dropped. Returns True if cancelled.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.pending:
+                return False
+            job.future.cancel()
+            callbacks = self._complete(job, CANCELLED)
+        self._notify(job, callbacks)
+        return True
+
+    def subscribe(self, job_id, callback):
+        """Calls callback(job) once the job finishes (right away if it already has)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                raise KeyError(job_id)
+            if job.pending:
+                job._callbacks.append(callback)
+                return
+        callback(job)
+
+    def stats(self):
+        """Number of known jobs in each state."""
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job, image_bytes):
+        with self._lock:
+            if job.status != QUEUED:
+                # Cancelled while waiting for a worker
+                return
+            job.status = RUNNING
+            job.started_at = time.monotonic()
+
+        timings = {}
+        fields = None
+        try:
+            image = Image.open(io.BytesIO(image_bytes))
+            if ocr_engine.OCR_MODE == "layout":
+                layout = ocr_engine.extract_layout(image, image_bytes=image_bytes, timings=timings)
+                text, fields = layout.text, layout.fields
+            else:
+                text = ocr_engine.extract_text(image, image_bytes=image_bytes, timings=timings)
+            error = text if text == "TESSERACT_MISSING" or text.startswith("Error extracting text") else None
+        except Exception as e:
+            text, error = None, f"Could not read image: {e}"
+
+        with self._lock:
+            if job.status != RUNNING:
+                # Cancelled or timed out meanwhile: nobody wants this result
+                return
+            job.timings = timings
+            if error:
+                callbacks = self._complete(job, FAILED, error=error)
+            else:
+                job.text = text
+                job.fields = fields or receipt_parser.parse(text)
+                job.total = job.fields.total if job.fields.total is not None else 0.0
+                callbacks = self._complete(job, DONE)
+        self._notify(job, callbacks)
+
+    def _complete(self, job, status, error=None):
+        # Called with self._lock held; returns the callbacks to run once it is released
+        job.status = status
+        job.error = error
+        job.finished_at = time.monotonic()
+        callbacks, job._callbacks = job._callbacks, []
+        job._finished.set()
+        return callbacks
+
+    def _busy(self, job):
+        # Queued or running, or given up on while its worker thread is still in OCR
+        return job.pending or not job.future.done()
+
+    def _check_timeout(self, job):
+        # Called with self._lock held
+        if job.status == RUNNING and time.monotonic() - job.started_at > self.timeout:
+            return self._complete(job, TIMED_OUT, error=f"OCR took longer than {self.timeout:.0f} seconds")
+        return []
+
+    def _notify(self, job, callbacks):
+        for callback in callbacks:
+            try:
+                callback(job)
+            except Exception:
+                # A broken subscriber must not take the worker thread down
+                pass
+
+    def _expire(self):
+        # Called with self._lock held. Times out overdue jobs and forgets old finished ones;
+        # returns (job, callbacks) pairs to notify once the lock is released.
+        now = time.monotonic()
+        timed_out = []
+        for job in list(self._jobs.values()):
+            callbacks = self._check_timeout(job)
+            if callbacks:
+                timed_out.append((job, callbacks))
+            if not self._busy(job) and now - job.finished_at > self.ttl:
+                del self._jobs[job.id]
+        return timed_out
+
+# The process-wide job service, shared by every session.
+_service = None
+_service_lock = threading.Lock()
+
+def get_service():
+    """Returns the process-wide OCR job service, creating it on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = OCRJobService()
+        return _service
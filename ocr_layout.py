@@ -0,0 +1,176 @@
+"""
+Word-level OCR output and layout-aware reading of the totals.
+
+Tesseract's TSV output (image_to_data) gives every word with its bounding box, its
+line and a recognition confidence. OCRWords keeps that as parallel NumPy columns
+rather than a list of per-word objects, so a receipt's words cost a few arrays and
+geometric questions ("which amounts sit on the same visual line as this label?") are
+answered with vectorized comparisons.
+
+Tesseract often splits a right-aligned price from its label into a separate line or
+block when the gap between them is wide, which is exactly the layout of a totals
+section. Matching labels to amounts by their position on the page, rather than by
+text line, keeps "TOTAL ........ 24.50" together.
+"""
+import numpy as np
+
+import receipt_parser
+
+# Two words are on the same visual line when their vertical centres are closer than
+# this fraction of the taller word's height.
+SAME_LINE = 0.6
+
+class OCRWords:
+    """
+    The recognized words of one image, column by column: `text` (list of str) and
+    `left`, `top`, `width`, `height`, `conf` (0-100) and `line` (a running line number)
+    as NumPy arrays of the same length, in reading order.
+    """
+
+    def __init__(self, text=(), left=(), top=(), width=(), height=(), conf=(), line=()):
+        self.text = list(text)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.top = np.asarray(top, dtype=np.int32)
+        self.width = np.asarray(width, dtype=np.int32)
+        self.height = np.asarray(height, dtype=np.int32)
+        self.conf = np.asarray(conf, dtype=np.float32)
+        self.line = np.asarray(line, dtype=np.int32)
+
+    @classmethod
+    def from_tsv(cls, tsv):
+        """Parses Tesseract TSV output (with or without its header row), keeping non-empty words."""
+        text, left, top, width, height, conf, line = [], [], [], [], [], [], []
+        line_keys = {}
+        for row in tsv.splitlines():
+            fields = row.split("\t")
+            # Word rows are level 5; the header and page/block/line rows are skipped
+            if len(fields) < 12 or fields[0] != "5" or not fields[11].strip():
+                continue
+            key = (fields[1], fields[2], fields[3], fields[4])
+            line.append(line_keys.setdefault(key, len(line_keys)))
+            text.append(fields[11].strip())
+            left.append(int(fields[6]))
+            top.append(int(fields[7]))
+            width.append(int(fields[8]))
+            height.append(int(fields[9]))
+            conf.append(float(fields[10]))
+        return cls(text, left, top, width, height, conf, line)
+
+    def __len__(self):
+        return len(self.text)
+
+    @property
+    def right(self):
+        return self.left + self.width
+
+    @property
+    def bottom(self):
+        return self.top + self.height
+
+    @property
+    def center_y(self):
+        return self.top + self.height / 2.0
+
+    def to_text(self):
+        """The words joined back into lines, as image_to_string would print them."""
+        lines = []
+        previous = None
+        for word, line in zip(self.text, self.line.tolist()):
+            if line != previous:
+                lines.append([])
+                previous = line
+            lines[-1].append(word)
+        return "\n".join(" ".join(words) for words in lines)
+
+    def same_line(self, index):
+        """Mask of the words on the same visual line as word `index` (whatever Tesseract's line numbers say)."""
+        reach = SAME_LINE * np.maximum(self.height, self.height[index])
+        return np.abs(self.center_y - self.center_y[index]) < reach
+
+    def box(self, indices):
+        """(left, top, right, bottom) around the given words."""
+        indices = np.asarray(indices)
+        return (
+            int(self.left[indices].min()), int(self.top[indices].min()),
+            int(self.right[indices].max()), int(self.bottom[indices].max()),
+        )
+
+class LabelledAmount:
+    """An amount matched to a label on the same visual line."""
+
+    def __init__(self, kind, value, label, amount, conf):
+        self.kind = kind          # keyword group of the label: subtotal, tax, grand, total or balance
+        self.value = value
+        self.label = label        # index of the label word
+        self.amount = amount      # index of the amount word
+        self.conf = conf          # Tesseract's confidence in the weaker of the two words (0-100)
+
+def word_amounts(words):
+    """Float value of every word that reads as an amount (NaN for the rest)."""
+    values = np.full(len(words), np.nan)
+    for i, word in enumerate(words.text):
+        match = receipt_parser.AMOUNT_RE.search(word)
+        if match:
+            values[i] = receipt_parser.parse_amount(match)
+    return values
+
+def labelled_amounts(words):
+    """
+    Every total/subtotal/tax label paired with the amount on its visual line: the
+    right-most amount to the right of the label. In reading order.
+    """
+    amounts = word_amounts(words)
+    is_amount = ~np.isnan(amounts)
+    found = []
+    for i, word in enumerate(words.text):
+        if receipt_parser.KEYWORD_RE.search(word) is None:
+            continue
+        # Read the label with its neighbours on the line: "GRAND TOTAL", "SUB TOTAL",
+        # "AMOUNT DUE", and "TOTAL SAVINGS" (which is not a total)
+        phrase = [word]
+        if i > 0 and words.line[i - 1] == words.line[i]:
+            phrase.insert(0, words.text[i - 1])
+        if i + 1 < len(words) and words.line[i + 1] == words.line[i]:
+            phrase.append(words.text[i + 1])
+        keyword = receipt_parser.KEYWORD_RE.search(" ".join(phrase))
+        if keyword is None:
+            continue
+        kind = keyword.lastgroup
+        candidates = np.flatnonzero(is_amount & words.same_line(i) & (words.left >= words.left[i] + words.width[i] // 2))
+        if candidates.size == 0:
+            # A label without a price, e.g. "TOTAL ITEMS 5"
+            continue
+        amount = int(candidates[np.argmax(words.right[candidates])])
+        found.append(LabelledAmount(kind, float(amounts[amount]), i, amount, float(min(words.conf[i], words.conf[amount]))))
+    return found
+
+def parse(words):
+    """
+    A receipt_parser.ParsedReceipt from OCR words. The date, merchant and currency come
+    from the text; total, subtotal and tax come from the layout when a label and an
+    amount line up, with their confidence scaled by Tesseract's. `labelled` (the
+    LabelledAmount per field) says which words each amount was read from.
+    """
+    receipt = receipt_parser.parse(words.to_text())
+    by_kind = {}
+    for item in labelled_amounts(words):
+        # Later lines win, as in the text parser
+        by_kind[item.kind] = item
+
+    for field, kinds in (("subtotal", ("subtotal",)), ("tax", ("tax",)), ("total", ("grand", "total", "balance"))):
+        for kind in kinds:
+            item = by_kind.get(kind)
+            if item is None:
+                continue
+            base = receipt_parser.TOTAL_CONFIDENCE.get(kind, 0.85 if kind == "subtotal" else 0.8)
+            setattr(receipt, field, item.value)
+            receipt.confidence[field] = round(base * item.conf / 100.0, 2)
+            receipt.labelled[field] = item
+            break
+
+    if receipt.total is not None and receipt.subtotal is not None and receipt.tax is not None:
+        if abs(receipt.subtotal + receipt.tax - receipt.total) < 0.005:
+            # The three amounts agree with each other, however unsure the OCR was
+            for field in ("total", "subtotal", "tax"):
+                receipt.confidence[field] = max(receipt.confidence[field], 0.98)
+    return receipt
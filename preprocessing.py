@@ -0,0 +1,309 @@
+"""
+Image preprocessing pipeline run before Tesseract.
+
+Phone photos arrive at up to 12 MP with the receipt somewhere in the frame, slightly
+rotated and unevenly lit. Tesseract's runtime grows with pixel count and its accuracy
+drops on low-contrast input, so the pipeline:
+
+1. crops to the receipt (the bounding box of its ink),
+2. estimates the skew angle from the text lines,
+3. downscales so a line of text is about TARGET_LINE_HEIGHT pixels tall,
+4. rotates the text level, and
+5. binarizes with a vectorized Otsu or adaptive (local mean) threshold.
+
+The measurements (crop box, skew, line height) are taken once on a small thumbnail,
+so their cost does not depend on the camera resolution. Each stage is timed.
+"""
+import os
+import time
+
+import numpy as np
+from PIL import Image, ImageEnhance
+
+def _env_list(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return tuple(stage.strip() for stage in value.split(",") if stage.strip())
+
+# Stages to run, in this order: "crop", "deskew", "downscale", "contrast", "binarize".
+# "contrast" is the original fixed contrast boost; SNAPBUDGET_PREPROCESS="contrast"
+# restores the old behaviour. Part of the OCR cache key.
+ALL_STAGES = ("crop", "deskew", "downscale", "contrast", "binarize")
+PREPROCESS_STAGES = _env_list("SNAPBUDGET_PREPROCESS", ("crop", "deskew", "downscale", "binarize"))
+
+# "adaptive" (local mean, copes with shadows and stains) or "otsu" (one global threshold).
+BINARIZE_METHOD = os.environ.get("SNAPBUDGET_BINARIZE", "adaptive")
+
+# Line height in pixels Tesseract reads best; larger text is scaled down to it.
+TARGET_LINE_HEIGHT = 32
+# Never shrink below this fraction, whatever the estimate says.
+MIN_SCALE = 0.2
+# Used when the lines cannot be measured: assumed receipt font size, converted with the image DPI.
+RECEIPT_FONT_PT = 10
+
+# Longest side of the thumbnail the measurements are taken on.
+ANALYSIS_SIZE = 800
+
+# Deskew searches +-MAX_SKEW degrees in SKEW_STEP increments; smaller angles are left alone.
+MAX_SKEW = 8.0
+SKEW_STEP = 0.5
+MIN_SKEW = 0.4
+
+# Adaptive threshold: a pixel is ink when it is this much darker than its neighbourhood mean.
+ADAPTIVE_OFFSET = 12
+
+class PreprocessResult:
+    """The image handed to Tesseract plus what the pipeline measured and how long each stage took (ms)."""
+
+    def __init__(self, image):
+        self.image = image
+        self.timings = {}
+        self.box = None
+        self.angle = 0.0
+        self.line_height = None
+        self.scale = 1.0
+        # Size of the image before the final rotation, for mapping boxes back to the source
+        self.unrotated_size = None
+
+    def source_box(self, box):
+        """
+        The (left, top, right, bottom) region of the original image that a box of the
+        output image came from: rotated back, scaled up and moved by the crop.
+        """
+        left, top, right, bottom = box
+        out_w, out_h = self.image.size
+        in_w, in_h = self.unrotated_size or (out_w, out_h)
+        corners = np.array([[left, top], [right, top], [left, bottom], [right, bottom]], dtype=np.float64)
+        # PIL rotates about the centre, which an expanded canvas keeps in the middle
+        u = corners[:, 0] - out_w / 2.0
+        v = corners[:, 1] - out_h / 2.0
+        phi = np.radians(-self.angle) if abs(self.angle) >= MIN_SKEW else 0.0
+        x = u * np.cos(phi) - v * np.sin(phi) + in_w / 2.0
+        y = u * np.sin(phi) + v * np.cos(phi) + in_h / 2.0
+        offset_x, offset_y = self.box[:2] if self.box else (0, 0)
+        return (
+            int(np.floor(x.min() / self.scale)) + offset_x,
+            int(np.floor(y.min() / self.scale)) + offset_y,
+            int(np.ceil(x.max() / self.scale)) + offset_x,
+            int(np.ceil(y.max() / self.scale)) + offset_y,
+        )
+
+def otsu_threshold(gray):
+    """Otsu's threshold of a uint8 array: maximizes the between-class variance of the histogram."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    p = hist / max(hist.sum(), 1.0)
+    omega = np.cumsum(p)
+    mu = np.cumsum(p * np.arange(256))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sigma_b = (mu[-1] * omega - mu) ** 2 / (omega * (1.0 - omega))
+    sigma_b = np.nan_to_num(sigma_b, nan=0.0, posinf=0.0)
+    return int(np.argmax(sigma_b))
+
+def _window_sums(values, r, axis):
+    """Sums over a sliding window of +-r along one axis (clipped at the edges), and the window sizes."""
+    n = values.shape[axis]
+    shape = list(values.shape)
+    shape[axis] = 1
+    running = np.concatenate([np.zeros(shape), np.cumsum(values, axis=axis, dtype=np.float64)], axis=axis)
+    lo = np.clip(np.arange(n) - r, 0, n)
+    hi = np.clip(np.arange(n) + r + 1, 0, n)
+    return np.take(running, hi, axis=axis) - np.take(running, lo, axis=axis), hi - lo
+
+def box_mean(values, block):
+    """
+    Mean of every block x block neighbourhood of a 2-D array (clipped at the edges).
+    The box filter is separable and built from running sums, so the cost does not depend on the block size.
+    """
+    r = block // 2
+    sums, rows = _window_sums(values, r, axis=0)
+    sums, cols = _window_sums(sums, r, axis=1)
+    return sums / (rows[:, None] * cols[None, :])
+
+def adaptive_threshold(gray, block, offset=ADAPTIVE_OFFSET):
+    """Ink mask of a uint8 array: pixels darker than their block x block neighbourhood mean by more than `offset`."""
+    return gray < box_mean(gray, block) - offset
+
+def find_ink(thumb):
+    """
+    Text pixels of the thumbnail. Local contrast picks out glyphs whatever the lighting, and
+    only pixels surrounded mostly by paper count, which drops the table around the receipt
+    and the shadow along its edges.
+    """
+    block = max(15, max(thumb.shape) // 25) | 1
+    paper = thumb >= otsu_threshold(thumb)
+    on_paper = box_mean(paper, block) > 0.5
+    ink = adaptive_threshold(thumb, block) & on_paper
+    # Whatever touches the frame is the edge of a table, sheet or shadow rather than text
+    band = max(2, int(0.03 * max(thumb.shape)))
+    ink[:band] = ink[-band:] = False
+    ink[:, :band] = ink[:, -band:] = False
+    return ink
+
+def find_receipt_box(ink):
+    """(left, top, right, bottom) around the rows and columns that hold ink, with a small margin."""
+    h, w = ink.shape
+    # More than a speck of ink: isolated stains and dust do not stretch the box
+    rows = np.flatnonzero(ink.mean(axis=1) > 0.01)
+    cols = np.flatnonzero(ink.mean(axis=0) > 0.01)
+    if rows.size == 0 or cols.size == 0:
+        return 0, 0, w, h
+    margin = max(4, int(0.02 * max(h, w)))
+    return (
+        max(0, cols[0] - margin),
+        max(0, rows[0] - margin),
+        min(w, cols[-1] + 1 + margin),
+        min(h, rows[-1] + 1 + margin),
+    )
+
+def measure_lines(ink):
+    """
+    (skew angle in degrees, median text line height in pixels or None) of an ink mask.
+
+    Ink pixels are projected onto rows at each candidate angle; level lines give the
+    sharpest row histogram. The runs of busy rows in that best histogram are the lines.
+    Rotating the image by -angle levels the text.
+    """
+    ys, xs = np.nonzero(ink)
+    if ys.size < 50:
+        return 0.0, None
+    ys = ys.astype(np.float64)
+    xs = xs.astype(np.float64) - xs.mean()
+    # A sample is plenty to find the peak, and keeps the search cheap
+    sample = np.random.default_rng(0).choice(ys.size, 40000, replace=False) if ys.size > 40000 else slice(None)
+
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-MAX_SKEW, MAX_SKEW + SKEW_STEP / 2, SKEW_STEP):
+        projected = ys[sample] + xs[sample] * np.tan(np.radians(angle))
+        hist = np.bincount(np.round(projected - projected.min()).astype(np.int64))
+        score = float(np.dot(hist, hist))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+
+    projected = ys + xs * np.tan(np.radians(best_angle))
+    hist = np.bincount(np.round(projected - projected.min()).astype(np.int64))
+    busy = hist > 0.02 * ink.shape[1]
+    edges = np.diff(np.concatenate([[0], busy.astype(np.int8), [0]]))
+    heights = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+    if heights.size == 0:
+        return best_angle, None
+    # Stains and fold lines make short runs; text lines are the bulk of the tall ones
+    heights = heights[heights >= 0.3 * np.percentile(heights, 90)]
+    return best_angle, float(np.median(heights))
+
+def thumbnail(gray, size=ANALYSIS_SIZE):
+    """The grayscale image shrunk to `size` (as a uint8 array) and the factor applied."""
+    factor = min(1.0, size / max(gray.size))
+    if factor < 1.0:
+        small = gray.resize((max(1, round(gray.width * factor)), max(1, round(gray.height * factor))),
+                            Image.Resampling.BILINEAR, reducing_gap=2.0)
+    else:
+        small = gray
+    return np.asarray(small), factor
+
+def run(image, stages=None, binarize=None):
+    """
+    Runs the configured stages on a PIL image. Returns a PreprocessResult whose `image`
+    is ready for Tesseract and whose `timings` holds milliseconds per stage.
+    """
+    stages = PREPROCESS_STAGES if stages is None else tuple(stages)
+    binarize = binarize or BINARIZE_METHOD
+    unknown = set(stages) - set(ALL_STAGES)
+    if unknown:
+        raise ValueError(f"Unknown preprocessing stages: {', '.join(sorted(unknown))}")
+
+    result = PreprocessResult(image)
+    timings = result.timings
+    started = time.perf_counter()
+
+    def lap(name):
+        nonlocal started
+        now = time.perf_counter()
+        timings[name] = (now - started) * 1000.0
+        started = now
+
+    gray = image.convert("L")
+    lap("grayscale")
+
+    if {"crop", "deskew", "downscale"} & set(stages):
+        thumb, factor = thumbnail(gray)
+        ink = find_ink(thumb)
+        lap("analyze")
+
+        if "crop" in stages:
+            left, top, right, bottom = find_receipt_box(ink)
+            ink = ink[top:bottom, left:right]
+            h, w = thumb.shape
+            # Edges of the thumbnail map to the edges of the full image, not a rounded guess
+            result.box = (
+                int(left / factor), int(top / factor),
+                gray.width if right >= w else min(gray.width, int(round(right / factor))),
+                gray.height if bottom >= h else min(gray.height, int(round(bottom / factor))),
+            )
+            gray = gray.crop(result.box)
+            lap("crop")
+
+        if "deskew" in stages or "downscale" in stages:
+            angle, line_height = measure_lines(ink)
+            if "deskew" in stages:
+                result.angle = angle
+            lap("measure")
+
+        if "downscale" in stages:
+            if line_height is not None:
+                result.line_height = line_height / factor
+            else:
+                # Nothing measurable: fall back to the DPI the camera/scanner recorded
+                dpi = image.info.get("dpi")
+                if dpi:
+                    result.line_height = float(dpi[1]) * RECEIPT_FONT_PT / 72.0
+            if result.line_height and result.line_height > TARGET_LINE_HEIGHT:
+                result.scale = max(TARGET_LINE_HEIGHT / result.line_height, MIN_SCALE)
+                size = (max(1, round(gray.width * result.scale)), max(1, round(gray.height * result.scale)))
+                gray = gray.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+            lap("downscale")
+
+    # Rotating after the downscale touches far fewer pixels
+    result.unrotated_size = gray.size
+    if abs(result.angle) >= MIN_SKEW:
+        gray = gray.rotate(-result.angle, resample=Image.Resampling.BILINEAR, expand=True, fillcolor=255)
+        lap("rotate")
+
+    if "contrast" in stages:
+        gray = ImageEnhance.Contrast(gray).enhance(1.5)
+        lap("contrast")
+
+    if "binarize" in stages:
+        gray = binarize_image(gray, binarize)
+        lap("binarize")
+
+    result.image = gray
+    return result
+
+def binarize_image(gray, method=None, line_height=TARGET_LINE_HEIGHT):
+    """A grayscale PIL image as black text on white, thresholded with `method` ("adaptive" or "otsu")."""
+    method = method or BINARIZE_METHOD
+    pixels = np.asarray(gray)
+    if method == "otsu":
+        ink = pixels < otsu_threshold(pixels)
+    elif method == "adaptive":
+        # About two lines of text per window: local enough for shadows, wide enough for bold glyphs
+        ink = adaptive_threshold(pixels, block=2 * int(line_height) + 1)
+    else:
+        raise ValueError(f"Unknown binarize method '{method}' (expected 'adaptive' or 'otsu')")
+    return Image.fromarray(np.where(ink, 0, 255).astype(np.uint8))
+
+def region(image, result, box, zoom=2.0):
+    """
+    Re-renders one box of a pipeline output (e.g. a low-confidence line) from the
+    original image at `zoom` times the pipeline's resolution: cropped from the source,
+    scaled, levelled and binarized like the full image, for a second OCR pass.
+    """
+    left, top, right, bottom = result.source_box(box)
+    gray = image.convert("L").crop((max(0, left), max(0, top), min(image.width, right), min(image.height, bottom)))
+    scale = result.scale * zoom
+    size = (max(1, round(gray.width * scale)), max(1, round(gray.height * scale)))
+    gray = gray.resize(size, Image.Resampling.BICUBIC if scale > 1.0 else Image.Resampling.BILINEAR)
+    if abs(result.angle) >= MIN_SKEW:
+        gray = gray.rotate(-result.angle, resample=Image.Resampling.BILINEAR, expand=True, fillcolor=255)
+    return binarize_image(gray, line_height=TARGET_LINE_HEIGHT * zoom)
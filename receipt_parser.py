@@ -0,0 +1,248 @@
+"""
+Receipt text parser: pulls the total, subtotal, tax, date, merchant and currency out of
+OCR text in one scan.
+
+Every pattern is compiled once at import and runs over the whole text, so the work
+happens inside the regex engine rather than in a Python loop over lines. One combined
+keyword pattern finds the labelled lines (total, subtotal, tax...) and only the rest of
+those lines is searched for an amount; the merchant is looked for in the first few
+lines, and the first valid date is kept. The cost is linear in the text length. Every field
+comes with a confidence between 0 and 1: how sure the parser is that the value is the
+one printed on the receipt.
+"""
+import datetime
+import re
+
+# Lines from the top where the merchant name is looked for.
+MERCHANT_LINES = 5
+
+# Amounts, with optional thousands separators and a decimal point or comma:
+# 24.50, 1,234.56, 1.234,56, 12,34. Percentages (tax rates) are not amounts.
+# The leading (?=\d) lets the scanner skip non-digits before trying the lookbehind.
+AMOUNT_RE = re.compile(r"(?=\d)(?<![\d.,])(\d{1,3}(?:[.,]\d{3})+|\d+)[.,](\d{2})(?![\d%]|\s*%)")
+
+# Which amount a line labels. Alternatives are tried left to right, so "subtotal" wins
+# over "total"; counts and savings that mention "total" are not amounts due. The
+# first-letter lookahead rejects most positions before any alternative is tried.
+KEYWORD_RE = re.compile(
+    r"\b(?=[stgvhab])(?:"
+    r"(?P<subtotal>sub[\s-]?total)"
+    r"|(?P<tax>(?:sales\s+)?tax|vat|gst|hst)"
+    r"|(?P<grand>grand\s+total|total\s+due|amount\s+due|balance\s+due)"
+    r"|(?P<total>total(?!\s+(?:items?|qty|quantity|savings?|saved|discount)))"
+    r"|(?P<balance>balance|amount)"
+    r")\b",
+    re.IGNORECASE,
+)
+
+# Plain numbers ("12", "12.5", ".99") and whole amounts with separators but no cents ("1,234").
+PLAIN_NUMBER_RE = re.compile(r"\d+(?:\.\d*)?|\.\d+")
+WHOLE_THOUSANDS_RE = re.compile(r"\d{1,3}(?:,\d{3})+")
+
+MONTHS = {name: number for number, name in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1)}
+
+# ISO (2026-03-05), numeric (03/05/2026, 3-5-26) and written (Mar 5, 2026 / 5 March 2026) dates.
+DATE_RE = re.compile(
+    r"\b(?P<iy>\d{4})[-/.](?P<im>\d{1,2})[-/.](?P<id>\d{1,2})\b"
+    r"|\b(?P<na>\d{1,2})[/.-](?P<nb>\d{1,2})[/.-](?P<ny>\d{4}|\d{2})\b"
+    r"|\b(?P<wm>jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+(?P<wd>\d{1,2}),?\s+(?P<wy>\d{4})\b"
+    r"|\b(?P<dd>\d{1,2})\s+(?P<dm>jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?,?\s+(?P<dy>\d{4})\b",
+    re.IGNORECASE,
+)
+
+# Currency symbols and ISO codes.
+CURRENCY_RE = re.compile(r"[$€£¥₹]|(?=[A-Z])\b(?:USD|EUR|GBP|CAD|AUD|JPY|INR|CHF)\b")
+CURRENCY_SYMBOLS = {"$": "USD", "€": "EUR", "£": "GBP", "¥": "JPY", "₹": "INR"}
+
+# Top lines that are not the merchant: contact details, addresses, receipt metadata, and
+# totals and counts (including the "total items" lines KEYWORD_RE leaves out).
+NOT_MERCHANT_RE = re.compile(
+    r"\b(?:tel|phone|fax|www|http|receipt|invoice|order|cashier|store\s*#|street|st\.|ave|road|rd\.|suite"
+    r"|total|qty|quantity|items?)\b|@|\d{3}[-.\s]\d{4}",
+    re.IGNORECASE,
+)
+
+# A label with nothing else after it on its line ("TOTAL", "Total:", "TOTAL $"): its
+# amount may be printed on the next line.
+LABEL_TAIL_RE = re.compile(r"[\s:.*#=-]*(?:" + CURRENCY_RE.pattern + r")?[\s:.*#=-]*")
+
+# The next non-blank line, when it holds nothing but an amount and maybe a currency.
+AMOUNT_LINE_RE = re.compile(
+    r"\s*(?:" + CURRENCY_RE.pattern + r")?[ \t]*" + AMOUNT_RE.pattern
+    + r"[ \t]*(?:" + CURRENCY_RE.pattern + r")?[ \t]*$",
+    re.MULTILINE,
+)
+LETTERS_RE = re.compile(r"[A-Za-z]")
+
+# How much each kind of total line is trusted.
+TOTAL_CONFIDENCE = {"grand": 0.95, "total": 0.85, "balance": 0.6}
+
+# Confidence factor for an amount read from the line below its label.
+NEXT_LINE_FACTOR = 0.9
+
+class ParsedReceipt:
+    """
+    Fields read from a receipt. Each of total, subtotal, tax, date (a datetime.date),
+    merchant and currency is None when it was not found; `confidence` maps every
+    field name to a score between 0 and 1 (0 when missing).
+    """
+
+    FIELDS = ("total", "subtotal", "tax", "date", "merchant", "currency")
+
+    def __init__(self):
+        self.total = None
+        self.subtotal = None
+        self.tax = None
+        self.date = None
+        self.merchant = None
+        self.currency = None
+        self.confidence = {name: 0.0 for name in self.FIELDS}
+        # Filled by ocr_layout.parse: the label/amount words each amount was read from
+        self.labelled = {}
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def __repr__(self):
+        found = ", ".join(f"{name}={getattr(self, name)!r} ({self.confidence[name]:.2f})"
+                          for name in self.FIELDS if getattr(self, name) is not None)
+        return f"ParsedReceipt({found})"
+
+def parse_amount(match):
+    """The float value of an AMOUNT_RE match; thousands separators are dropped."""
+    whole, cents = match.groups()
+    return float(whole.replace(",", "").replace(".", "") + "." + cents)
+
+def parse_amount_text(text):
+    """
+    The float value of a cell or field holding one amount, the way a spreadsheet or a
+    person writes it: "12.5", "$1,234.56", "1.234,56 EUR", "-4", "(3.00)". None if the
+    text is not an amount.
+    """
+    if isinstance(text, (int, float)):
+        return float(text)
+    value = CURRENCY_RE.sub("", str(text)).strip()
+    negative = value.startswith("-") or (value.startswith("(") and value.endswith(")"))
+    value = value.strip("-() ")
+    if PLAIN_NUMBER_RE.fullmatch(value):
+        amount = float(value)
+    elif WHOLE_THOUSANDS_RE.fullmatch(value):
+        amount = float(value.replace(",", ""))
+    else:
+        match = AMOUNT_RE.fullmatch(value)
+        if match is None:
+            return None
+        amount = parse_amount(match)
+    return -amount if negative else amount
+
+def _parse_date(match):
+    """(datetime.date, confidence) for a DATE_RE match, or None if it is not a real date."""
+    groups = match.groupdict()
+    try:
+        if groups["iy"]:
+            return datetime.date(int(groups["iy"]), int(groups["im"]), int(groups["id"])), 0.95
+        if groups["wm"]:
+            return datetime.date(int(groups["wy"]), MONTHS[groups["wm"].lower()], int(groups["wd"])), 0.9
+        if groups["dm"]:
+            return datetime.date(int(groups["dy"]), MONTHS[groups["dm"].lower()], int(groups["dd"])), 0.9
+        a, b, year = int(groups["na"]), int(groups["nb"]), int(groups["ny"])
+        if year < 100:
+            year += 2000
+        if a > 12:
+            # Only day-first reads as a date
+            return datetime.date(year, b, a), 0.8
+        # Month-first (US) unless that is impossible; ambiguous when both could be months
+        return datetime.date(year, a, b), 0.6 if b <= 12 and a != b else 0.8
+    except ValueError:
+        return None
+
+def _merchant_candidate(line):
+    """A cleaned-up merchant name if this top line could be one, else None."""
+    if NOT_MERCHANT_RE.search(line) or KEYWORD_RE.search(line) or AMOUNT_RE.search(line) or DATE_RE.search(line):
+        return None
+    letters = len(LETTERS_RE.findall(line))
+    if letters < 3 or letters < 0.6 * len(line.replace(" ", "")):
+        return None
+    return " ".join(line.split())
+
+def _top_lines(text):
+    """The first MERCHANT_LINES non-empty lines, stripped."""
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line:
+            lines.append(line)
+            if len(lines) == MERCHANT_LINES:
+                break
+    return lines
+
+def parse(text):
+    """Parses OCR text into a ParsedReceipt."""
+    receipt = ParsedReceipt()
+    confidence = receipt.confidence
+
+    for position, line in enumerate(_top_lines(text)):
+        merchant = _merchant_candidate(line)
+        if merchant:
+            receipt.merchant = merchant
+            # The very first line is usually the store's name
+            confidence["merchant"] = 0.7 if position == 0 else 0.5
+            break
+
+    for match in DATE_RE.finditer(text):
+        parsed = _parse_date(match)
+        if parsed:
+            receipt.date, confidence["date"] = parsed
+            break
+
+    currencies = {}
+    for match in CURRENCY_RE.finditer(text):
+        code = CURRENCY_SYMBOLS.get(match.group(0), match.group(0).upper())
+        currencies[code] = currencies.get(code, 0) + 1
+
+    totals = {}
+    for keyword in KEYWORD_RE.finditer(text):
+        line_end = text.find("\n", keyword.end())
+        if line_end == -1:
+            line_end = len(text)
+        # The amount printed after the label on its line; the last one when there are
+        # several (e.g. a rate and a value)
+        amount = None
+        for amount in AMOUNT_RE.finditer(text, keyword.end(), line_end):
+            pass
+        factor = 1.0
+        if amount is None and LABEL_TAIL_RE.fullmatch(text, keyword.end(), line_end):
+            # A label alone on its line: the amount may be on the line below ("TOTAL\n24.50")
+            amount = AMOUNT_LINE_RE.match(text, line_end)
+            factor = NEXT_LINE_FACTOR
+        if amount is not None:
+            # Later lines win: the grand total comes after subtotals and running totals
+            totals[keyword.lastgroup] = parse_amount(amount), factor
+    if "subtotal" in totals:
+        receipt.subtotal, factor = totals["subtotal"]
+        confidence["subtotal"] = round(0.85 * factor, 2)
+    if "tax" in totals:
+        receipt.tax, factor = totals["tax"]
+        confidence["tax"] = round(0.8 * factor, 2)
+
+    for kind in ("grand", "total", "balance"):
+        if kind in totals:
+            receipt.total, factor = totals[kind]
+            confidence["total"] = round(TOTAL_CONFIDENCE[kind] * factor, 2)
+            break
+    if receipt.total is None and receipt.subtotal is not None:
+        # No total line was read: subtotal plus tax is the best guess
+        receipt.total = round(receipt.subtotal + (receipt.tax or 0.0), 2)
+        confidence["total"] = 0.5
+
+    if receipt.total is not None and receipt.subtotal is not None and receipt.tax is not None:
+        if abs(receipt.subtotal + receipt.tax - receipt.total) < 0.005:
+            # The three amounts agree with each other
+            for name in ("total", "subtotal", "tax"):
+                confidence[name] = max(confidence[name], 0.98)
+
+    if currencies:
+        receipt.currency = max(currencies, key=currencies.get)
+        confidence["currency"] = round(currencies[receipt.currency] / sum(currencies.values()), 2)
+    return receipt
@@ -0,0 +1,17 @@
+"""
+Storage backends for SnapBudget. database.py picks one based on config
+and exposes it through its module-level functions.
+
+The backends are imported on first use (`from storage import SQLiteStore` still works),
+so picking SQLite never loads the Google client libraries.
+"""
+import importlib
+
+from storage.base import ExpenseStore, StoreUnavailable, WritesPending, HEADERS, LEDGER_COLUMNS
+
+_BACKENDS = {"SheetsStore": "storage.sheets", "SQLiteStore": "storage.sqlite", "SyncedStore": "storage.sync"}
+
+def __getattr__(name):
+    if name in _BACKENDS:
+        return getattr(importlib.import_module(_BACKENDS[name]), name)
+    raise AttributeError(f"module 'storage' has no attribute '{name}'")
@@ -0,0 +1,149 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+import uuid
+import pandas as pd
+
+from storage import search
+
+# Columns of the expense ledger, in sheet order. "ID" is the expense's permanent id.
+HEADERS = ["Date", "Amount", "Raw Text", "Category", "ID"]
+
+# Columns of the DataFrame returned by ExpenseStore.get_all().
+# 'id' identifies the expense for its whole life, wherever it is stored.
+LEDGER_COLUMNS = ["id", "Date", "Amount", "Category", "Raw Text"]
+
+# Columns of a listing page (see ExpenseStore.get_page); the raw OCR text is fetched per row on demand.
+PAGE_COLUMNS = ["id", "Date", "Amount", "Category"]
+
+class StoreUnavailable(Exception):
+    """The store cannot be reached or is not set up; the message is meant for the user."""
+
+class WritesPending(Exception):
+    """Buffered writes could not be sent yet; the store keeps them and retries. The message is meant for the user."""
+
+def new_expense_id():
+    """A fresh expense id: 12 hex characters, unique for any realistic ledger."""
+    return uuid.uuid4().hex[:12]
+
+def expense_rows(rows):
+    """[date, amount, raw_text, category, id] lists for ExpenseStore.add, with a new id for rows that carry none."""
+    return [list(row[:4]) + [row[4] if len(row) > 4 and row[4] else new_expense_id()] for row in rows]
+
+def completed(result=None):
+    """A Future that is already done, for stores whose writes are synchronous."""
+    future = Future()
+    future.set_result(result)
+    return future
+
+def filter_ledger(df, start_date=None, end_date=None, category=None):
+    """Applies get_page's filters to a ledger DataFrame (ISO date strings compare lexically)."""
+    mask = pd.Series(True, index=df.index)
+    dates = df["Date"].astype(str)
+    if start_date:
+        mask &= dates >= str(start_date)
+    if end_date:
+        # Inclusive: anything on end_date sorts before the next day
+        mask &= dates < str(end_date) + "\uffff"
+    if category:
+        mask &= df["Category"] == category
+    return df[mask]
+
+class ExpenseStore(ABC):
+    """
+    Storage backend for expenses. database.py talks to exactly one of these.
+
+    Writes return a Future that resolves once the data is durable; stores that
+    buffer writes send them on flush(). Errors are raised, not reported: the
+    database facade decides how to surface them.
+    """
+
+    name = "base"
+
+    def connect(self):
+        """Opens/validates the underlying storage. Raises StoreUnavailable if it is not set up."""
+
+    @abstractmethod
+    def add(self, rows):
+        """
+        Appends [date, amount, raw_text, category] rows, giving each a new id. Returns a Future.
+        A row may carry its id as a fifth value, for callers that need to know it up front.
+        """
+
+    @abstractmethod
+    def update(self, changes):
+        """
+        Applies (expense_id, [date, amount, raw_text, category]) changes. Returns a Future.
+        A raw_text of None leaves the stored text untouched.
+        """
+
+    @abstractmethod
+    def delete(self, expense_id):
+        """Deletes one expense."""
+
+    @abstractmethod
+    def get_all(self):
+        """Returns every expense as a DataFrame with LEDGER_COLUMNS."""
+
+    @abstractmethod
+    def monthly_total(self, year, month):
+        """Sum of amounts dated in the given month."""
+
+    def get_ledger(self):
+        """
+        Every expense as a read-only storage.ledger.Ledger: typed columns for filters and
+        summaries, receipt text kept apart. Stores with a cheaper source override this.
+        """
+        from storage.ledger import Ledger
+        return Ledger.from_frame(self.get_all())
+
+    def get_page(self, offset=0, limit=50, start_date=None, end_date=None, category=None):
+        """
+        One page of expenses, newest entries first, without the raw OCR text.
+        Dates are inclusive ISO strings; category filters on an exact match.
+        Returns (DataFrame with PAGE_COLUMNS, total number of matching expenses).
+        """
+        df = filter_ledger(self.get_all(), start_date, end_date, category)
+        df = df.iloc[::-1]
+        return df.iloc[offset:offset + limit][PAGE_COLUMNS].reset_index(drop=True), len(df)
+
+    def iter_ledger(self, chunk_size=10000, start_date=None, end_date=None, category=None):
+        """
+        Yields the expenses as DataFrames (LEDGER_COLUMNS) of at most chunk_size rows,
+        oldest first, with get_page's filters. Stores that can read in pieces do, so
+        exporting a large ledger never holds all of it at once.
+        """
+        df = filter_ledger(self.get_all(), start_date, end_date, category)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size].reset_index(drop=True)
+
+    def search(self, query, offset=0, limit=50, start_date=None, end_date=None, category=None,
+               min_amount=None, max_amount=None):
+        """
+        Expenses whose receipt text, merchant or notes contain every word of `query`
+        (the last one as a prefix), best matches first, with get_page's filters and an
+        inclusive amount range. An empty query lists everything that passes the filters,
+        newest first. Returns (DataFrame with SEARCH_COLUMNS, total number of matches).
+        """
+        return search.index_for(self).search(query, offset, limit, start_date, end_date, category, min_amount, max_amount)
+
+    def get_raw_text(self, expense_id):
+        """The stored OCR text (plus notes) of one expense, or None if it does not exist."""
+        df = self.get_all()
+        match = df.loc[df["id"] == expense_id, "Raw Text"]
+        return None if match.empty else match.iloc[0]
+
+    def version(self):
+        """
+        A value that changes whenever the ledger changes, used to memoize derived data
+        (see aggregates.summarize). None means "unknown": never reuse cached results.
+        """
+        return None
+
+    def flush(self, timeout=None):
+        """
+        Blocks until buffered writes are durable. No-op for synchronous stores.
+        Raises WritesPending if they cannot be sent yet; they stay buffered.
+        """
+
+    def close(self):
+        """Releases connections held by the store."""
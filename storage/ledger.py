@@ -0,0 +1,357 @@
+"""
+A compact, read-only, columnar copy of the ledger.
+
+One Ledger is held per process and shared by every session (see SheetsStore), so it
+is built once per download and never modified: writes derive a new Ledger and swap
+it in. Columns are typed once at build time:
+
+- ids:        fixed-width bytes (text when an id is not ASCII);
+- dates:      datetime64[D], NaT where the cell is not a date;
+- amounts:    float64, NaN where the cell is not a number;
+- categories: pandas Categorical, one small code per row.
+
+Receipt text, the bulk of every row, lives apart from the other columns: either in a
+TextStore of zlib-compressed blocks (identical texts stored once), or, for stores that
+keep it on disk anyway, loaded per row on demand. Filters, summaries and listing pages
+only touch the typed columns; text is decoded for the rows actually shown.
+"""
+import math
+import os
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+from itertools import accumulate
+
+import numpy as np
+import pandas as pd
+
+from receipt_parser import parse_amount_text
+from storage.base import HEADERS, LEDGER_COLUMNS
+
+# Receipt texts per compressed block: one block is decoded to read any of them.
+TEXT_BLOCK = 256
+
+# zlib level for text blocks: 1 compresses OCR text ~3x for about 4 ms per 1,000 receipts
+# at load; 0 keeps blocks uncompressed (faster loads, ~3x the text memory).
+TEXT_COMPRESSION = int(os.environ.get("SNAPBUDGET_TEXT_COMPRESSION", 1))
+
+# Decoded blocks kept for reads that land near each other (a page, an expander).
+TEXT_CACHE_BLOCKS = 4
+
+def _text(value):
+    """The stored form of a Raw Text cell: "" for missing, str for anything else."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return value if isinstance(value, str) else str(value)
+
+def _series(values):
+    return values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+
+def _strings(values):
+    """Column values as a list of str, "" for missing ones."""
+    values = values.tolist() if isinstance(values, pd.Series) else values
+    if not set(map(type, values)) - {str}:
+        return values
+    return ["" if value is None or value != value else str(value) for value in values]
+
+def _id_array(ids):
+    ids = _strings(ids)
+    try:
+        return np.array(ids, dtype="S")
+    except UnicodeEncodeError:
+        return np.array(ids, dtype="U")
+
+def _concat_ids(first, second):
+    if first.dtype.kind != second.dtype.kind:
+        first, second = first.astype("U"), second.astype("U")
+    return np.concatenate([first, second])
+
+def _date_array(values):
+    return pd.to_datetime(_series(values), errors="coerce").to_numpy(dtype="datetime64[D]")
+
+def _amount_array(values):
+    """Float64 amounts; cells the sheet shows formatted ("$12.50", "(3.00)") are read like typed ones."""
+    values = _series(values)
+    amounts = pd.to_numeric(values, errors="coerce").astype(float)
+    retry = amounts.isna() & values.notna()
+    if retry.any():
+        amounts[retry] = values[retry].map(parse_amount_text).astype(float)
+    return amounts.to_numpy(dtype=np.float64)
+
+def _category_array(values):
+    return pd.Categorical(_strings(values))
+
+def _frozen(array_):
+    array_.flags.writeable = False
+    return array_
+
+class TextStore:
+    """
+    Receipt texts packed into zlib-compressed blocks of TEXT_BLOCK texts. Texts are
+    addressed by slot and only ever appended, so every Ledger derived from the same
+    download can share one store. Safe to share between sessions.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._blocks = []        # (UTF-8, compressed or not, array("I") of character offsets) per full block
+        self._tail = []          # texts not yet filling a block
+        self._checksums = array("I")  # slot -> CRC-32 of the text, to compare texts without decoding them
+        self._recent = OrderedDict()
+        self._compressed_bytes = 0
+
+    def __len__(self):
+        return len(self._blocks) * TEXT_BLOCK + len(self._tail)
+
+    def extend(self, texts):
+        """Stores texts and returns their slots. Identical texts in one call share a slot."""
+        texts = list(texts)
+        if set(map(type, texts)) - {str}:
+            texts = [_text(text) for text in texts]
+        unique = list(dict.fromkeys(texts))
+        with self._lock:
+            first = len(self)
+            slot_of = dict(zip(unique, range(first, first + len(unique))))
+            slots = np.fromiter(map(slot_of.__getitem__, texts), dtype=np.int32, count=len(texts))
+            self._checksums.extend(zlib.crc32(text.encode("utf-8")) for text in unique)
+            while unique:
+                room = TEXT_BLOCK - len(self._tail)
+                self._tail.extend(unique[:room])
+                del unique[:room]
+                if len(self._tail) == TEXT_BLOCK:
+                    self._seal()
+        return slots
+
+    def get(self, slots):
+        """The texts at the given slots, in order."""
+        out = []
+        with self._lock:
+            for slot in slots:
+                block, position = divmod(int(slot), TEXT_BLOCK)
+                texts = self._tail if block == len(self._blocks) else self._block(block)
+                out.append(texts[position])
+        return out
+
+    def checksums(self, slots):
+        """CRC-32 of the texts at the given slots, as a uint32 array (equal texts, equal checksums)."""
+        with self._lock:
+            return np.frombuffer(self._checksums, dtype=np.uint32)[np.asarray(slots, dtype=np.intp)]
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            tail = sum(len(text) for text in self._tail)
+            offsets = sum(len(offsets) * offsets.itemsize for _, _, offsets in self._blocks)
+            return self._compressed_bytes + offsets + tail + len(self._checksums) * self._checksums.itemsize
+
+    def _seal(self):
+        # Called with self._lock held: compresses the full tail into a block
+        offsets = array("I", [0])
+        offsets.extend(accumulate(map(len, self._tail)))
+        data = "".join(self._tail).encode("utf-8")
+        if TEXT_COMPRESSION:
+            data = zlib.compress(data, TEXT_COMPRESSION)
+        self._blocks.append((data, bool(TEXT_COMPRESSION), offsets))
+        self._compressed_bytes += len(data)
+        self._tail = []
+
+    def _block(self, block):
+        # Called with self._lock held
+        texts = self._recent.get(block)
+        if texts is not None:
+            self._recent.move_to_end(block)
+            return texts
+        data, compressed, offsets = self._blocks[block]
+        if compressed:
+            data = zlib.decompress(data)
+        data = data.decode("utf-8")
+        texts = [data[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+        self._recent[block] = texts
+        if len(self._recent) > TEXT_CACHE_BLOCKS:
+            self._recent.popitem(last=False)
+        return texts
+
+class Ledger:
+    """
+    Every expense as typed, read-only columns, in store order. Build one with
+    from_records or from_frame; append, update and remove return a new Ledger.
+    """
+
+    def __init__(self, ids, dates, amounts, categories, text_slots=None, texts=None, load_texts=None):
+        self.ids = _frozen(ids)
+        self.dates = _frozen(dates)
+        self.amounts = _frozen(amounts)
+        self.categories = categories
+        # Either slots into a TextStore, or load_texts(ids) -> texts for stores that keep text elsewhere
+        self.text_slots = _frozen(text_slots) if text_slots is not None else None
+        self.texts = texts
+        self.load_texts = load_texts
+
+    @classmethod
+    def from_columns(cls, ids, dates, amounts, categories, raw_texts=None, texts=None, load_texts=None):
+        """
+        A Ledger of plain column values. Raw texts go into `texts` (a new TextStore when
+        not given); pass load_texts instead of raw_texts to leave them where they are.
+        """
+        text_slots = None
+        if load_texts is None:
+            texts = texts if texts is not None else TextStore()
+            text_slots = texts.extend(raw_texts if raw_texts is not None else [""] * len(ids))
+        return cls(_id_array(ids), _date_array(dates), _amount_array(amounts), _category_array(categories),
+                   text_slots, texts, load_texts)
+
+    @classmethod
+    def from_records(cls, records):
+        """A Ledger of sheet records: dicts keyed by HEADERS (ID may be missing on old sheets)."""
+        columns = {}
+        for header in HEADERS:
+            try:
+                columns[header] = [record[header] for record in records]
+            except KeyError:
+                columns[header] = [record.get(header, "") for record in records]
+        return cls.from_columns(columns["ID"], columns["Date"], columns["Amount"], columns["Category"],
+                                columns["Raw Text"])
+
+    @classmethod
+    def from_frame(cls, df, load_texts=None):
+        """A Ledger of a DataFrame with LEDGER_COLUMNS ("Raw Text" not needed with load_texts)."""
+        return cls.from_columns(df["id"], df["Date"], df["Amount"], df["Category"],
+                                None if load_texts is not None else df["Raw Text"].tolist(),
+                                load_texts=load_texts)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        """Memory held by the columns (the shared TextStore counted in full)."""
+        total = self.ids.nbytes + self.dates.nbytes + self.amounts.nbytes + self.categories.codes.nbytes
+        total += sum(len(str(name)) for name in self.categories.categories)
+        if self.text_slots is not None:
+            total += self.text_slots.nbytes + self.texts.nbytes
+        return total
+
+    def expense_ids(self, rows=None):
+        ids = self.ids if rows is None else self.ids[rows]
+        return ids.astype("U").tolist()
+
+    def position(self, expense_id):
+        """Row of an expense id, or None."""
+        key = str(expense_id)
+        if self.ids.dtype.kind == "S":
+            try:
+                key = key.encode("ascii")
+            except UnicodeEncodeError:
+                return None
+        hits = np.flatnonzero(self.ids == key)
+        return int(hits[0]) if hits.size else None
+
+    def raw_texts(self, rows):
+        rows = np.asarray(rows, dtype=np.intp)
+        if self.load_texts is not None:
+            return self.load_texts(self.expense_ids(rows))
+        return self.texts.get(self.text_slots[rows])
+
+    def raw_text(self, expense_id):
+        """The receipt text of one expense, or None if it does not exist."""
+        row = self.position(expense_id)
+        return None if row is None else self.raw_texts([row])[0]
+
+    def mask(self, start_date=None, end_date=None, category=None, min_amount=None, max_amount=None):
+        """Rows passing get_page's filters (dates inclusive), as a boolean array."""
+        mask = np.ones(len(self), dtype=bool)
+        if start_date:
+            mask &= self.dates >= np.datetime64(str(start_date)[:10], "D")
+        if end_date:
+            mask &= self.dates <= np.datetime64(str(end_date)[:10], "D")
+        if category:
+            code = self.categories.categories.get_indexer([category])[0]
+            mask &= (self.categories.codes == code) if code >= 0 else False
+        if min_amount is not None:
+            mask &= self.amounts >= min_amount
+        if max_amount is not None:
+            mask &= self.amounts <= max_amount
+        return mask
+
+    def frame(self, rows=None, columns=LEDGER_COLUMNS):
+        """
+        The given rows (all by default) as a DataFrame. Dates come back as ISO strings,
+        "" where there is none; receipt text is only decoded when "Raw Text" is asked for.
+        """
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.intp)
+        data = {}
+        for column in columns:
+            if column == "id":
+                data[column] = self.expense_ids(rows)
+            elif column == "Date":
+                dates = self.dates[rows]
+                text = np.datetime_as_string(dates, unit="D").astype(object)
+                text[np.isnat(dates)] = ""
+                data[column] = text
+            elif column == "Amount":
+                data[column] = self.amounts[rows]
+            elif column == "Category":
+                data[column] = np.asarray(self.categories[rows], dtype=object)
+            elif column == "Raw Text":
+                data[column] = self.raw_texts(rows)
+        return pd.DataFrame(data, columns=columns)
+
+    def page(self, offset=0, limit=50, start_date=None, end_date=None, category=None, columns=LEDGER_COLUMNS):
+        """One page of filtered rows, newest entries first: (DataFrame, total matching rows)."""
+        rows = np.flatnonzero(self.mask(start_date, end_date, category))[::-1]
+        return self.frame(rows[offset:offset + limit], columns), int(rows.size)
+
+    # --- Derived ledgers (the shared one is never modified) ---
+
+    def with_ids(self, ids):
+        """The same rows under new expense ids (one per row, in order)."""
+        return Ledger(_id_array(ids), self.dates, self.amounts, self.categories, self.text_slots, self.texts,
+                      self.load_texts)
+
+    def append(self, rows):
+        """A Ledger with [date, amount, raw_text, category, id] rows (HEADERS order) added at the end."""
+        if self.load_texts is not None:
+            raise TypeError("append needs a Ledger that holds its texts")
+        new = Ledger.from_columns([row[4] for row in rows], [row[0] for row in rows], [row[1] for row in rows],
+                                  [row[3] for row in rows], [row[2] for row in rows], texts=self.texts)
+        categories = pd.api.types.union_categoricals([self.categories, new.categories])
+        return Ledger(_concat_ids(self.ids, new.ids), np.concatenate([self.dates, new.dates]),
+                      np.concatenate([self.amounts, new.amounts]), categories,
+                      np.concatenate([self.text_slots, new.text_slots]), self.texts)
+
+    def update(self, expense_id, values):
+        """A Ledger with one expense's [date, amount, raw_text, category] replaced; None keeps a value."""
+        row = self.position(expense_id)
+        if row is None:
+            raise KeyError(expense_id)
+        date_value, amount, raw_text, category = values[:4]
+        dates, amounts, categories, text_slots = self.dates, self.amounts, self.categories, self.text_slots
+        if date_value is not None:
+            dates = dates.copy()
+            dates[row] = _date_array([date_value])[0]
+        if amount is not None:
+            amounts = amounts.copy()
+            amounts[row] = _amount_array([amount])[0]
+        if category is not None:
+            category = str(category)
+            categories = categories.copy()
+            if category not in categories.categories:
+                categories = categories.add_categories([category])
+            categories[row] = category
+        if raw_text is not None:
+            if self.load_texts is not None:
+                raise TypeError("update of raw text needs a Ledger that holds its texts")
+            text_slots = text_slots.copy()
+            text_slots[row] = self.texts.extend([raw_text])[0]
+        return Ledger(self.ids, dates, amounts, categories, text_slots, self.texts, self.load_texts)
+
+    def remove(self, expense_id):
+        """A Ledger without one expense (the same Ledger if it is not there)."""
+        row = self.position(expense_id)
+        if row is None:
+            return self
+        keep = np.ones(len(self), dtype=bool)
+        keep[row] = False
+        return Ledger(self.ids[keep], self.dates[keep], self.amounts[keep], self.categories[keep],
+                      self.text_slots[keep] if self.text_slots is not None else None, self.texts, self.load_texts)
@@ -0,0 +1,437 @@
+"""
+Full-text search over the stored receipts: the OCR text, the merchant (its first line)
+and the notes the app appends to it.
+
+SQLiteStore searches with an FTS5 table kept current by triggers. Stores without SQL
+use SearchIndex, an in-memory inverted index over their Ledger: one posting list per
+word (the slots of the expenses containing it, with a weighted count), stored as compact
+typed arrays and scored with NumPy, so a query touches only the lists of its own words.
+The receipt text itself stays compressed in the Ledger's TextStore. Adds, edits and
+deletes update it in place; deleted expenses are masked out and their postings dropped
+in bulk once they pile up. Both rank matches with BM25, weighting merchant and notes
+above the rest of the text.
+"""
+import bisect
+import functools
+import math
+import re
+import threading
+import unicodedata
+import weakref
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Columns of a search result page: the listing columns plus the matching bit of text.
+SEARCH_COLUMNS = ["id", "Date", "Amount", "Category", "Match"]
+
+# Where the notes start in the stored text (see app.py and batch_ingest.py).
+NOTE_MARKERS = (" [NOTES: ", " [FILE: ")
+
+# BM25 weight of a word in each field, in FTS5 column order.
+FIELD_WEIGHTS = {"merchant": 4.0, "notes": 2.0, "body": 1.0}
+
+# BM25 parameters (the FTS5 defaults).
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Most words the last query word may stand for as a prefix ("cost" -> costco, costume...).
+PREFIX_EXPANSIONS = 64
+
+# Words shown around the first hit in the Match column.
+SNIPPET_WORDS = 10
+
+# Deleted slots tolerated before the posting lists are compacted.
+COMPACT_MIN = 1024
+
+# Expenses whose text is decoded at once while indexing.
+INDEX_CHUNK = 4096
+
+# Texts of recently shown results kept decoded. Each rerun repeats the search, and the
+# best matches sit in different compressed blocks, so reading them back costs a block each.
+SHOWN_TEXTS = 256
+
+# Words as the FTS5 unicode61 tokenizer sees them: runs of letters and digits.
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+def tokenize(text):
+    """Lowercased words of a text, with accents removed (as FTS5's remove_diacritics does)."""
+    text = text.lower()
+    if not text.isascii():
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return TOKEN_RE.findall(text)
+
+def document_fields(raw_text):
+    """
+    (merchant, notes, body) of a stored receipt text. Must agree with the
+    expenses_search view in storage/sqlite.py, which splits the text the same way in SQL.
+    """
+    raw_text = raw_text if isinstance(raw_text, str) else ""
+    body, notes = raw_text, ""
+    for marker in NOTE_MARKERS:
+        at = raw_text.find(marker)
+        if at >= 0:
+            body, notes = raw_text[:at], raw_text[at + len(marker):]
+            break
+    merchant = body.lstrip(" \t\r\n").split("\n", 1)[0]
+    return merchant, notes, body
+
+def fts_query(query):
+    """
+    An FTS5 MATCH expression for a search box query: every word must match, and the
+    last one may be the start of a word (search as you type). None for an empty query.
+    """
+    terms = tokenize(query or "")
+    if not terms:
+        return None
+    return " ".join(f'"{term}"' for term in terms) + "*"
+
+def date_key(value):
+    """YYYYMMDD as an int for an ISO date (or date-time) string; -1 when it is not one."""
+    value = str(value)
+    try:
+        return int(value[0:4] + value[5:7] + value[8:10]) if value[4:5] == "-" and value[7:8] == "-" else -1
+    except ValueError:
+        return -1
+
+@functools.lru_cache(maxsize=64)
+def _hit_pattern(terms):
+    """Regex for the words a query matches: whole words, and the last one as a prefix."""
+    words = [re.escape(term) + r"(?![^\W_])" for term in terms[:-1]] + [re.escape(terms[-1]) + r"[^\W_]*"]
+    return re.compile(r"(?<![^\W_])(?:" + "|".join(words) + ")", re.IGNORECASE)
+
+def snippet(text, terms, words=SNIPPET_WORDS):
+    """
+    A few words of text around the first query word (the last one as a prefix), with
+    the hits in [brackets], as FTS5's snippet() shows them. "" when no word matches.
+    """
+    text = text or ""
+    pattern = _hit_pattern(tuple(terms))
+    hits = {match.start() for match in pattern.finditer(text)}
+    if not hits:
+        return ""
+    tokens = list(TOKEN_RE.finditer(text))
+    starts = [token.start() for token in tokens]
+    first = bisect.bisect_left(starts, min(hits))
+    start = max(0, first - words // 3)
+    end = min(len(tokens), start + words)
+    parts, position = [], tokens[start].start()
+    for token in tokens[start:end]:
+        if token.start() in hits:
+            parts.append(f"{text[position:token.start()]}[{token.group(0)}]")
+            position = token.end()
+    parts.append(text[position:tokens[end - 1].end()])
+    return ("..." if start > 0 else "") + "".join(parts) + ("..." if end < len(tokens) else "")
+
+def excerpt(raw_text, terms):
+    """The Match column of a result: a snippet of the receipt text, or else of its notes."""
+    if not terms:
+        return ""
+    _, notes, body = document_fields(raw_text)
+    return (snippet(body, terms) or snippet(notes, terms)).replace("\n", " ")
+
+class SearchIndex:
+    """
+    In-memory inverted index over a storage.ledger.Ledger, updated one expense at a time.
+    It keeps no receipt text of its own: each expense points at its text in the ledger's
+    TextStore, which is read back only to index it and to cut the Match column of the
+    rows shown. `version` is free for the owner to record which ledger version the index
+    reflects. Safe to share between sessions.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.version = None
+        self._texts = None            # the TextStore the text slots point into
+        self._shown = OrderedDict()   # text slot -> text, for the last results shown
+        self._slots = {}              # expense id -> slot
+        self._ids = []                # slot -> expense id (None once deleted)
+        self._text_slots = array("i") # slot -> text slot in self._texts
+        self._checksums = array("I")  # slot -> CRC-32 of the text (see TextStore.checksums)
+        self._dates = array("i")      # slot -> date_key
+        self._amounts = array("d")
+        self._categories = array("i")
+        self._category_codes = {}
+        self._category_names = []
+        self._lengths = array("f")    # slot -> weighted number of words
+        self._alive = bytearray()
+        self._postings = {}           # word -> (array("i") slots, array("f") weighted counts)
+        self._vocabulary = None       # sorted words, for prefix lookups; rebuilt when new words arrive
+        self._live = 0
+        self._live_length = 0.0
+
+    def __len__(self):
+        return self._live
+
+    @classmethod
+    def from_ledger(cls, ledger):
+        """An index of a Ledger that holds its texts."""
+        index = cls()
+        index.sync(ledger)
+        return index
+
+    def add(self, ledger, rows):
+        """
+        Indexes the expenses at these rows of `ledger` (replacing what was indexed under
+        their ids). The ledger must share the index's TextStore, as ledgers derived from
+        the one it was last synced with do.
+        """
+        with self._lock:
+            if ledger.texts is None or (self._texts is not None and ledger.texts is not self._texts):
+                raise ValueError("The ledger does not share the index's TextStore; sync the index with it")
+            self._texts = ledger.texts
+            self._index(ledger, np.asarray(rows, dtype=np.intp))
+
+    def remove(self, expense_id):
+        """Drops an expense from the index (no-op if it is not indexed)."""
+        with self._lock:
+            if expense_id in self._slots:
+                self._remove(expense_id)
+                self._maybe_compact()
+
+    def sync(self, ledger):
+        """
+        Brings the index in line with a Ledger that holds its texts. Expenses are compared
+        on the typed columns and text checksums, so only those added, changed or deleted
+        since they were last indexed have their text read.
+        """
+        if ledger.texts is None:
+            raise ValueError("SearchIndex needs a Ledger that holds its texts")
+        with self._lock:
+            ids = ledger.expense_ids()
+            rows = np.arange(len(ids))
+            last = {expense_id: row for row, expense_id in enumerate(ids)}
+            if len(last) < len(ids):
+                # The same id twice (a row copied by hand in the sheet): the last one wins
+                rows = np.array(sorted(last.values()), dtype=np.intp)
+            columns = self._ledger_columns(ledger, rows)
+            dates, amounts, categories, text_slots, checksums = columns
+            slots = np.fromiter((self._slots.get(ids[row], -1) for row in rows), dtype=np.int64, count=rows.size)
+
+            same = slots >= 0
+            if same.any():
+                known = slots[same]
+                indexed_amounts = np.frombuffer(self._amounts, dtype=np.float64)[known]
+                same[same] = (
+                    (np.frombuffer(self._dates, dtype=np.int32)[known] == dates[same])
+                    & ((indexed_amounts == amounts[same]) | (np.isnan(indexed_amounts) & np.isnan(amounts[same])))
+                    & (np.frombuffer(self._categories, dtype=np.int32)[known] == categories[same])
+                    & (np.frombuffer(self._checksums, dtype=np.uint32)[known] == checksums[same])
+                )
+            # Unchanged expenses only need to point at this ledger's copy of their text
+            np.frombuffer(self._text_slots, dtype=np.int32)[slots[same]] = text_slots[same]
+            if ledger.texts is not self._texts:
+                self._texts = ledger.texts
+                self._shown.clear()
+
+            for expense_id in set(self._slots).difference(last):
+                self._remove(expense_id)
+            changed = ~same
+            self._index(ledger, rows[changed], tuple(column[changed] for column in columns))
+            self._maybe_compact()
+
+    def search(self, query, offset=0, limit=50, start_date=None, end_date=None, category=None,
+               min_amount=None, max_amount=None):
+        """Same contract as ExpenseStore.search: (DataFrame with SEARCH_COLUMNS, total matches)."""
+        terms = tokenize(query or "")
+        with self._lock:
+            count = len(self._ids)
+            matched = np.frombuffer(self._alive, dtype=np.bool_).copy()
+            if start_date:
+                matched &= np.frombuffer(self._dates, dtype=np.int32) >= date_key(start_date)
+            if end_date:
+                matched &= np.frombuffer(self._dates, dtype=np.int32) <= date_key(end_date)
+            if category:
+                matched &= np.frombuffer(self._categories, dtype=np.int32) == self._category_codes.get(category, -1)
+            if min_amount is not None:
+                matched &= np.frombuffer(self._amounts, dtype=np.float64) >= min_amount
+            if max_amount is not None:
+                matched &= np.frombuffer(self._amounts, dtype=np.float64) <= max_amount
+
+            scores = np.zeros(count, dtype=np.float32)
+            if terms:
+                alive = np.frombuffer(self._alive, dtype=np.bool_)
+                lengths = np.frombuffer(self._lengths, dtype=np.float32)
+                average = self._live_length / self._live if self._live else 1.0
+                for position, term in enumerate(terms):
+                    words = self._expand(term) if position == len(terms) - 1 else [term]
+                    present = np.zeros(count, dtype=np.bool_)
+                    for word in words:
+                        slots, counts = self._postings.get(word, (None, None))
+                        if slots is None:
+                            continue
+                        slots = np.frombuffer(slots, dtype=np.int32)
+                        counts = np.frombuffer(counts, dtype=np.float32)
+                        frequency = int(alive[slots].sum())
+                        idf = math.log(1.0 + (self._live - frequency + 0.5) / (frequency + 0.5))
+                        norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths[slots] / average)
+                        scores[slots] += idf * counts * (BM25_K1 + 1.0) / (counts + norm)
+                        present[slots] = True
+                    # Every word has to match, as in FTS5
+                    matched &= present
+
+            hits = np.flatnonzero(matched)
+            # Best score first; newest first among equals (and for plain listings)
+            order = hits[np.lexsort((-hits, -scores[hits]))]
+            total = int(order.size)
+            page = order[offset:offset + limit].tolist()
+            # Text is read only for the rows shown, and only when there is something to match
+            texts = self._read_texts([self._text_slots[slot] for slot in page]) if terms else [""] * len(page)
+            records = [
+                (self._ids[slot], _date_text(self._dates[slot]), self._amounts[slot],
+                 self._category_names[self._categories[slot]], excerpt(raw_text, terms))
+                for slot, raw_text in zip(page, texts)
+            ]
+        return pd.DataFrame(records, columns=SEARCH_COLUMNS), total
+
+    def _read_texts(self, text_slots):
+        # Called with self._lock held. Misses are read in slot order: one decoded block each.
+        missing = sorted(set(text_slots).difference(self._shown))
+        for text_slot, text in zip(missing, self._texts.get(missing)):
+            self._shown[text_slot] = text
+        for text_slot in text_slots:
+            self._shown.move_to_end(text_slot)
+        texts = [self._shown[text_slot] for text_slot in text_slots]
+        while len(self._shown) > SHOWN_TEXTS:
+            self._shown.popitem(last=False)
+        return texts
+
+    def _ledger_columns(self, ledger, rows):
+        # Called with self._lock held. The indexed values of ledger rows, as arrays:
+        # date keys, amounts, category codes, text slots and text checksums.
+        days = ledger.dates[rows]
+        missing = np.isnat(days)
+        days = np.where(missing, np.datetime64("1970-01-01", "D"), days)
+        months = days.astype("datetime64[M]")
+        month_numbers = months.astype(np.int64)
+        dates = (month_numbers // 12 + 1970) * 10000 + (month_numbers % 12 + 1) * 100 + (days - months).astype(np.int64) + 1
+        dates = np.where(missing, -1, dates).astype(np.int32)
+        # Ledger category codes -> index codes; the extra last entry catches code -1 (no category)
+        names = list(ledger.categories.categories) + [""]
+        lookup = np.array([self._category_code(str(name)) for name in names], dtype=np.int32)
+        categories = lookup[ledger.categories.codes[rows]]
+        text_slots = ledger.text_slots[rows]
+        return dates, ledger.amounts[rows], categories, text_slots, ledger.texts.checksums(text_slots)
+
+    def _category_code(self, name):
+        # Called with self._lock held
+        code = self._category_codes.get(name)
+        if code is None:
+            code = self._category_codes[name] = len(self._category_names)
+            self._category_names.append(name)
+        return code
+
+    def _index(self, ledger, rows, columns=None):
+        # Called with self._lock held. Texts are decoded a block's worth of rows at a time.
+        ids = ledger.expense_ids(rows)
+        dates, amounts, categories, text_slots, checksums = columns or self._ledger_columns(ledger, rows)
+        for start in range(0, len(rows), INDEX_CHUNK):
+            texts = ledger.raw_texts(rows[start:start + INDEX_CHUNK])
+            for i, raw_text in enumerate(texts, start):
+                if ids[i] in self._slots:
+                    self._remove(ids[i])
+                self._add(ids[i], dates[i], amounts[i], categories[i], text_slots[i], checksums[i], raw_text)
+
+    def _add(self, expense_id, date, amount, category, text_slot, checksum, raw_text):
+        # Called with self._lock held
+        slot = len(self._ids)
+        self._slots[expense_id] = slot
+        self._ids.append(expense_id)
+        self._text_slots.append(int(text_slot))
+        self._checksums.append(int(checksum))
+        self._dates.append(int(date))
+        self._amounts.append(float(amount))
+        self._categories.append(int(category))
+        self._alive.append(1)
+
+        counts = {}
+        for field, text in zip(FIELD_WEIGHTS, document_fields(raw_text)):
+            weight = FIELD_WEIGHTS[field]
+            for word in tokenize(text):
+                counts[word] = counts.get(word, 0.0) + weight
+        for word, weight in counts.items():
+            posting = self._postings.get(word)
+            if posting is None:
+                posting = self._postings[word] = (array("i"), array("f"))
+                self._vocabulary = None
+            posting[0].append(slot)
+            posting[1].append(weight)
+        length = float(sum(counts.values()))
+        self._lengths.append(length)
+        self._live += 1
+        self._live_length += length
+
+    def _remove(self, expense_id):
+        # Called with self._lock held. The postings stay until the next compaction.
+        slot = self._slots.pop(expense_id)
+        self._ids[slot] = None
+        self._alive[slot] = 0
+        self._live -= 1
+        self._live_length -= self._lengths[slot]
+
+    def _expand(self, prefix):
+        """The indexed words starting with `prefix`, the word itself first."""
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        words = []
+        for word in self._vocabulary[start:start + PREFIX_EXPANSIONS]:
+            if not word.startswith(prefix):
+                break
+            words.append(word)
+        return words
+
+    def _maybe_compact(self):
+        # Called with self._lock held
+        dead = len(self._ids) - self._live
+        if dead < COMPACT_MIN or dead < self._live:
+            return
+        alive = np.frombuffer(self._alive, dtype=np.bool_).copy()
+        # Old slot -> new slot for every live expense
+        renumber = (np.cumsum(alive) - 1).astype(np.int32)
+        postings = {}
+        for word, (slots, counts) in self._postings.items():
+            slots = np.frombuffer(slots, dtype=np.int32)
+            keep = alive[slots]
+            if keep.any():
+                postings[word] = (array("i", renumber[slots[keep]].tobytes()),
+                                  array("f", np.frombuffer(counts, dtype=np.float32)[keep].tobytes()))
+        live = np.flatnonzero(alive).tolist()
+        self._postings = postings
+        self._vocabulary = None
+        self._ids = [self._ids[slot] for slot in live]
+        self._slots = {expense_id: slot for slot, expense_id in enumerate(self._ids)}
+        for name in ("_text_slots", "_checksums", "_dates", "_amounts", "_categories", "_lengths"):
+            old = getattr(self, name)
+            setattr(self, name, array(old.typecode, [old[slot] for slot in live]))
+        self._alive = bytearray(b"\x01" * len(live))
+
+def _date_text(key):
+    """The ISO date of a date_key ("" for -1), as Ledger.frame shows dates."""
+    return "" if key < 0 else f"{key // 10000:04d}-{key // 100 % 100:02d}-{key % 100:02d}"
+
+# Indexes memoized per store, valid for one ledger version (see ExpenseStore.search)
+_cache = weakref.WeakKeyDictionary()
+_cache_lock = threading.Lock()
+
+def index_for(store):
+    """
+    The SearchIndex of a store's ledger, synced only when store.version() changes.
+    Stores that do not track versions are re-synced on every call.
+    """
+    # Imported here: storage.ledger imports storage.base, which imports this module
+    from storage.ledger import Ledger
+
+    version = store.version()
+    with _cache_lock:
+        index = _cache.get(store)
+        if index is None:
+            index = _cache[store] = SearchIndex()
+    with index._lock:
+        if version is None or index.version != version:
+            # A Ledger holding the text compressed, so the index can point into it
+            index.sync(Ledger.from_frame(store.get_all()))
+            index.version = version
+    return index
@@ -0,0 +1,838 @@
+import gspread
+from oauth2client.service_account import ServiceAccountCredentials
+import numpy as np
+import pandas as pd
+import json
+import hashlib
+import threading
+import time
+import random
+import re
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from receipt_parser import parse_amount_text
+from storage.base import ExpenseStore, HEADERS, PAGE_COLUMNS, StoreUnavailable, WritesPending, expense_rows, new_expense_id
+from storage.ledger import Ledger
+from storage.search import SearchIndex
+import aggregates
+import metrics
+
+# Name of the Google Sheet to use.
+SHEET_NAME = "SnapBudget Expenses"
+
+# Seconds a downloaded copy of the ledger is reused before the sheet is read again.
+SNAPSHOT_TTL = 30
+
+# Write-behind queue: pending writes are flushed once this many are queued...
+WRITE_BATCH_SIZE = 50
+# ...or this many seconds after the first one was queued, whichever comes first.
+WRITE_FLUSH_INTERVAL = 2.0
+# Retries for rate-limited (429) or transient (5xx) write calls, with exponential backoff.
+WRITE_MAX_RETRIES = 5
+# Seconds before writes the sheet kept refusing are tried again (they stay queued meanwhile).
+WRITE_RETRY_INTERVAL = 30.0
+
+# Read the ID cells back (one batchGet) before editing or deleting rows, and rebuild the id
+# index if any of them moved. Sessions of one app process share the index, but other
+# processes (a second app server, the CLI, hand edits) can insert or delete rows in the
+# same sheet; turn this off only when nothing else writes to it.
+VERIFY_ROW_IDS = True
+
+# Scopes requested for the service account.
+SCOPE = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+
+def _authorize(creds_dict):
+    """Builds a freshly authorized gspread client from a service account dict."""
+    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, SCOPE)
+    client = gspread.authorize(creds)
+    session = getattr(getattr(client, "http_client", None), "session", None)
+    if session is not None:
+        session.hooks.setdefault("response", []).append(_meter_response)
+    return client
+
+def _meter_response(response, *args, **kwargs):
+    # requests response hook: bytes the Sheets API sent back (read anyway by gspread)
+    if metrics.enabled():
+        metrics.count("sheets_bytes_fetched", len(response.content))
+
+class MeteredWorksheet:
+    """
+    A gspread worksheet whose API calls are timed into metrics (sheets_api{method=...}).
+    Everything else passes straight through to the wrapped worksheet.
+    """
+
+    def __init__(self, worksheet):
+        self.unwrapped = worksheet
+
+    def __getattr__(self, name):
+        attribute = getattr(self.unwrapped, name)
+        if name.startswith("_") or not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            with metrics.timer("sheets_api", method=name):
+                return attribute(*args, **kwargs)
+        return call
+
+# Factory used to turn a credentials dict into a gspread client.
+# Swappable so the connection layer can run against a local fake gspread backend.
+_client_factory = _authorize
+
+# Process-wide pool of connections keyed by (credentials fingerprint, sheet name).
+# Streamlit runs every browser session as a thread of the same process, so all
+# sessions share one authorized client and one resolved worksheet.
+_pool = {}
+_pool_lock = threading.Lock()
+
+class SheetConnection:
+    """
+    A pooled, authorized gspread client plus its resolved worksheet.
+    All access goes through `lock`, so it is safe to share between sessions.
+    """
+
+    def __init__(self, creds_dict, sheet_name):
+        self.creds_dict = creds_dict
+        self.sheet_name = sheet_name
+        self.lock = threading.RLock()
+        self.client = None
+        self.worksheet = None
+        self.headers_checked = False
+        # Bumped on every change to the cached ledger (see SheetsStore.version)
+        self.version = 0
+        # Cached copy of the ledger, a read-only Ledger shared by every session (see SheetsStore.get_all)
+        self.snapshot = None
+        self.snapshot_at = 0.0
+        # Expense id -> sheet row, kept current by our own appends and deletes.
+        # None until first needed; rebuilt from the sheet whenever it cannot be trusted.
+        self.row_ids = None
+        self.row_count = 0
+        # Full-text index of the snapshot; its version says which snapshot it reflects
+        self.search_index = SearchIndex()
+        self.write_queue = WriteQueue(self)
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    @snapshot.setter
+    def snapshot(self, df):
+        # Any replacement, patch or invalidation is a new ledger version
+        self._snapshot = df
+        self.version += 1
+
+    def get_client(self):
+        with self.lock:
+            if self.client is None:
+                with metrics.timer("sheets_auth", step="authorize"):
+                    self.client = _client_factory(self.creds_dict)
+            else:
+                _refresh_token(self.client)
+            return self.client
+
+    def get_worksheet(self):
+        with self.lock:
+            client = self.get_client()
+            if self.worksheet is None:
+                with metrics.timer("sheets_api", method="open"):
+                    self.worksheet = MeteredWorksheet(client.open(self.sheet_name).sheet1)
+            return self.worksheet
+
+    def reset(self):
+        """Drops the client and worksheet so the next call reconnects from scratch."""
+        with self.lock:
+            self.client = None
+            self.worksheet = None
+            self.headers_checked = False
+            self.snapshot = None
+            self.row_ids = None
+
+    # The id index is only touched with `lock` held, which also serializes every
+    # write that adds or removes sheet rows, so positions cannot shift underneath it.
+
+    def index_rows(self, ids):
+        """Replaces the id index with `ids`, the ID column from row 2 down."""
+        self.row_ids = {expense_id: i + 2 for i, expense_id in enumerate(ids)}
+        self.row_count = len(ids)
+
+    def index_appended(self, ids, first_row):
+        """Records rows we appended, starting at `first_row` (as reported by the API)."""
+        if self.row_ids is None:
+            return
+        if first_row != self.row_count + 2:
+            # Someone outside this process appended too: positions are unknown now
+            self.row_ids = None
+            return
+        for i, expense_id in enumerate(ids):
+            self.row_ids[expense_id] = first_row + i
+        self.row_count += len(ids)
+
+    def index_deleted(self, row):
+        """Records that sheet row `row` was deleted: every row below moves up by one."""
+        if self.row_ids is None:
+            return
+        self.row_ids = {
+            expense_id: r - 1 if r > row else r
+            for expense_id, r in self.row_ids.items() if r != row
+        }
+        self.row_count -= 1
+
+def _refresh_token(client):
+    """
+    gspread >= 5 talks through a google-auth session that refreshes tokens on its own.
+    Older oauth2client-based clients expose `login()` and need an explicit nudge.
+    """
+    auth = getattr(client, "auth", None)
+    if getattr(auth, "access_token_expired", False) and hasattr(client, "login"):
+        with metrics.timer("sheets_auth", step="refresh"):
+            client.login()
+
+def _pool_key(creds_dict, sheet_name):
+    fingerprint = json.dumps(creds_dict, sort_keys=True, default=str)
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest(), sheet_name
+
+def get_connection(creds_dict, sheet_name=SHEET_NAME):
+    """Returns the shared SheetConnection for these credentials and sheet, creating it once per process."""
+    creds_dict = dict(creds_dict)
+
+    key = _pool_key(creds_dict, sheet_name)
+    with _pool_lock:
+        conn = _pool.get(key)
+        if conn is None:
+            conn = SheetConnection(creds_dict, sheet_name)
+            _pool[key] = conn
+        return conn
+
+def set_client_factory(factory=None):
+    """
+    Replaces how clients are authorized, e.g. with a fake gspread backend.
+    Passing None restores the real service-account login. Pooled connections are dropped.
+    """
+    global _client_factory
+    with _pool_lock:
+        _client_factory = factory or _authorize
+        _pool.clear()
+
+def _handle_sheet_error(conn, e):
+    """
+    Resets the pooled connection when an error means it can no longer be trusted
+    (expired/revoked auth, a vanished sheet, or a broken transport).
+    Quota and validation errors leave the connection intact.
+    """
+    if isinstance(e, gspread.exceptions.APIError) and _status_code(e) not in (401, 403, 404):
+        return
+    conn.reset()
+
+def _status_code(e):
+    """HTTP status of a gspread APIError (None for other errors)."""
+    return getattr(getattr(e, "response", None), "status_code", None)
+
+class WriteQueue:
+    """
+    Write-behind buffer for one worksheet.
+    Pending appends are merged into a single append_rows call and pending row edits into a
+    single batch_update, flushed when WRITE_BATCH_SIZE writes are queued or WRITE_FLUSH_INTERVAL
+    seconds have passed. Every write returns the Future of the flush that will carry it.
+
+    Writes the sheet refuses for now (rate limits, server errors, a lost connection) go back
+    to the front of the queue: they are retried with backoff, then every WRITE_RETRY_INTERVAL
+    seconds, and their Future stays pending until they land. Only writes the API rejects as
+    invalid are dropped, with the error set on their Future.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._lock = threading.Lock()
+        self._appends = []
+        self._updates = {}  # expense id -> row values; a later edit of the same expense wins
+        self._future = Future()
+        self._timer = None
+        # The sheet refused the last flush: only the retry timer flushes until one succeeds
+        self._refused = False
+        # An append failed midway and may have landed anyway: check before sending it again
+        self._recheck_appends = False
+
+    def append(self, rows):
+        with self._lock:
+            self._appends.extend(rows)
+            return self._schedule()
+
+    def update(self, expense_id, values):
+        with self._lock:
+            queued = self._updates.get(expense_id)
+            if values[2] is None and queued is not None:
+                # Keep raw text from an earlier queued edit of the same expense
+                values = values[:2] + [queued[2]] + values[3:]
+            self._updates[expense_id] = values
+            return self._schedule()
+
+    def discard(self, expense_id):
+        """
+        Drops queued writes of an expense that is being deleted. Returns True if it was
+        still waiting to be appended. Call with conn.lock held, so no flush is sending (or
+        putting back) its writes meanwhile.
+        """
+        with self._lock:
+            self._updates.pop(expense_id, None)
+            kept = [row for row in self._appends if row[4] != expense_id]
+            appended = len(kept) < len(self._appends)
+            self._appends = kept
+            return appended
+
+    def pending(self):
+        with self._lock:
+            return len(self._appends) + len(self._updates)
+
+    def unconfirmed(self):
+        """True while an append that failed midway may have landed anyway, so queued rows may already be in the sheet."""
+        with self._lock:
+            return self._recheck_appends
+
+    def applied(self, ledger):
+        """`ledger` (a fresh download) with the queued writes applied, as the sheet will look once they land."""
+        with self._lock:
+            appends, updates = list(self._appends), dict(self._updates)
+            recheck = self._recheck_appends
+        if appends and recheck:
+            downloaded = set(ledger.expense_ids())
+            appends = [row for row in appends if row[4] not in downloaded]
+        if appends:
+            ledger = ledger.append(appends)
+        for expense_id, values in updates.items():
+            if ledger.position(expense_id) is not None:
+                ledger = ledger.update(expense_id, values)
+        return ledger
+
+    def _schedule(self):
+        # Called with self._lock held
+        future = self._future
+        if len(self._appends) + len(self._updates) >= WRITE_BATCH_SIZE and not self._refused:
+            threading.Thread(target=self._flush, daemon=True).start()
+        elif self._timer is None:
+            self._start_timer(WRITE_FLUSH_INTERVAL)
+        return future
+
+    def _start_timer(self, interval):
+        # Called with self._lock held
+        self._timer = threading.Timer(interval, self._flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self):
+        """
+        Sends everything pending now. Returns the Future of that flush, which is still
+        pending if the sheet refused the writes (they stay queued).
+        """
+        with self._lock:
+            future = self._future
+        self._flush()
+        return future
+
+    def _flush(self):
+        conn = self.conn
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            # Once the sheet has refused a flush, each further one tries just once until it lands
+            attempts = 1 if self._refused else WRITE_MAX_RETRIES + 1
+
+        for attempt in range(attempts):
+            # The connection lock: one flush talks to the sheet at a time, so batches land
+            # in order, and no delete can move rows while edits are being addressed. It is
+            # held for one attempt; backoff waits happen without it.
+            with conn.lock:
+                with self._lock:
+                    appends, self._appends = self._appends, []
+                    updates, self._updates = self._updates, {}
+                    future, self._future = self._future, Future()
+                if not appends and not updates:
+                    if not future.done():
+                        future.set_result(0)
+                    return
+
+                sent = len(appends) + len(updates)
+                try:
+                    sheet = conn.get_worksheet()
+                    # Appends first: queued edits may target rows that were just appended
+                    if appends:
+                        self._send_appends(sheet, appends)
+                        appends = []
+                    if updates:
+                        self._send_updates(sheet, updates)
+                except Exception as e:
+                    error = e
+                    _handle_sheet_error(conn, e)
+                    if not _transient(e):
+                        # The API rejected them: sending them again would fail the same way.
+                        # The snapshot was patched optimistically; it no longer matches the sheet
+                        conn.snapshot = None
+                        conn.row_ids = None
+                        future.set_exception(e)
+                        return
+                    # Back to the front of the queue before anyone else can look at it
+                    self._requeue(appends, updates, future)
+                else:
+                    with self._lock:
+                        self._refused = False
+                    future.set_result(sent)
+                    return
+
+            if not _retryable(error) or attempt == attempts - 1:
+                break
+            time.sleep(_backoff_delay(attempt))
+
+        metrics.count("sheets_writes_requeued", sent)
+        with self._lock:
+            self._refused = True
+            if self._timer is None:
+                self._start_timer(WRITE_RETRY_INTERVAL)
+
+    def _send_appends(self, sheet, appends):
+        # Called with conn.lock held
+        conn = self.conn
+        if self._recheck_appends:
+            # Rows of a failed append that did land anyway carry their ids: skip those
+            _load_row_ids(conn, sheet)
+            appends = [row for row in appends if row[4] not in conn.row_ids]
+        if appends:
+            response = sheet.append_rows(appends)
+            conn.index_appended([row[4] for row in appends], _first_row(_updated_range(response)))
+        with self._lock:
+            self._recheck_appends = False
+
+    def _send_updates(self, sheet, updates):
+        # Called with conn.lock held. Edits of expenses deleted in the meantime have nothing left to change
+        rows = _resolve_rows(self.conn, sheet, list(updates))
+        data = []
+        for expense_id, row in sorted(rows.items(), key=lambda item: item[1]):
+            data.extend(_row_ranges(row, updates[expense_id]))
+        if data:
+            sheet.batch_update(data)
+
+    def _requeue(self, appends, updates, future):
+        # Called with conn.lock held: writes of a failed flush go back ahead of newer ones
+        with self._lock:
+            self._appends[:0] = appends
+            if appends:
+                self._recheck_appends = True
+            for expense_id, values in updates.items():
+                newer = self._updates.get(expense_id)
+                if newer is None:
+                    self._updates[expense_id] = values
+                elif newer[2] is None and values[2] is not None:
+                    # A later edit wins, but keeps the raw text this one was setting
+                    self._updates[expense_id] = newer[:2] + [values[2]] + newer[3:]
+            # The failed flush's Future settles with the one that carries its writes now
+            _chain(self._future, future)
+
+def _chain(source, target):
+    """Settles `target` the way `source` settles."""
+    def settle(done):
+        if target.done():
+            return
+        if done.exception() is not None:
+            target.set_exception(done.exception())
+        else:
+            target.set_result(done.result())
+    source.add_done_callback(settle)
+
+def _row_ranges(row, values):
+    """batch_update entries writing one row; column C is skipped when raw text is None."""
+    if values[2] is None:
+        return [
+            {"range": f"A{row}:B{row}", "values": [values[:2]]},
+            {"range": f"D{row}", "values": [[values[3]]]},
+        ]
+    return [{"range": f"A{row}:D{row}", "values": [values[:4]]}]
+
+def _updated_range(response):
+    """The A1 range an append_rows call reports having written."""
+    return (response or {}).get("updates", {}).get("updatedRange")
+
+def _first_row(updated_range):
+    """Start row of an A1 range such as "Sheet1!A12:E14"."""
+    match = re.search(r"![A-Z]+(\d+)", updated_range or "")
+    return int(match.group(1)) if match else None
+
+def _retryable(e):
+    """Rate limiting (429) and server errors (5xx): the same call is likely to succeed shortly."""
+    status = _status_code(e)
+    return status == 429 or (status is not None and status >= 500)
+
+def _transient(e):
+    """Anything but the API rejecting a request as invalid (4xx other than auth, not found and rate limits)."""
+    status = _status_code(e)
+    if not isinstance(e, gspread.exceptions.APIError) or status is None:
+        return True
+    return status in (401, 403, 404, 408, 429) or status >= 500
+
+def _backoff_delay(attempt):
+    # 1s, 2s, 4s ... capped at 32s, with jitter so sessions do not retry in lockstep
+    return min(2 ** attempt, 32) + random.random()
+
+def _with_backoff(call, lock=None):
+    """
+    Runs a Sheets API call, retrying rate-limit (429) and server (5xx) errors with exponential backoff.
+    With `lock`, every attempt runs holding it and the waits happen with it released, so one
+    rate-limited session does not stall the others; `call` then starts over from the top and
+    must not reuse anything it looked up (such as a row number) in an earlier attempt.
+    """
+    for attempt in range(WRITE_MAX_RETRIES + 1):
+        try:
+            if lock is None:
+                return call()
+            with lock:
+                return call()
+        except gspread.exceptions.APIError as e:
+            if not _retryable(e) or attempt == WRITE_MAX_RETRIES:
+                raise
+        time.sleep(_backoff_delay(attempt))
+
+def _backfill_ids(sheet, ids):
+    """
+    Gives rows without an id (typed in by hand, or saved before ids existed) a new one.
+    The new ids are written back in one batch_update. Returns the completed list.
+    Called with conn.lock held; like the other helpers below it leaves retrying to the
+    caller (see _with_backoff), so no backoff wait happens under the lock.
+    """
+    ids = list(ids)
+    data = []
+    for i, expense_id in enumerate(ids):
+        if not expense_id:
+            ids[i] = new_expense_id()
+            data.append({"range": f"E{i + 2}", "values": [[ids[i]]]})
+    if data:
+        sheet.batch_update(data)
+    return ids
+
+def _read_row_ids(sheet):
+    """The id of every data row in sheet order ("" where a row has none): column A (to count rows) and E in one batchGet."""
+    dates, ids = sheet.batch_get(["A2:A", "E2:E"])
+    ids = [row[0] if row else "" for row in ids]
+    return ids + [""] * (len(dates) - len(ids))
+
+def _load_row_ids(conn, sheet):
+    """Rebuilds the id index from the sheet, giving rows without an id one."""
+    conn.index_rows(_backfill_ids(sheet, _read_row_ids(sheet)))
+
+def _resolve_rows(conn, sheet, ids):
+    """
+    Sheet rows of the given expense ids, looked up in the id index (call with conn.lock held).
+    With VERIFY_ROW_IDS the ID cells are read back first, and any mismatch rebuilds the index.
+    Ids that are not in the sheet are left out of the result.
+    """
+    if conn.row_ids is None:
+        _load_row_ids(conn, sheet)
+    rows = {expense_id: conn.row_ids.get(expense_id) for expense_id in ids}
+
+    stale = None in rows.values()
+    if not stale and VERIFY_ROW_IDS:
+        cells = sheet.batch_get([f"E{row}" for row in rows.values()])
+        stale = any(
+            (cell[0][0] if cell and cell[0] else "") != expense_id
+            for cell, expense_id in zip(cells, rows)
+        )
+    if stale:
+        # An id we do not know, or a row that moved: look again
+        _load_row_ids(conn, sheet)
+        rows = {expense_id: conn.row_ids.get(expense_id) for expense_id in ids}
+    return {expense_id: row for expense_id, row in rows.items() if row is not None}
+
+def _fetch_ledger(sheet):
+    """Downloads the whole sheet once and returns it as a Ledger in sheet order (row i+2 is ledger row i)."""
+    # The ID column stays text even when an id happens to look like a number
+    return Ledger.from_records(sheet.get_all_records(numericise_ignore=[5]))
+
+class SheetsStore(ExpenseStore):
+    """
+    Google Sheets backend. Reads are served from a cached snapshot of the ledger and
+    writes go through the connection's write-behind queue, so the sheet is hit as
+    little as possible. Every row carries its expense id in column E; an in-memory
+    id -> row index turns an id into a row without reading the sheet.
+    """
+
+    name = "sheets"
+
+    def __init__(self, creds_dict, sheet_name=SHEET_NAME):
+        self.sheet_name = sheet_name
+        self.conn = get_connection(creds_dict, sheet_name)
+
+    def connect(self):
+        self.worksheet()
+
+    def worksheet(self):
+        """The pooled worksheet, with headers verified once per connection."""
+        conn = self.conn
+        try:
+            sheet = conn.get_worksheet()
+        except gspread.exceptions.SpreadsheetNotFound:
+            # Usually service accounts can only create sheets in their own Drive.
+            # Easier workflow: User creates sheet and shares it with service account email.
+            raise StoreUnavailable(
+                f"Spreadsheet '{self.sheet_name}' not found. Please create it and share it with the service account email."
+            )
+        except Exception as e:
+            _handle_sheet_error(conn, e)
+            raise
+
+        if not conn.headers_checked:
+            try:
+                # Check first row
+                headers = sheet.row_values(1)
+                if not headers:
+                    sheet.insert_row(HEADERS, 1)
+                elif "ID" not in headers:
+                    # Sheet from before expense ids: name the column; rows get ids when first indexed
+                    sheet.update_acell("E1", "ID")
+                conn.headers_checked = True
+            except Exception as e:
+                _handle_sheet_error(conn, e)
+                raise
+        return sheet
+
+    def _snapshot(self):
+        """
+        The cached Ledger (shared, read-only), downloading the sheet at most once per SNAPSHOT_TTL.
+        Writes swap in a patched Ledger, so a save does not force another full read.
+        """
+        conn = self.conn
+        sheet = self.worksheet()
+
+        def load():
+            # Runs holding the lock, so concurrent reruns share a single download
+            if conn.snapshot is not None and time.monotonic() - conn.snapshot_at <= SNAPSHOT_TTL:
+                metrics.count("cache_hits", cache="sheets_snapshot")
+                return conn.snapshot
+            metrics.count("cache_misses", cache="sheets_snapshot")
+            ledger = _fetch_ledger(sheet)
+            downloaded = ledger.expense_ids()
+            ids = _backfill_ids(sheet, downloaded)
+            if ids != downloaded:
+                ledger = ledger.with_ids(ids)
+            # The download doubles as a fresh id index
+            conn.index_rows(ids)
+            # Queued writes are not in the sheet yet (the queue only changes under the same
+            # lock, so none is halfway there): the copy shows them as they will land
+            conn.snapshot = conn.write_queue.applied(ledger)
+            conn.snapshot_at = time.monotonic()
+            return conn.snapshot
+
+        try:
+            return _with_backoff(load, conn.lock)
+        except Exception as e:
+            _handle_sheet_error(conn, e)
+            raise
+
+    def invalidate(self):
+        """Forces the next read to download the sheet again."""
+        with self.conn.lock:
+            self.conn.snapshot = None
+
+    def _patch_snapshot(self, fn, index_fn=None):
+        """
+        Replaces the cached ledger with fn(ledger) (no-op when nothing is cached), and
+        calls index_fn(search_index, new_ledger) if the index was up to date with the ledger.
+        """
+        conn = self.conn
+        with conn.lock:
+            if conn.snapshot is None:
+                return
+            index = conn.search_index
+            index_current = index.version == conn.version
+            try:
+                conn.snapshot = fn(conn.snapshot)
+            except Exception:
+                # A patch we cannot apply cleanly is not worth a wrong answer; re-read next time
+                conn.snapshot = None
+                return
+            if index_current and index_fn is not None:
+                try:
+                    index_fn(index, conn.snapshot)
+                    index.version = conn.version
+                except Exception:
+                    # Left behind: the next search syncs it with the snapshot
+                    pass
+
+    def add(self, rows):
+        self.worksheet()
+        rows = expense_rows(rows)
+
+        def index(search_index, ledger):
+            # The new rows are the last ones of the patched ledger
+            search_index.add(ledger, range(len(ledger) - len(rows), len(ledger)))
+        # Queued and patched in as one step, so a download in between cannot show it twice
+        with self.conn.lock:
+            future = self.conn.write_queue.append(rows)
+            self._patch_snapshot(lambda ledger: ledger.append(rows), index)
+        return future
+
+    def update(self, changes):
+        self.worksheet()
+        future = None
+        for expense_id, values in changes:
+            def update(ledger, expense_id=expense_id, values=values):
+                return ledger.update(expense_id, values)
+
+            def index(search_index, ledger, expense_id=expense_id):
+                search_index.add(ledger, [ledger.position(expense_id)])
+            with self.conn.lock:
+                future = self.conn.write_queue.update(expense_id, values)
+                self._patch_snapshot(update, index)
+        return future
+
+    def delete(self, expense_id):
+        sheet = self.worksheet()
+        conn = self.conn
+        queued = False
+
+        def delete_row():
+            # Runs holding the lock, so no flush is sending or putting back this expense's
+            # append, and no other session can add or remove rows between looking up the
+            # row and deleting it
+            nonlocal queued
+            if conn.write_queue.discard(expense_id):
+                queued = True
+                if not conn.write_queue.unconfirmed():
+                    # Still in the queue: it never reached the sheet, so there is no row to delete.
+                    # Other queued writes can wait; they find their rows by id whenever they go out
+                    return None
+            row = _resolve_rows(conn, sheet, [expense_id]).get(expense_id)
+            if row is not None:
+                sheet.delete_rows(row)
+                conn.index_deleted(row)
+            return row
+
+        try:
+            row = _with_backoff(delete_row, conn.lock)
+        except Exception as e:
+            _handle_sheet_error(conn, e)
+            self.invalidate()
+            raise
+        if row is None and not queued:
+            raise ValueError(f"No expense with id {expense_id}")
+
+        self._patch_snapshot(lambda ledger: ledger.remove(expense_id),
+                             lambda search_index, ledger: search_index.remove(expense_id))
+
+    def get_ledger(self):
+        # The shared snapshot itself: it is read-only, so no copy is needed
+        return self._snapshot()
+
+    def get_all(self):
+        return self._snapshot().frame()
+
+    def iter_ledger(self, chunk_size=10000, start_date=None, end_date=None, category=None):
+        ledger = self._snapshot()
+        rows = np.flatnonzero(ledger.mask(start_date, end_date, category))
+        for start in range(0, len(rows), chunk_size):
+            yield ledger.frame(rows[start:start + chunk_size])
+
+    def _cached_snapshot(self):
+        """The snapshot if it is still fresh, without triggering a download."""
+        conn = self.conn
+        with conn.lock:
+            if conn.snapshot is not None and time.monotonic() - conn.snapshot_at <= SNAPSHOT_TTL:
+                return conn.snapshot
+        return None
+
+    def get_page(self, offset=0, limit=50, start_date=None, end_date=None, category=None, backfill=True):
+        filtered = start_date or end_date or category
+        cached = self._cached_snapshot()
+        if cached is not None or filtered or self.conn.write_queue.pending():
+            # Filters need every row anyway, and queued writes are only in the snapshot;
+            # reuse (or load) it
+            ledger = cached if cached is not None else self._snapshot()
+            return ledger.page(offset, limit, start_date, end_date, category, PAGE_COLUMNS)
+
+        # Unfiltered and nothing cached: read only the rows on this page
+        sheet = self.worksheet()
+        try:
+            # Column A alone tells us how many rows there are
+            total = max(len(_with_backoff(lambda: sheet.col_values(1))) - 1, 0)
+            # Newest entries are at the bottom: page 0 ends at the last row
+            last = total + 1 - offset
+            first = max(last - limit + 1, 2)
+            if last < 2:
+                return pd.DataFrame(columns=PAGE_COLUMNS), total
+            # One batchGet for A:B and D:E, skipping the bulky Raw Text column
+            left, right = _with_backoff(lambda: sheet.batch_get([f"A{first}:B{last}", f"D{first}:E{last}"]))
+        except Exception as e:
+            _handle_sheet_error(self.conn, e)
+            raise
+
+        rows = []
+        for i in range(last - first + 1):
+            date_amount = (list(left[i]) if i < len(left) else []) + ["", ""]
+            category_id = (list(right[i]) if i < len(right) else []) + ["", ""]
+            rows.append([category_id[1], date_amount[0], parse_amount_text(date_amount[1]), category_id[0]])
+        if not all(row[0] for row in rows) and backfill:
+            # Rows without an id cannot be edited; give them one and read the page again
+            _with_backoff(lambda: _load_row_ids(self.conn, sheet), self.conn.lock)
+            return self.get_page(offset, limit, backfill=False)
+        df = pd.DataFrame(rows[::-1], columns=PAGE_COLUMNS)
+        return df, total
+
+    def get_raw_text(self, expense_id):
+        cached = self._cached_snapshot()
+        if cached is None and self.conn.write_queue.pending():
+            # A queued write may be changing this text: only the snapshot has it
+            cached = self._snapshot()
+        if cached is not None:
+            return cached.raw_text(expense_id)
+        sheet = self.worksheet()
+        conn = self.conn
+
+        def read():
+            row = _resolve_rows(conn, sheet, [expense_id]).get(expense_id)
+            return None if row is None else sheet.acell(f"C{row}").value
+
+        try:
+            return _with_backoff(read, conn.lock)
+        except Exception as e:
+            _handle_sheet_error(conn, e)
+            raise
+
+    def search(self, query, offset=0, limit=50, start_date=None, end_date=None, category=None,
+               min_amount=None, max_amount=None):
+        conn = self.conn
+        index = conn.search_index
+        while True:
+            # Loaded outside the lock (a download backs off without holding it)...
+            ledger = self._snapshot()
+            with conn.lock:
+                if conn.snapshot is not ledger:
+                    # ...so it may have been replaced meanwhile; take the current one
+                    continue
+                if index.version != conn.version:
+                    # A fresh download (or a patch the index missed): re-index only what changed
+                    index.sync(ledger)
+                    index.version = conn.version
+                # Still holding the lock: a write patching the index meanwhile would change it mid-search
+                return index.search(query, offset, limit, start_date, end_date, category, min_amount, max_amount)
+
+    def monthly_total(self, year, month):
+        # Served from the memoized summary of the snapshot
+        return aggregates.summarize(self).monthly_total(year, month)
+
+    def version(self):
+        # Refresh first so an expired snapshot shows up as a new version
+        self._snapshot()
+        return self.conn.version
+
+    def flush(self, timeout=None):
+        """
+        Sends queued writes now. If the sheet still refuses them after retrying, waits up
+        to `timeout` seconds for the background retries, then raises WritesPending.
+        """
+        queue = self.conn.write_queue
+        future = queue.flush()
+        if timeout is None and not future.done():
+            # Retried already; the background retries take it from here
+            timeout = 0
+        try:
+            future.result(timeout=timeout)
+        except FutureTimeout:
+            raise WritesPending(f"Google Sheets is not accepting writes right now; {queue.pending()} change(s) are still queued")
@@ -0,0 +1,460 @@
+import sqlite3
+import threading
+import queue
+from contextlib import contextmanager
+import pandas as pd
+
+from storage.base import ExpenseStore, LEDGER_COLUMNS, PAGE_COLUMNS, completed, expense_rows, new_expense_id
+from storage.ledger import Ledger
+from storage.search import FIELD_WEIGHTS, SEARCH_COLUMNS, excerpt, fts_query, tokenize
+
+# Default database file (the repo ships an empty one).
+DEFAULT_PATH = "expenses.db"
+
+# Connections kept open per database file. WAL lets them read concurrently.
+POOL_SIZE = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    amount REAL NOT NULL,
+    raw_text TEXT,
+    category TEXT DEFAULT 'Uncategorized',
+    uid TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date);
+CREATE INDEX IF NOT EXISTS idx_expenses_category ON expenses(category);
+
+-- Year-month x category sums, kept current by the triggers below so month
+-- totals never scan expenses. rebuild_rollups() repairs any drift.
+CREATE TABLE IF NOT EXISTS rollups (
+    month TEXT NOT NULL,
+    category TEXT NOT NULL,
+    total REAL NOT NULL DEFAULT 0,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (month, category)
+);
+
+CREATE TRIGGER IF NOT EXISTS rollups_after_insert AFTER INSERT ON expenses BEGIN
+    INSERT INTO rollups (month, category, total, count)
+    VALUES (substr(NEW.date, 1, 7), COALESCE(NULLIF(NEW.category, ''), 'Uncategorized'), NEW.amount, 1)
+    ON CONFLICT (month, category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS rollups_after_delete AFTER DELETE ON expenses BEGIN
+    UPDATE rollups SET total = total - OLD.amount, count = count - 1
+    WHERE month = substr(OLD.date, 1, 7) AND category = COALESCE(NULLIF(OLD.category, ''), 'Uncategorized');
+    DELETE FROM rollups WHERE count <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS rollups_after_update AFTER UPDATE OF date, amount, category ON expenses BEGIN
+    UPDATE rollups SET total = total - OLD.amount, count = count - 1
+    WHERE month = substr(OLD.date, 1, 7) AND category = COALESCE(NULLIF(OLD.category, ''), 'Uncategorized');
+    INSERT INTO rollups (month, category, total, count)
+    VALUES (substr(NEW.date, 1, 7), COALESCE(NULLIF(NEW.category, ''), 'Uncategorized'), NEW.amount, 1)
+    ON CONFLICT (month, category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+    DELETE FROM rollups WHERE count <= 0;
+END;
+
+-- Ledger version: bumped by the triggers below for every change to an expense, whichever
+-- connection or process makes it (the CLI, a second server), so memoized summaries notice.
+CREATE TABLE IF NOT EXISTS ledger_version (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO ledger_version (id, version) VALUES (0, 0);
+
+CREATE TRIGGER IF NOT EXISTS ledger_version_after_insert AFTER INSERT ON expenses BEGIN
+    UPDATE ledger_version SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS ledger_version_after_delete AFTER DELETE ON expenses BEGIN
+    UPDATE ledger_version SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS ledger_version_after_update AFTER UPDATE OF date, amount, raw_text, category, uid ON expenses BEGIN
+    UPDATE ledger_version SET version = version + 1;
+END;
+"""
+
+# Rollups as they should be, computed from scratch.
+ROLLUP_QUERY = """
+SELECT substr(date, 1, 7) AS month, COALESCE(NULLIF(category, ''), 'Uncategorized') AS category,
+       SUM(amount) AS total, COUNT(*) AS count
+FROM expenses GROUP BY 1, 2
+"""
+
+# How the search fields are cut out of raw_text, for the row prefix `{r}` ("", "NEW." or
+# "OLD."). Mirrors storage.search.document_fields: notes follow the first " [NOTES: " or
+# " [FILE: ", and the merchant is the first non-blank line of the rest.
+NOTES_SQL = (
+    "CASE WHEN instr({r}raw_text, ' [NOTES: ') > 0 THEN substr({r}raw_text, instr({r}raw_text, ' [NOTES: ') + 9)"
+    " WHEN instr({r}raw_text, ' [FILE: ') > 0 THEN substr({r}raw_text, instr({r}raw_text, ' [FILE: ') + 8)"
+    " ELSE '' END"
+)
+BODY_SQL = (
+    "CASE WHEN instr({r}raw_text, ' [NOTES: ') > 0 THEN substr({r}raw_text, 1, instr({r}raw_text, ' [NOTES: ') - 1)"
+    " WHEN instr({r}raw_text, ' [FILE: ') > 0 THEN substr({r}raw_text, 1, instr({r}raw_text, ' [FILE: ') - 1)"
+    " ELSE COALESCE({r}raw_text, '') END"
+)
+MERCHANT_SQL = "substr(ltrim({body}, char(32, 9, 13, 10)), 1, instr(ltrim({body}, char(32, 9, 13, 10)) || char(10), char(10)) - 1)"
+
+def _search_fields(r):
+    body = BODY_SQL.format(r=r)
+    return ", ".join((MERCHANT_SQL.format(body=body), NOTES_SQL.format(r=r), body))
+
+# Full-text index over the receipt text. An external-content FTS5 table reads its
+# columns from the expenses_search view, so the text is not stored twice; the triggers
+# keep it current for every write, including the ones the sync thread makes.
+SEARCH_SCHEMA = f"""
+CREATE VIEW IF NOT EXISTS expenses_search (id, merchant, notes, body) AS
+    SELECT id, {_search_fields("")} FROM expenses;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5(
+    merchant, notes, body, content='expenses_search', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS expenses_fts_after_insert AFTER INSERT ON expenses BEGIN
+    INSERT INTO expenses_fts (rowid, merchant, notes, body) VALUES (NEW.id, {_search_fields("NEW.")});
+END;
+
+CREATE TRIGGER IF NOT EXISTS expenses_fts_after_delete AFTER DELETE ON expenses BEGIN
+    INSERT INTO expenses_fts (expenses_fts, rowid, merchant, notes, body) VALUES ('delete', OLD.id, {_search_fields("OLD.")});
+END;
+
+CREATE TRIGGER IF NOT EXISTS expenses_fts_after_update AFTER UPDATE OF raw_text ON expenses BEGIN
+    INSERT INTO expenses_fts (expenses_fts, rowid, merchant, notes, body) VALUES ('delete', OLD.id, {_search_fields("OLD.")});
+    INSERT INTO expenses_fts (rowid, merchant, notes, body) VALUES (NEW.id, {_search_fields("NEW.")});
+END;
+"""
+
+# Search ranking: BM25 with the column weights of storage.search.
+RANK_SQL = "bm25(expenses_fts, {})".format(", ".join(str(weight) for weight in FIELD_WEIGHTS.values()))
+
+# BM25 costs a microsecond or two per matching row, so a query matching more expenses
+# than this ranks only the newest RANK_WINDOW of them; older matches follow, newest first.
+RANK_WINDOW = 10000
+
+class ConnectionPool:
+    """
+    A fixed set of SQLite connections shared by all Streamlit sessions.
+    Connections are handed out one caller at a time, so they may cross threads.
+    """
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.Queue()
+        for _ in range(size):
+            self._idle.put(self._connect())
+
+    def reopen(self):
+        """Replaces every connection. Only while none is handed out, e.g. right after a migration."""
+        self.close()
+        for _ in range(self.size):
+            self._idle.put(self._connect())
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        # WAL: readers never block the writer and vice versa
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Safe with WAL, and avoids an fsync on every commit
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+
+class SQLiteStore(ExpenseStore):
+    """
+    Local SQLite backend. Aggregates run in SQL against indexed columns and
+    trigger-maintained rollups, so reads cost milliseconds and never leave the machine.
+    Expenses are addressed by their 'uid' column (the shared expense id), not the rowid.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path=DEFAULT_PATH, pool_size=POOL_SIZE):
+        self.path = path
+        self.pool = ConnectionPool(path, pool_size)
+        # SQLite allows one writer at a time; serialize here instead of hitting SQLITE_BUSY
+        self._write_lock = threading.Lock()
+        with self.pool.connection() as conn:
+            conn.executescript(SCHEMA)
+            self._migrate_ids(conn)
+            had_search = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'expenses_fts'").fetchone()
+            try:
+                conn.executescript(SEARCH_SCHEMA)
+                self.full_text = True
+            except sqlite3.OperationalError:
+                # SQLite built without FTS5: search falls back to the in-memory index
+                conn.rollback()
+                self.full_text = False
+            has_rollups = conn.execute("SELECT 1 FROM rollups LIMIT 1").fetchone()
+            has_expenses = conn.execute("SELECT 1 FROM expenses LIMIT 1").fetchone()
+        if has_expenses and not has_rollups:
+            # Database from before rollups existed: backfill once
+            self.rebuild_rollups()
+        if has_expenses and self.full_text and not had_search:
+            # Database from before search existed: index what is already there
+            self.rebuild_search_index()
+        # A connection of its own for version(): PRAGMA data_version only compares within one
+        # connection, and changes whenever any other connection or process commits
+        self._watch = sqlite3.connect(path, check_same_thread=False)
+        self._watch_lock = threading.Lock()
+        self._data_version = None
+        self._version = None
+
+    def _migrate_ids(self, conn):
+        """Adds the uid column to databases created before expense ids, and gives old rows one."""
+        with conn:
+            if "uid" not in {row[1] for row in conn.execute("PRAGMA table_info(expenses)")}:
+                conn.execute("ALTER TABLE expenses ADD COLUMN uid TEXT")
+            missing = conn.execute("SELECT id FROM expenses WHERE uid IS NULL").fetchall()
+            conn.executemany("UPDATE expenses SET uid = ? WHERE id = ?", [(new_expense_id(), row[0]) for row in missing])
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_expenses_uid ON expenses(uid)")
+
+    @contextmanager
+    def _transaction(self):
+        with self._write_lock, self.pool.connection() as conn:
+            with conn:
+                yield conn
+
+    def version(self):
+        # The counter row is only read again after something was committed
+        with self._watch_lock:
+            data_version = self._watch.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != self._data_version or self._version is None:
+                self._version = self._watch.execute("SELECT version FROM ledger_version").fetchone()[0]
+                self._data_version = data_version
+            return self._version
+
+    def add(self, rows):
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO expenses (date, amount, raw_text, category, uid) VALUES (?, ?, ?, ?, ?)",
+                expense_rows(rows),
+            )
+        return completed(len(rows))
+
+    def update(self, changes):
+        changes = list(changes)
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE expenses SET date = ?, amount = ?, raw_text = COALESCE(?, raw_text), category = ? WHERE uid = ?",
+                [(d, amount, raw_text, category, expense_id) for expense_id, (d, amount, raw_text, category) in changes],
+            )
+        return completed(len(changes))
+
+    def delete(self, expense_id):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM expenses WHERE uid = ?", (expense_id,))
+
+    def get_all(self):
+        with self.pool.connection() as conn:
+            df = pd.read_sql_query(
+                'SELECT uid AS id, date AS "Date", amount AS "Amount", '
+                'category AS "Category", raw_text AS "Raw Text" FROM expenses ORDER BY expenses.id',
+                conn,
+            )
+        return df[LEDGER_COLUMNS]
+
+    def get_ledger(self):
+        with self.pool.connection() as conn:
+            df = pd.read_sql_query(
+                'SELECT uid AS id, date AS "Date", amount AS "Amount", category AS "Category" '
+                'FROM expenses ORDER BY expenses.id',
+                conn,
+            )
+        # Receipt text stays in the database until a row's text is asked for
+        return Ledger.from_frame(df, load_texts=self._raw_texts)
+
+    def _raw_texts(self, ids):
+        texts = {}
+        with self.pool.connection() as conn:
+            # Well under SQLite's limit on bound parameters per statement
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                texts.update(conn.execute(
+                    f"SELECT uid, raw_text FROM expenses WHERE uid IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchall())
+        return [texts.get(expense_id) for expense_id in ids]
+
+    def iter_ledger(self, chunk_size=10000, start_date=None, end_date=None, category=None):
+        where, params = self._filters(start_date, end_date, category)
+        clause = "".join(f" AND {condition}" for condition in where)
+        last = 0
+        while True:
+            # Keyset paging on the rowid: each chunk is one indexed range read, and no
+            # connection is held between chunks
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    f"SELECT id, uid, date, amount, category, raw_text FROM expenses WHERE id > ?{clause} ORDER BY id LIMIT ?",
+                    [last] + params + [chunk_size],
+                ).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield pd.DataFrame([row[1:] for row in rows], columns=["id", "Date", "Amount", "Category", "Raw Text"])[LEDGER_COLUMNS]
+            if len(rows) < chunk_size:
+                return
+
+    def _filters(self, start_date=None, end_date=None, category=None, min_amount=None, max_amount=None, prefix=""):
+        """WHERE conditions and parameters for the listing filters, on columns of `prefix`."""
+        where, params = [], []
+        if start_date:
+            where.append(f"{prefix}date >= ?")
+            params.append(str(start_date))
+        if end_date:
+            # Inclusive: anything on end_date sorts before the next day
+            where.append(f"{prefix}date < ?")
+            params.append(str(end_date) + "\uffff")
+        if category:
+            where.append(f"{prefix}category = ?")
+            params.append(category)
+        if min_amount is not None:
+            where.append(f"{prefix}amount >= ?")
+            params.append(float(min_amount))
+        if max_amount is not None:
+            where.append(f"{prefix}amount <= ?")
+            params.append(float(max_amount))
+        return where, params
+
+    def get_page(self, offset=0, limit=50, start_date=None, end_date=None, category=None):
+        where, params = self._filters(start_date, end_date, category)
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+
+        with self.pool.connection() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM expenses {clause}", params).fetchone()[0]
+            df = pd.read_sql_query(
+                'SELECT uid AS id, date AS "Date", amount AS "Amount", category AS "Category" '
+                f"FROM expenses {clause} ORDER BY id DESC LIMIT ? OFFSET ?",
+                conn,
+                params=params + [limit, offset],
+            )
+        return df[PAGE_COLUMNS], total
+
+    def search(self, query, offset=0, limit=50, start_date=None, end_date=None, category=None,
+               min_amount=None, max_amount=None):
+        if not self.full_text:
+            return super().search(query, offset, limit, start_date, end_date, category, min_amount, max_amount)
+        where, params = self._filters(start_date, end_date, category, min_amount, max_amount, prefix="e.")
+        match = fts_query(query)
+        columns = 'e.uid AS id, e.date AS "Date", e.amount AS "Amount", e.category AS "Category", e.raw_text'
+        with self.pool.connection() as conn:
+            if match is None:
+                # Filters only: the listing order, newest first
+                clause = f"WHERE {' AND '.join(where)}" if where else ""
+                total = conn.execute(f"SELECT COUNT(*) FROM expenses e {clause}", params).fetchone()[0]
+                rows = conn.execute(
+                    f"SELECT {columns} FROM expenses e {clause} ORDER BY e.id DESC LIMIT ? OFFSET ?",
+                    params + [limit, offset],
+                ).fetchall()
+            else:
+                rows, total = self._ranked(conn, match, where, params, offset, limit, columns)
+
+        terms = tokenize(query or "")
+        records = [(expense_id, d, amount, category, excerpt(raw_text, terms)) for expense_id, d, amount, category, raw_text in rows]
+        return pd.DataFrame(records, columns=SEARCH_COLUMNS), total
+
+    def _ranked(self, conn, match, where, params, offset, limit, columns):
+        """One page of full-text matches, best first. Returns (rows, total matches)."""
+        # Without filters the FTS table answers alone; either way only rowids are ranked
+        # and sorted, and the page's rows are read afterwards. Constraints and ordering go
+        # on the FTS rowid, which FTS5 serves from the index itself.
+        source = "expenses_fts JOIN expenses e ON e.id = expenses_fts.rowid" if where else "expenses_fts"
+        clause = " AND ".join(["expenses_fts MATCH ?"] + where)
+        params = [match] + params
+        total = conn.execute(f"SELECT COUNT(*) FROM {source} WHERE {clause}", params).fetchone()[0]
+
+        cutoff = None
+        if total > RANK_WINDOW:
+            # Rank the newest RANK_WINDOW matches only (rows from `cutoff` up)
+            cutoff = conn.execute(
+                f"SELECT expenses_fts.rowid FROM {source} WHERE {clause} ORDER BY expenses_fts.rowid DESC LIMIT 1 OFFSET ?",
+                params + [RANK_WINDOW - 1],
+            ).fetchone()[0]
+        ranked = min(total, RANK_WINDOW)
+
+        page = []
+        if offset < ranked:
+            window = "" if cutoff is None else " AND expenses_fts.rowid >= ?"
+            page = conn.execute(
+                f"SELECT expenses_fts.rowid FROM {source} WHERE {clause}{window} "
+                f"ORDER BY {RANK_SQL}, expenses_fts.rowid DESC LIMIT ? OFFSET ?",
+                params + ([] if cutoff is None else [cutoff]) + [min(limit, ranked - offset), offset],
+            ).fetchall()
+        if cutoff is not None and offset + limit > ranked:
+            page += conn.execute(
+                f"SELECT expenses_fts.rowid FROM {source} WHERE {clause} AND expenses_fts.rowid < ? "
+                "ORDER BY expenses_fts.rowid DESC LIMIT ? OFFSET ?",
+                params + [cutoff, limit - len(page), max(0, offset - ranked)],
+            ).fetchall()
+
+        rowids = [row[0] for row in page]
+        found = {}
+        if rowids:
+            for row in conn.execute(
+                    f"SELECT e.id, {columns} FROM expenses e WHERE e.id IN ({', '.join('?' * len(rowids))})", rowids):
+                found[row[0]] = row[1:]
+        return [found[rowid] for rowid in rowids if rowid in found], total
+
+    def rebuild_search_index(self):
+        """Re-indexes every expense's text for search. Returns the number of expenses indexed."""
+        with self._transaction() as conn:
+            conn.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+            return conn.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+
+    def get_raw_text(self, expense_id):
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT raw_text FROM expenses WHERE uid = ?", (expense_id,)).fetchone()
+        return row[0] if row else None
+
+    def monthly_total(self, year, month):
+        # One rollup row per category: no scan of expenses
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT COALESCE(SUM(total), 0) FROM rollups WHERE month = ?",
+                (f"{year:04d}-{month:02d}",),
+            ).fetchone()
+        return float(row[0])
+
+    def rollups(self):
+        """Month x category totals and counts as a DataFrame."""
+        with self.pool.connection() as conn:
+            return pd.read_sql_query("SELECT month, category, total, count FROM rollups ORDER BY month, category", conn)
+
+    def rebuild_rollups(self):
+        """Recomputes the rollups table from the expenses. Returns the number of rollup rows."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM rollups")
+            conn.execute(f"INSERT INTO rollups (month, category, total, count) {ROLLUP_QUERY}")
+            return conn.execute("SELECT COUNT(*) FROM rollups").fetchone()[0]
+
+    def verify_rollups(self):
+        """
+        Compares stored rollups with a fresh computation.
+        Returns a DataFrame of drifted (month, category) rows; empty means consistent.
+        """
+        with self.pool.connection() as conn:
+            actual = pd.read_sql_query(ROLLUP_QUERY, conn)
+        merged = self.rollups().merge(actual, on=["month", "category"], how="outer", suffixes=("_stored", "_actual"))
+        merged = merged.fillna({"total_stored": 0.0, "total_actual": 0.0, "count_stored": 0, "count_actual": 0})
+        drift = ((merged["total_stored"] - merged["total_actual"]).abs() > 0.005) | (merged["count_stored"] != merged["count_actual"])
+        return merged[drift].reset_index(drop=True)
+
+    def close(self):
+        self.pool.close()
+        with self._watch_lock:
+            self._watch.close()
@@ -0,0 +1,512 @@
+import json
+import threading
+import time
+
+from receipt_parser import parse_amount_text
+from storage.base import completed, expense_rows, new_expense_id
+from storage.sqlite import SQLiteStore, DEFAULT_PATH
+from storage.sheets import SheetsStore, SHEET_NAME, _with_backoff, _first_row, _read_row_ids, _updated_range
+
+# Seconds between background sync cycles (a local write also triggers one).
+SYNC_INTERVAL = 30
+# Seconds to wait after a local write before pushing, so bursts go out together.
+PUSH_DELAY = 1.0
+# A full compare against the sheet (to pick up edits made in the sheet) runs this often.
+# Rows added, removed or moved in the sheet show up in its ID column on every cycle.
+FULL_RESYNC_INTERVAL = 15 * 60
+
+# How to resolve a row changed both locally (not yet pushed) and in the sheet since the
+# last sync: "local" keeps the local edit and pushes it, "remote" takes the sheet's
+# version. Either way the losing version is recorded in the sync_conflicts table.
+CONFLICT_POLICIES = ("local", "remote")
+
+# Bookkeeping columns added to the local expenses table.
+SYNC_COLUMNS = {
+    "remote_row": "INTEGER",                # sheet row the expense lives in (NULL until pushed)
+    "dirty": "INTEGER NOT NULL DEFAULT 0",  # 1 while a local change has not reached the sheet
+    "updated_at": "REAL",                   # local modification time; guards against racing a push
+    "synced": "TEXT",                       # JSON of the values the sheet held at the last sync (the conflict baseline)
+}
+
+SYNC_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value REAL
+);
+CREATE TABLE IF NOT EXISTS pending_deletes (
+    remote_row INTEGER NOT NULL,
+    uid TEXT
+);
+CREATE TABLE IF NOT EXISTS sync_conflicts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    expense_id TEXT,
+    remote_row INTEGER,
+    local_values TEXT,
+    remote_values TEXT,
+    resolution TEXT,
+    detected_at REAL
+);
+CREATE TABLE IF NOT EXISTS sync_rejected (
+    remote_row INTEGER NOT NULL,
+    uid TEXT,
+    remote_values TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_expenses_remote_row ON expenses(remote_row);
+CREATE INDEX IF NOT EXISTS idx_expenses_dirty ON expenses(dirty) WHERE dirty = 1;
+"""
+
+def _same(local, remote):
+    """
+    Compares a local (date, amount, raw_text, category) tuple with a row read from the
+    sheet, or with another local tuple (a baseline).
+    """
+    remote = list(remote) + [""] * (4 - len(remote))
+    amount = parse_amount_text(remote[1])
+    try:
+        same_amount = amount is not None and abs(float(local[1]) - amount) < 0.005
+    except (TypeError, ValueError):
+        same_amount = False
+    return (
+        same_amount
+        and str(local[0]) == str(remote[0])
+        and (local[2] or "") == (remote[2] or "")
+        and (local[3] or "") == (remote[3] or "")
+    )
+
+def _from_sheet(values):
+    """
+    (date, amount, raw_text, category) for a row read with get_values (formatted strings,
+    maybe short). Raises ValueError if the amount cell does not hold an amount.
+    """
+    values = list(values) + [""] * (4 - len(values))
+    amount = parse_amount_text(values[1])
+    if amount is None:
+        raise ValueError(f"not an amount: {values[1]!r}")
+    return values[0], amount, values[2], values[3] or "Uncategorized"
+
+def _baseline(values):
+    """The JSON stored in the synced column for a (date, amount, raw_text, category) tuple."""
+    return json.dumps(list(values))
+
+def _sheet_id(values):
+    """The expense id in column E of a row read with get_values ("" when it has none)."""
+    return values[4] if len(values) > 4 else ""
+
+class SyncedStore(SQLiteStore):
+    """
+    Local-first store: reads and writes hit the local SQLite mirror, and a background
+    thread keeps it in sync with the Google Sheet.
+
+    Each cycle reads the sheet's ID column and compares it with the rows the mirror knows:
+    if only new rows were appended, just those are fetched; any other difference (rows
+    removed, inserted or moved) triggers a full compare, which matches rows by expense id.
+    Local changes are then pushed in batches (deletes, one batch_update, one append_rows),
+    after checking that every row about to be deleted or overwritten still holds the
+    expected id. A periodic full compare also catches remote edits. Every row remembers
+    the values the sheet held at its last sync, so a row only conflicts when it was edited
+    locally and its sheet copy changed since then; conflicts are resolved by
+    `conflict_policy` and logged to sync_conflicts. Sheet rows whose amount is not a number
+    are left out of the mirror (and never overwritten by it) and listed in sync_rejected.
+    """
+
+    name = "synced"
+
+    def __init__(self, creds_dict, path=DEFAULT_PATH, sheet_name=SHEET_NAME,
+                 interval=SYNC_INTERVAL, conflict_policy="local", start=True):
+        if conflict_policy not in CONFLICT_POLICIES:
+            raise ValueError(f"conflict_policy must be one of {CONFLICT_POLICIES}")
+        super().__init__(path)
+        self.remote = SheetsStore(creds_dict, sheet_name)
+        self.interval = interval
+        self.conflict_policy = conflict_policy
+        self.last_sync = None
+        self.last_error = None
+        self._sync_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._migrate()
+        if start:
+            self.start()
+
+    def _migrate(self):
+        with self.pool.connection() as conn:
+            schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        with self._transaction() as conn:
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(expenses)")}
+            for column, declaration in SYNC_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE expenses ADD COLUMN {column} {declaration}")
+            if "dirty" not in existing:
+                # Rows written before syncing was enabled only exist locally; push them
+                conn.execute("UPDATE expenses SET dirty = 1, updated_at = ?", (time.time(),))
+            if "synced" not in existing:
+                # Rows with nothing to push still match the sheet as of the last sync.
+                # Edited ones have no baseline: a difference from the sheet counts as a conflict
+                conn.execute(
+                    "UPDATE expenses SET synced = json_array(date, amount, raw_text, category) "
+                    "WHERE dirty = 0 AND remote_row IS NOT NULL"
+                )
+        with self._write_lock, self.pool.connection() as conn:
+            conn.executescript(SYNC_SCHEMA)
+            if "uid" not in {row[1] for row in conn.execute("PRAGMA table_info(pending_deletes)")}:
+                with conn:
+                    conn.execute("ALTER TABLE pending_deletes ADD COLUMN uid TEXT")
+            changed = conn.execute("PRAGMA schema_version").fetchone()[0] != schema_version
+        if changed:
+            # The other pooled connections still hold the old schema, and the FTS5 index's
+            # lookups through its content view fail with "no such table" on their next update
+            self.pool.reopen()
+
+    # --- Local writes: durable immediately, pushed in the background ---
+
+    def add(self, rows):
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO expenses (date, amount, raw_text, category, uid, dirty, updated_at) VALUES (?, ?, ?, ?, ?, 1, ?)",
+                [row + [now] for row in expense_rows(rows)],
+            )
+        self._wake.set()
+        return completed(len(rows))
+
+    def update(self, changes):
+        changes = list(changes)
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE expenses SET date = ?, amount = ?, raw_text = COALESCE(?, raw_text), category = ?, "
+                "dirty = 1, updated_at = ? WHERE uid = ?",
+                [(d, amount, raw_text, category, now, expense_id) for expense_id, (d, amount, raw_text, category) in changes],
+            )
+        self._wake.set()
+        return completed(len(changes))
+
+    def delete(self, expense_id):
+        with self._transaction() as conn:
+            row = conn.execute("SELECT remote_row FROM expenses WHERE uid = ?", (expense_id,)).fetchone()
+            if row and row[0] is not None:
+                conn.execute("INSERT INTO pending_deletes (remote_row, uid) VALUES (?, ?)", (row[0], expense_id))
+            conn.execute("DELETE FROM expenses WHERE uid = ?", (expense_id,))
+        self._wake.set()
+
+    # --- Background sync ---
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="snapbudget-sync", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        super().close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sync_now()
+            except Exception as e:
+                # Keep the local store usable; the next cycle retries
+                self.last_error = str(e)
+            self._wake.wait(self.interval)
+            if self._wake.is_set() and not self._stop.is_set():
+                # Let a burst of local writes pile up into one push
+                time.sleep(PUSH_DELAY)
+            self._wake.clear()
+
+    def sync_now(self):
+        """Runs one pull + push cycle against the sheet."""
+        with self._sync_lock:
+            sheet = self.remote.worksheet()
+            paired = self._pull(sheet)
+            self._push(sheet, paired)
+            self.last_sync = time.time()
+            self.last_error = None
+
+    def _state(self, conn, key, default=0):
+        row = conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_state(self, conn, key, value):
+        conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value))
+
+    def _layout(self, conn, count):
+        """The id the mirror expects in each of the first `count` sheet rows (None where it knows of none)."""
+        ids = [None] * count
+        rows = conn.execute(
+            "SELECT remote_row, uid FROM expenses WHERE remote_row IS NOT NULL "
+            "UNION ALL SELECT remote_row, uid FROM pending_deletes "
+            "UNION ALL SELECT remote_row, uid FROM sync_rejected"
+        )
+        for remote_row, expense_id in rows:
+            if 2 <= remote_row < count + 2:
+                ids[remote_row - 2] = expense_id
+        return ids
+
+    def _pull(self, sheet):
+        """
+        Brings in remote changes. Returns True if it paired sheet rows without an id with
+        local ones by position (a full compare does; so does fetching new rows that have none).
+        """
+        # Columns A and E only: the row count and every row's id, without the receipt text
+        remote_ids = _with_backoff(lambda: _read_row_ids(sheet))
+        remote_rows = len(remote_ids)
+        with self.pool.connection() as conn:
+            known = int(self._state(conn, "remote_rows"))
+            last_full = self._state(conn, "last_full_sync")
+            layout = self._layout(conn, known) if remote_rows >= known else None
+
+        if layout is None or remote_ids[:known] != layout or time.time() - last_full > FULL_RESYNC_INTERVAL:
+            # Rows vanished, were inserted or moved remotely, or a periodic check is due: compare everything
+            self._reconcile(sheet)
+            return True
+
+        if remote_rows > known:
+            # Someone else appended; fetch just those rows
+            first = known + 2
+            values = _with_backoff(lambda: sheet.get_values(f"A{first}:E{remote_rows + 1}"))
+            new_rows, rejected = self._new_local_rows((first + i, row) for i, row in enumerate(values))
+            with self._transaction() as conn:
+                # A row we already have (same id) only needs its position and baseline recorded
+                conn.executemany(
+                    "INSERT INTO expenses (date, amount, raw_text, category, uid, remote_row, dirty, synced) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (uid) DO UPDATE SET remote_row = excluded.remote_row, synced = excluded.synced",
+                    new_rows,
+                )
+                self._reject(conn, rejected)
+                self._set_state(conn, "remote_rows", remote_rows)
+            return any(not _sheet_id(row) for row in values)
+        return False
+
+    def _new_local_rows(self, rows):
+        """
+        Insert parameters for (remote_row, values) rows only the sheet has, and the
+        (remote_row, values) rows rejected because their amount is not a number. Rows
+        without an id get one and are marked dirty, so the next push writes the id into
+        the sheet.
+        """
+        new_rows, rejected = [], []
+        for remote_row, values in rows:
+            try:
+                local = _from_sheet(values)
+            except ValueError:
+                rejected.append((remote_row, values))
+                continue
+            expense_id = _sheet_id(values)
+            new_rows.append(local + (expense_id or new_expense_id(), remote_row, 0 if expense_id else 1, _baseline(local)))
+        return new_rows, rejected
+
+    def _reject(self, conn, rows):
+        """Lists sheet rows that cannot be mirrored, so they are neither imported nor overwritten."""
+        conn.executemany(
+            "INSERT INTO sync_rejected (remote_row, uid, remote_values) VALUES (?, ?, ?)",
+            [(remote_row, _sheet_id(values), json.dumps(list(values))) for remote_row, values in rows],
+        )
+
+    def _reconcile(self, sheet):
+        values = _with_backoff(lambda: sheet.get_values("A2:E"))
+        # Sheet rows by expense id, plus rows nobody has given an id yet (by position)
+        remote, unlabeled = {}, {}
+        for i, row in enumerate(values):
+            if _sheet_id(row):
+                remote[_sheet_id(row)] = (i + 2, row)
+            else:
+                unlabeled[i + 2] = row
+        now = time.time()
+
+        with self._transaction() as conn:
+            # Pending deletes follow their row if it moved, and are dropped if it is already gone
+            pending_deletes = set()
+            for rowid, remote_row, expense_id in conn.execute("SELECT rowid, remote_row, uid FROM pending_deletes").fetchall():
+                if not expense_id:
+                    pending_deletes.add(remote_row)
+                elif expense_id not in remote:
+                    conn.execute("DELETE FROM pending_deletes WHERE rowid = ?", (rowid,))
+                else:
+                    found_row = remote.pop(expense_id)[0]
+                    pending_deletes.add(found_row)
+                    conn.execute("UPDATE pending_deletes SET remote_row = ? WHERE rowid = ?", (found_row, rowid))
+            local_rows = conn.execute(
+                "SELECT id, uid, remote_row, date, amount, raw_text, category, dirty, synced FROM expenses "
+                "WHERE remote_row IS NOT NULL"
+            ).fetchall()
+            conn.execute("DELETE FROM sync_rejected")
+            rejected = []
+
+            for rowid, expense_id, remote_row, d, amount, raw_text, category, dirty, synced in local_rows:
+                local = (d, amount, raw_text, category)
+                found = remote.pop(expense_id, None)
+                needs_id = False
+                if found is None and remote_row in unlabeled:
+                    # Sheet row from before expense ids: match it by position and give it ours
+                    found = (remote_row, unlabeled.pop(remote_row))
+                    needs_id = True
+
+                if found is None:
+                    # Deleted in the sheet
+                    if dirty:
+                        self._record_conflict(conn, expense_id, remote_row, local, None, now)
+                    if dirty and self.conflict_policy == "local":
+                        # Keep the local edit: push it again as a new row
+                        conn.execute("UPDATE expenses SET remote_row = NULL WHERE id = ?", (rowid,))
+                    else:
+                        conn.execute("DELETE FROM expenses WHERE id = ?", (rowid,))
+                    continue
+
+                found_row, theirs = found
+                if found_row != remote_row:
+                    # Rows above it were added or removed in the sheet
+                    conn.execute("UPDATE expenses SET remote_row = ? WHERE id = ?", (found_row, rowid))
+                try:
+                    remote_values = _from_sheet(theirs)
+                except ValueError:
+                    # Keep the last good values; a local edit still goes out over it
+                    rejected.append((found_row, theirs))
+                    continue
+                baseline = json.loads(synced) if synced else None
+                if _same(local, theirs):
+                    if baseline is None or not _same(baseline, theirs):
+                        conn.execute("UPDATE expenses SET synced = ? WHERE id = ?", (_baseline(remote_values), rowid))
+                elif not dirty or (baseline is not None and _same(baseline, local)):
+                    # Only the sheet changed: take its version (a row still owed its id stays dirty)
+                    conn.execute(
+                        "UPDATE expenses SET date = ?, amount = ?, raw_text = ?, category = ?, synced = ? WHERE id = ?",
+                        remote_values + (_baseline(remote_values), rowid),
+                    )
+                elif baseline is None or not _same(baseline, theirs):
+                    # Changed on both sides since the last sync
+                    self._record_conflict(conn, expense_id, found_row, local, theirs, now)
+                    if self.conflict_policy == "local":
+                        conn.execute("UPDATE expenses SET synced = ? WHERE id = ?", (_baseline(remote_values), rowid))
+                    else:
+                        conn.execute(
+                            "UPDATE expenses SET date = ?, amount = ?, raw_text = ?, category = ?, dirty = 0, synced = ? "
+                            "WHERE id = ?",
+                            remote_values + (_baseline(remote_values), rowid),
+                        )
+                # Otherwise only the local copy changed: it goes out with the next push
+                if needs_id:
+                    conn.execute("UPDATE expenses SET dirty = 1 WHERE id = ?", (rowid,))
+
+            # Rows only the sheet has (unless we are about to delete them)
+            new_rows = list(remote.values()) + [
+                (remote_row, row) for remote_row, row in unlabeled.items() if remote_row not in pending_deletes
+            ]
+            new_rows, new_rejected = self._new_local_rows(sorted(new_rows, key=lambda found: found[0]))
+            conn.executemany(
+                "INSERT INTO expenses (date, amount, raw_text, category, uid, remote_row, dirty, synced) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                new_rows,
+            )
+            self._reject(conn, rejected + new_rejected)
+            conn.execute("DELETE FROM pending_deletes WHERE remote_row > ?", (len(values) + 1,))
+            self._set_state(conn, "remote_rows", len(values))
+            self._set_state(conn, "last_full_sync", now)
+
+    def _record_conflict(self, conn, expense_id, remote_row, local, remote, now):
+        conn.execute(
+            "INSERT INTO sync_conflicts (expense_id, remote_row, local_values, remote_values, resolution, detected_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (expense_id, remote_row, json.dumps(list(local)),
+             json.dumps(list(remote)) if remote is not None else None, self.conflict_policy, now),
+        )
+
+    def _push(self, sheet, paired=False):
+        """
+        Sends local changes. Deletes and edits address sheet rows by position, so each
+        row's ID cell is checked first (one read of the ID column); a row that no longer
+        holds the expected expense is left alone and a full compare relocates it, to be
+        pushed next cycle. Rows still without an id only match right after the pull
+        paired them by position (`paired`).
+        """
+        remote_ids = None
+        moved = False
+
+        def holds(remote_row, expense_id):
+            nonlocal remote_ids
+            if remote_ids is None:
+                remote_ids = _with_backoff(lambda: _read_row_ids(sheet))
+            cell = remote_ids[remote_row - 2] if 2 <= remote_row < len(remote_ids) + 2 else None
+            return cell == expense_id or (cell == "" and paired)
+
+        # 1. Deletes, bottom-up so each one leaves the rows above it in place
+        with self.pool.connection() as conn:
+            deletes = conn.execute("SELECT rowid, remote_row, uid FROM pending_deletes ORDER BY remote_row DESC").fetchall()
+        for rowid, remote_row, expense_id in deletes:
+            if not holds(remote_row, expense_id):
+                moved = True
+                continue
+            _with_backoff(lambda: sheet.delete_rows(remote_row))
+            del remote_ids[remote_row - 2]
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM pending_deletes WHERE rowid = ?", (rowid,))
+                # Everything below the deleted row moved up by one
+                conn.execute("UPDATE expenses SET remote_row = remote_row - 1 WHERE remote_row > ?", (remote_row,))
+                conn.execute("UPDATE pending_deletes SET remote_row = remote_row - 1 WHERE remote_row > ?", (remote_row,))
+                conn.execute("UPDATE sync_rejected SET remote_row = remote_row - 1 WHERE remote_row > ?", (remote_row,))
+                self._set_state(conn, "remote_rows", max(int(self._state(conn, "remote_rows")) - 1, 0))
+
+        with self.pool.connection() as conn:
+            edits = conn.execute(
+                "SELECT id, remote_row, date, amount, raw_text, category, uid, updated_at FROM expenses "
+                "WHERE dirty = 1 AND remote_row IS NOT NULL"
+            ).fetchall()
+            appends = conn.execute(
+                "SELECT id, date, amount, raw_text, category, uid, updated_at FROM expenses "
+                "WHERE dirty = 1 AND remote_row IS NULL ORDER BY id"
+            ).fetchall()
+
+        # 2. All edits in one batch_update (the id goes along, for rows that had none)
+        checked = [edit for edit in edits if holds(edit[1], edit[6])]
+        moved = moved or len(checked) < len(edits)
+        edits = checked
+        if edits:
+            data = [
+                {"range": f"A{remote_row}:E{remote_row}", "values": [[d, amount, raw_text, category, expense_id]]}
+                for _id, remote_row, d, amount, raw_text, category, expense_id, _at in edits
+            ]
+            _with_backoff(lambda: sheet.batch_update(data))
+            with self._transaction() as conn:
+                # The sheet now holds what was sent; rows edited again while we were
+                # pushing stay dirty for the next cycle
+                conn.executemany(
+                    "UPDATE expenses SET synced = ?, dirty = CASE WHEN updated_at IS ? THEN 0 ELSE 1 END WHERE id = ?",
+                    [(_baseline(edit[2:6]), edit[7], edit[0]) for edit in edits],
+                )
+
+        # 3. All new rows in one append_rows
+        if appends:
+            response = _with_backoff(lambda: sheet.append_rows([list(row[1:6]) for row in appends]))
+            with self._transaction() as conn:
+                known = int(self._state(conn, "remote_rows"))
+                first = _first_row(_updated_range(response)) or known + 2
+                for i, row in enumerate(appends):
+                    conn.execute(
+                        "UPDATE expenses SET remote_row = ?, synced = ?, "
+                        "dirty = CASE WHEN updated_at IS ? THEN 0 ELSE 1 END WHERE id = ?",
+                        (first + i, _baseline(row[1:5]), row[6], row[0]),
+                    )
+                self._set_state(conn, "remote_rows", max(known, first + len(appends) - 2))
+
+        if moved:
+            # Someone else moved rows since the last compare: find them again by id
+            self._reconcile(sheet)
+
+    def sync_status(self):
+        """Counts of unsynced changes, conflicts and rejected sheet rows, plus when the last cycle finished."""
+        with self.pool.connection() as conn:
+            pending = conn.execute("SELECT COUNT(*) FROM expenses WHERE dirty = 1").fetchone()[0]
+            pending += conn.execute("SELECT COUNT(*) FROM pending_deletes").fetchone()[0]
+            conflicts = conn.execute("SELECT COUNT(*) FROM sync_conflicts").fetchone()[0]
+            rejected = conn.execute("SELECT COUNT(*) FROM sync_rejected").fetchone()[0]
+        return {
+            "last_sync": self.last_sync,
+            "last_error": self.last_error,
+            "pending": pending,
+            "conflicts": conflicts,
+            "rejected": rejected,
+        }
@@ -0,0 +1,11 @@
+import pytest
+
+from storage import sheets
+from tests import fake_sheets
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    """Sheets retries run without waiting, and no test leaves the fake sheet installed."""
+    monkeypatch.setattr(sheets, "_backoff_delay", lambda attempt: 0.0)
+    yield
+    fake_sheets.uninstall()
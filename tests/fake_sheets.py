@@ -0,0 +1,199 @@
+"""
+An in-memory stand-in for the gspread worksheet, for the tests and benchmarks of the Sheets backend.
+
+FakeWorksheet implements the gspread calls storage/sheets.py and storage/sync.py make,
+counts every call, and can sleep before each one to stand in for the network round
+trip (a fixed `latency` in seconds, or a {method: seconds} dict). Values are kept as
+written; reads return them the way the API does: get_all_records numericised, A1
+range reads as formatted strings.
+
+    worksheet, store = fake_sheets.fake_store(rows, latency=0.08)
+    store.add([["2026-03-01", 12.5, "CAFE", "Food"]]); store.flush()
+    print(worksheet.calls)   # Counter({'append_rows': 1, 'row_values': 1})
+"""
+import re
+import threading
+import time
+from collections import Counter
+
+from storage import sheets
+from storage.base import HEADERS
+
+A1_RE = re.compile(r"^(?:[^!]*!)?([A-Z])(\d+)?(?::([A-Z])(\d+)?)?$")
+
+def _numericise(value):
+    if isinstance(value, str):
+        for convert in (int, float):
+            try:
+                return convert(value)
+            except ValueError:
+                pass
+    return value
+
+def _formatted(value):
+    return "" if value is None else str(value)
+
+class FakeCell:
+    def __init__(self, value):
+        self.value = value
+
+class FakeWorksheet:
+    """A worksheet held as a list of rows (row 1 is the header)."""
+
+    def __init__(self, rows=None, latency=0.0):
+        self.rows = [list(row) for row in rows or []]
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def reset_calls(self):
+        self.calls.clear()
+
+    @property
+    def api_calls(self):
+        return sum(self.calls.values())
+
+    def _call(self, method):
+        self.calls[method] += 1
+        delay = self.latency.get(method, 0.0) if isinstance(self.latency, dict) else self.latency
+        if delay:
+            time.sleep(delay)
+
+    def _range(self, a1):
+        """(first column, first row, last column, last row), 0-based columns and 1-based rows."""
+        first_col, first_row, last_col, last_row = A1_RE.match(a1).groups()
+        first_row = int(first_row or 1)
+        if last_col is None:
+            return ord(first_col) - 65, first_row, ord(first_col) - 65, first_row
+        last_row = int(last_row) if last_row else len(self.rows)
+        return ord(first_col) - 65, first_row, ord(last_col) - 65, last_row
+
+    def _read(self, a1):
+        c1, r1, c2, r2 = self._range(a1)
+        values = [[_formatted(v) for v in row[c1:c2 + 1]] for row in self.rows[r1 - 1:r2]]
+        # Like the API, trailing empty cells and rows are left out
+        values = [row[:max((i + 1 for i, v in enumerate(row) if v != ""), default=0)] for row in values]
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def _write(self, a1, values):
+        c1, r1, _, _ = self._range(a1)
+        for i, row_values in enumerate(values):
+            while len(self.rows) < r1 + i:
+                self.rows.append([])
+            row = self.rows[r1 + i - 1]
+            row.extend([""] * (c1 + len(row_values) - len(row)))
+            row[c1:c1 + len(row_values)] = list(row_values)
+
+    # --- gspread API ---
+
+    def row_values(self, row):
+        with self._lock:
+            self._call("row_values")
+            return [_formatted(v) for v in self.rows[row - 1]] if row <= len(self.rows) else []
+
+    def col_values(self, col):
+        with self._lock:
+            self._call("col_values")
+            values = [_formatted(row[col - 1]) if len(row) >= col else "" for row in self.rows]
+            while values and values[-1] == "":
+                values.pop()
+            return values
+
+    def get_all_records(self, numericise_ignore=None, **kwargs):
+        with self._lock:
+            self._call("get_all_records")
+            if not self.rows:
+                return []
+            ignore = set(numericise_ignore or [])
+            headers = self.rows[0]
+            records = []
+            for row in self.rows[1:]:
+                row = list(row) + [""] * (len(headers) - len(row))
+                records.append({
+                    header: value if i + 1 in ignore else _numericise(value)
+                    for i, (header, value) in enumerate(zip(headers, row))
+                })
+            return records
+
+    def get_values(self, range_name=None, **kwargs):
+        with self._lock:
+            self._call("get_values")
+            return self._read(range_name or f"A1:Z{len(self.rows)}")
+
+    def batch_get(self, ranges, **kwargs):
+        with self._lock:
+            self._call("batch_get")
+            return [self._read(a1) for a1 in ranges]
+
+    def acell(self, label, **kwargs):
+        with self._lock:
+            self._call("acell")
+            values = self._read(label)
+            return FakeCell(values[0][0] if values and values[0] else None)
+
+    def insert_row(self, values, index=1, **kwargs):
+        with self._lock:
+            self._call("insert_row")
+            self.rows.insert(index - 1, list(values))
+
+    def append_rows(self, values, **kwargs):
+        with self._lock:
+            self._call("append_rows")
+            first = len(self.rows) + 1
+            self.rows.extend(list(row) for row in values)
+            return {"updates": {"updatedRange": f"Sheet1!A{first}:E{first + len(values) - 1}"}}
+
+    def update(self, range_name=None, values=None, **kwargs):
+        with self._lock:
+            self._call("update")
+            self._write(range_name, values)
+
+    def update_acell(self, label, value):
+        with self._lock:
+            self._call("update_acell")
+            self._write(label, [[value]])
+
+    def batch_update(self, data, **kwargs):
+        with self._lock:
+            self._call("batch_update")
+            for entry in data:
+                self._write(entry["range"], entry["values"])
+
+    def delete_rows(self, start, end=None):
+        with self._lock:
+            self._call("delete_rows")
+            del self.rows[start - 1:(end or start)]
+
+class FakeSpreadsheet:
+    def __init__(self, worksheet):
+        self.sheet1 = worksheet
+
+class FakeClient:
+    """What the connection layer gets instead of an authorized gspread client."""
+
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+
+    def open(self, name):
+        return FakeSpreadsheet(self.worksheet)
+
+def install(worksheet):
+    """Points the Sheets backend at `worksheet` (drops pooled connections)."""
+    sheets.set_client_factory(lambda creds: FakeClient(worksheet))
+
+def uninstall():
+    sheets.set_client_factory(None)
+
+def fake_store(rows=(), latency=0.0):
+    """
+    (worksheet, SheetsStore) over a fresh fake sheet holding the given
+    [date, amount, raw_text, category] rows, each with an id.
+    """
+    worksheet = FakeWorksheet([HEADERS] + [list(row) + [f"bench{i:07d}"] for i, row in enumerate(rows)], latency)
+    install(worksheet)
+    store = sheets.SheetsStore({"type": "benchmark"})
+    store.connect()
+    worksheet.reset_calls()
+    return worksheet, store
@@ -0,0 +1,108 @@
+"""Hand-written receipt texts with the values printed on them, for the parser test and benchmark.
+
+Each entry is (name, text, expected); a field expected as None must not be found. Dates are
+ISO strings. Texts are written the way OCR returns them: upper case, stray spacing, labels
+and amounts split across lines.
+"""
+
+CORPUS = [
+    ("grocery", """\
+SAFEWAY
+1200 Main Street
+Tel 555-123-4567
+03/14/2026 18:22
+MILK 2%          4.49
+BREAD            3.29
+EGGS DOZEN       5.99
+SUBTOTAL        13.77
+TAX              0.00
+TOTAL           13.77
+VISA ****1234   13.77
+""", {"total": 13.77, "subtotal": 13.77, "tax": 0.0, "date": "2026-03-14", "merchant": "SAFEWAY", "currency": None}),
+
+    ("count line above the total", """\
+TOTAL ITEMS 5
+BALANCE DUE $12.00
+""", {"total": 12.0, "subtotal": None, "tax": None, "date": None, "merchant": None, "currency": "USD"}),
+
+    ("item count under the merchant", """\
+CORNER MARKET
+ITEMS SOLD 3
+QTY 3
+2026-02-01
+TOTAL $9.50
+""", {"total": 9.5, "subtotal": None, "tax": None, "date": "2026-02-01", "merchant": "CORNER MARKET", "currency": "USD"}),
+
+    ("total on the line below its label", """\
+BLUE BOTTLE COFFEE
+05/02/2026
+LATTE            4.50
+CROISSANT        3.75
+TAX              0.66
+TOTAL
+8.91
+""", {"total": 8.91, "subtotal": None, "tax": 0.66, "date": "2026-05-02", "merchant": "BLUE BOTTLE COFFEE", "currency": None}),
+
+    ("every label on its own line", """\
+HARDWARE DEPOT
+SUBTOTAL:
+40.00
+SALES TAX:
+3.20
+TOTAL $
+
+43.20 USD
+CASH 50.00
+CHANGE 6.80
+""", {"total": 43.2, "subtotal": 40.0, "tax": 3.2, "date": None, "merchant": "HARDWARE DEPOT", "currency": "USD"}),
+
+    ("label alone with no amount below", """\
+NOODLE BAR
+TOTAL
+THANK YOU 3 VISITS
+""", {"total": None, "subtotal": None, "tax": None, "date": None, "merchant": "NOODLE BAR", "currency": None}),
+
+    ("grand total after a running total", """\
+PIZZERIA ROMA
+12 Mar 2026
+TOTAL 30.00
+TIP 5.00
+GRAND TOTAL 35.00
+""", {"total": 35.0, "subtotal": None, "tax": None, "date": "2026-03-12", "merchant": "PIZZERIA ROMA", "currency": None}),
+
+    ("thousands separators", """\
+ELECTRONICS WORLD
+LAPTOP       1,199.00
+WARRANTY       149.00
+SUBTOTAL     1,348.00
+TAX 8%         107.84
+TOTAL        1,455.84
+""", {"total": 1455.84, "subtotal": 1348.0, "tax": 107.84, "date": None, "merchant": "ELECTRONICS WORLD", "currency": None}),
+
+    ("decimal commas in euros", """\
+BÄCKEREI MÜLLER
+14.03.2026
+BROT          3,20
+KAFFEE        2,80
+SUMME EUR     6,00
+""", {"total": None, "subtotal": None, "tax": None, "date": "2026-03-14", "merchant": "BÄCKEREI MÜLLER", "currency": "EUR"}),
+
+    ("discount and savings lines are not the total", """\
+FRESH MART
+TOTAL SAVINGS 2.00
+TOTAL DISCOUNT 1.00
+TOTAL 18.40
+""", {"total": 18.4, "subtotal": None, "tax": None, "date": None, "merchant": "FRESH MART", "currency": None}),
+
+    ("pound sign", """\
+THE CROWN PUB
+2 PINTS       £9.80
+TOTAL         £9.80
+""", {"total": 9.8, "subtotal": None, "tax": None, "date": None, "merchant": "THE CROWN PUB", "currency": "GBP"}),
+
+    ("no total at all", """\
+PARKING LOT 7
+ENTRY 08:02
+EXIT 10:15
+""", {"total": None, "subtotal": None, "tax": None, "date": None, "merchant": "PARKING LOT 7", "currency": None}),
+]
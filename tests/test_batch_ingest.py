@@ -0,0 +1,36 @@
+"""batch_ingest: worker processes and their environment."""
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+import batch_ingest
+
+def receipts(count):
+    for i in range(count):
+        buffer = io.BytesIO()
+        Image.new("L", (40, 20), color=255 - i).save(buffer, format="PNG")
+        yield f"r{i}.png", buffer.getvalue()
+
+def test_workers_start_with_the_worker_settings():
+    with ProcessPoolExecutor(1, mp_context=batch_ingest._mp_context,
+                             initializer=batch_ingest._init_worker, initargs=(batch_ingest.WORKER_ENV,)) as pool:
+        found = {name: pool.submit(os.getenv, name).result() for name in batch_ingest.WORKER_ENV}
+    assert found == batch_ingest.WORKER_ENV
+
+def test_the_app_environment_is_left_alone(monkeypatch):
+    for name in batch_ingest.WORKER_ENV:
+        monkeypatch.delenv(name, raising=False)
+    seen = []
+
+    def watched():
+        # Read while the workers start: another session importing the OCR modules now
+        # would keep whatever it finds for the life of the server
+        for receipt in receipts(3):
+            seen.append({name: os.environ.get(name) for name in batch_ingest.WORKER_ENV})
+            yield receipt
+
+    names = sorted(result["name"] for result in batch_ingest.ocr_receipts(watched(), max_workers=2))
+    assert names == ["r0.png", "r1.png", "r2.png"]
+    assert all(value is None for environ in seen for value in environ.values())
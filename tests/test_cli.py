@@ -0,0 +1,38 @@
+"""cli: import and stats on amounts written the way people and spreadsheets write them."""
+import pandas as pd
+
+import cli
+from storage.sqlite import SQLiteStore
+
+CSV = """\
+Date,Amount,Category
+2026-01-05,"1,234.00",Rent
+2026-01-09,$12.50,Food
+2026-01-10,(3.00),Food
+2026-01-11,12,Food
+2026-01-12,n/a,Food
+not a date,5.00,Food
+"""
+
+def test_import_reads_formatted_amounts(tmp_path, capsys):
+    path = tmp_path / "history.csv"
+    path.write_text(CSV)
+    db = str(tmp_path / "expenses.db")
+    assert cli.main(["import", str(path), "--storage", "sqlite", "--sqlite-path", db]) == 0
+    assert "Imported 4 expenses (2 invalid rows skipped)" in capsys.readouterr().err
+
+    store = SQLiteStore(db)
+    assert sorted(store.get_all()["Amount"]) == [-3.0, 12.0, 12.5, 1234.0]
+    store.close()
+
+class TextLedgerStore:
+    """A store without rollups whose ledger holds the amounts as the sheet shows them."""
+
+    def iter_ledger(self, chunk_size):
+        rows = [["2026-01-05", "1,234.00", "Rent"], ["2026-01-09", "$12.50", "Food"], ["2026-01-10", "7", "Food"]]
+        for start in range(0, len(rows), chunk_size):
+            yield pd.DataFrame(rows[start:start + chunk_size], columns=["Date", "Amount", "Category"])
+
+def test_stats_without_rollups_reads_formatted_amounts():
+    totals = cli._month_category_totals(TextLedgerStore(), chunk_size=2)
+    assert dict(zip(totals["category"], totals["total"])) == {"Food": 19.5, "Rent": 1234.0}
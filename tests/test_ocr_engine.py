@@ -0,0 +1,28 @@
+"""ocr_engine: what the OCR cache key depends on."""
+from PIL import Image
+
+import ocr_engine
+
+class NamedBackend(ocr_engine.OCRBackend):
+    def __init__(self, name, version):
+        self.name, self._version = name, version
+
+    def version(self):
+        return self._version
+
+def key_with(backend, image):
+    previous = ocr_engine.set_backend(backend)
+    try:
+        return ocr_engine.ocr_cache_key(image, b"receipt bytes")
+    finally:
+        ocr_engine.set_backend(previous)
+
+def test_cache_key_depends_on_the_backend():
+    image = Image.new("L", (10, 10))
+    keys = {
+        key_with(NamedBackend("tesserocr", "2.7.1/5.3.4"), image),
+        key_with(NamedBackend("pytesseract", "0.3.13/5.3.4"), image),
+        key_with(NamedBackend("pytesseract", "0.3.13/5.4.1"), image),
+    }
+    assert len(keys) == 3
+    assert key_with(NamedBackend("tesserocr", "2.7.1/5.3.4"), image) in keys
@@ -0,0 +1,38 @@
+"""receipt_parser against the hand-written receipts in tests/receipt_corpus.py."""
+import datetime
+
+import pytest
+
+import receipt_parser
+from tests.receipt_corpus import CORPUS
+
+FIELDS = ("total", "subtotal", "tax", "date", "merchant", "currency")
+
+@pytest.mark.parametrize("text, expected", [(text, expected) for _, text, expected in CORPUS],
+                         ids=[name for name, _, _ in CORPUS])
+def test_corpus(text, expected):
+    parsed = receipt_parser.parse(text)
+    found = {name: getattr(parsed, name) for name in FIELDS}
+    if found["date"] is not None:
+        found["date"] = found["date"].isoformat()
+    assert found == pytest.approx(expected)
+    # Anything found has a confidence, anything missing has none
+    assert {name for name in FIELDS if parsed.confidence[name]} == {name for name in FIELDS if found[name] is not None}
+
+def test_amount_below_its_label_is_trusted_less():
+    inline = receipt_parser.parse("CAFE\nTOTAL 8.91")
+    below = receipt_parser.parse("CAFE\nTOTAL\n8.91")
+    assert below.total == inline.total
+    assert below.confidence["total"] < inline.confidence["total"]
+
+@pytest.mark.parametrize("text, amount", [
+    ("1,234.00", 1234.0), ("$1,234.00", 1234.0), ("1.234,50", 1234.5), ("12", 12.0),
+    ("-4.50", -4.5), ("(4.50)", -4.5), ("1,234", 1234.0), ("abc", None), ("", None),
+])
+def test_parse_amount_text(text, amount):
+    assert receipt_parser.parse_amount_text(text) == amount
+
+def test_dates():
+    for text, date in [("03/14/2026", "2026-03-14"), ("14.03.2026", "2026-03-14"),
+                       ("12 Mar 2026", "2026-03-12"), ("2026-02-01", "2026-02-01")]:
+        assert receipt_parser.parse(f"SHOP\n{text}\nTOTAL 1.00").date == datetime.date.fromisoformat(date)
@@ -0,0 +1,249 @@
+"""SheetsStore against the in-memory fake worksheet (tests/fake_sheets.py)."""
+import threading
+import time
+
+import gspread
+import pytest
+
+from storage import WritesPending, sheets
+from tests import fake_sheets
+
+ROWS = [
+    ["2026-01-05", 12.5, "COSTCO\nmilk", "Food"],
+    ["2026-01-09", 40.0, "SHELL\nfuel", "Transport"],
+    ["2026-02-02", 8.25, "CAFE\nlatte", "Food"],
+]
+
+class Response:
+    """Enough of a requests.Response for gspread's APIError."""
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = ""
+
+    def json(self):
+        return {"error": {"code": self.status_code, "message": "refused", "status": "ERROR"}}
+
+class RefusingWorksheet(fake_sheets.FakeWorksheet):
+    """Fails the next `refusals` append_rows calls with an APIError of `status`."""
+
+    refusals = 0
+    status = 429
+
+    def append_rows(self, values, **kwargs):
+        if self.refusals:
+            self.refusals -= 1
+            self.calls["append_rows"] += 1
+            raise gspread.exceptions.APIError(Response(self.status))
+        return super().append_rows(values, **kwargs)
+
+class DeleteDuringAppendWorksheet(RefusingWorksheet):
+    """Starts deleting `expense_id` from another thread while a refused append is in flight."""
+
+    store = None
+    expense_id = None
+    deleter = None
+    errors = []
+
+    def append_rows(self, values, **kwargs):
+        if self.deleter is None and self.refusals:
+            def delete():
+                try:
+                    self.store.delete(self.expense_id)
+                except Exception as e:
+                    self.errors.append(e)
+            self.deleter = threading.Thread(target=delete)
+            self.deleter.start()
+            # Long enough for the delete to be waiting on the connection lock
+            time.sleep(0.1)
+        return super().append_rows(values, **kwargs)
+
+@pytest.fixture
+def store():
+    worksheet, store = fake_sheets.fake_store(ROWS)
+    yield worksheet, store
+    store.close()
+
+@pytest.fixture
+def refusing_store():
+    worksheet = RefusingWorksheet([sheets.HEADERS] + [row + [f"id{i}"] for i, row in enumerate(ROWS)])
+    fake_sheets.install(worksheet)
+    store = sheets.SheetsStore({"type": "test"})
+    store.connect()
+    yield worksheet, store
+    store.close()
+
+def sheet_ids(worksheet):
+    return [row[4] for row in worksheet.rows[1:]]
+
+def test_add_update_delete(store):
+    worksheet, store = store
+    store.add([["2026-02-10", 3.0, "BAKERY\nbread", "Food", "new1"]])
+    store.flush()
+    assert worksheet.rows[-1] == ["2026-02-10", 3.0, "BAKERY\nbread", "Food", "new1"]
+
+    store.update([("bench0000001", ["2026-01-09", 45.0, "SHELL\nfuel", "Transport"])])
+    store.flush()
+    assert worksheet.rows[2][:4] == ["2026-01-09", 45.0, "SHELL\nfuel", "Transport"]
+
+    store.delete("bench0000000")
+    assert sheet_ids(worksheet) == ["bench0000001", "bench0000002", "new1"]
+    df = store.get_all()
+    assert list(df["id"]) == ["bench0000001", "bench0000002", "new1"]
+    assert df.loc[df["id"] == "bench0000001", "Amount"].item() == 45.0
+
+def test_delete_unknown_id(store):
+    _, store = store
+    with pytest.raises(ValueError):
+        store.delete("nope")
+
+def test_search_follows_writes(store):
+    _, store = store
+    df, total = store.search("milk")
+    assert (list(df["id"]), total) == (["bench0000000"], 1)
+
+    store.add([["2026-02-11", 6.0, "MARKET\nmilk", "Food", "new1"]])
+    df, total = store.search("milk")
+    assert sorted(df["id"]) == ["bench0000000", "new1"]
+
+    store.update([("bench0000000", ["2026-01-05", 12.5, "COSTCO\neggs", "Food"])])
+    store.delete("new1")
+    df, total = store.search("milk")
+    assert total == 0
+    df, total = store.search("eggs", category="Food")
+    assert list(df["id"]) == ["bench0000000"]
+
+def test_queued_writes_go_out_in_one_call_each(store):
+    worksheet, store = store
+    store.get_all()
+    worksheet.reset_calls()
+    for i in range(3):
+        store.add([[f"2026-02-1{i}", 1.0 + i, "x", "Food", f"new{i}"]])
+    store.update([("bench0000000", ["2026-01-05", 13.0, None, "Food"])])
+    store.update([("bench0000001", ["2026-01-09", 41.0, "SHELL", "Transport"])])
+    assert worksheet.api_calls == 0
+
+    store.flush()
+    # One append_rows, one batch_update, and one read checking the edited rows' ids
+    assert worksheet.calls == {"append_rows": 1, "batch_update": 1, "batch_get": 1}
+    assert sheet_ids(worksheet)[-3:] == ["new0", "new1", "new2"]
+    # An edit without raw text leaves column C alone
+    assert worksheet.rows[1][:4] == ["2026-01-05", 13.0, "COSTCO\nmilk", "Food"]
+
+def test_same_expense_edited_twice_is_sent_once(store):
+    worksheet, store = store
+    store.update([("bench0000002", ["2026-02-02", 9.0, "CAFE\nmocha", "Food"])])
+    store.update([("bench0000002", ["2026-02-02", 10.0, None, "Food"])])
+    store.flush()
+    assert worksheet.rows[3][:4] == ["2026-02-02", 10.0, "CAFE\nmocha", "Food"]
+
+def test_deleting_a_queued_expense_never_reaches_the_sheet(store):
+    worksheet, store = store
+    store.add([["2026-02-10", 3.0, "BAKERY", "Food", "new1"]])
+    worksheet.reset_calls()
+    store.delete("new1")
+    store.flush()
+    assert worksheet.api_calls == 0
+    assert "new1" not in set(store.get_all()["id"])
+
+def test_id_index_addresses_rows_without_reading_the_id_column(store):
+    worksheet, store = store
+    # Built on first use: the ID column, then the cell being deleted
+    store.delete("bench0000000")
+    assert worksheet.calls == {"batch_get": 2, "delete_rows": 1}
+
+    store.add([["2026-02-10", 3.0, "BAKERY", "Food", "new1"]])
+    store.flush()
+    worksheet.reset_calls()
+    # Our own appends and deletes keep it current: each delete reads back one ID cell
+    store.delete("new1")
+    store.delete("bench0000001")
+    assert worksheet.calls == {"batch_get": 2, "delete_rows": 2}
+    assert sheet_ids(worksheet) == ["bench0000002"]
+
+def test_delete_after_rows_removed_outside_the_app(store):
+    worksheet, store = store
+    store.get_all()
+    # Someone deletes the first expense straight in the sheet: every row below moves up
+    del worksheet.rows[1]
+    store.delete("bench0000002")
+    assert sheet_ids(worksheet) == ["bench0000001"]
+
+def test_delete_after_rows_appended_outside_the_app(store):
+    worksheet, store = store
+    worksheet.rows.append(["2026-03-01", 2, "ext", "Food", "ext1"])
+    store.add([["2026-03-02", 3.0, "y", "Food", "new1"]])
+    store.flush()
+    worksheet.reset_calls()
+    # The append landed below a row we did not know about: the index is read again
+    store.delete("new1")
+    assert worksheet.calls == {"batch_get": 2, "delete_rows": 1}
+    assert sheet_ids(worksheet) == ["bench0000000", "bench0000001", "bench0000002", "ext1"]
+
+def test_write_refused_stays_queued(refusing_store):
+    worksheet, store = refusing_store
+    worksheet.refusals = 100
+    future = store.add([["2026-02-10", 3.0, "BAKERY", "Food", "new1"]])
+    with pytest.raises(WritesPending):
+        store.flush()
+    assert store.conn.write_queue.pending() == 1
+    assert not future.done()
+    assert worksheet.calls["append_rows"] == sheets.WRITE_MAX_RETRIES + 1
+    # Already shown while it waits
+    assert "new1" in set(store.get_all()["id"])
+
+    worksheet.refusals = 0
+    worksheet.reset_calls()
+    store.flush()
+    assert future.done() and store.conn.write_queue.pending() == 0
+    assert sheet_ids(worksheet)[-1] == "new1"
+    # A refused append may have landed: the id column is checked once before sending it again
+    assert worksheet.calls == {"batch_get": 1, "append_rows": 1}
+
+def test_write_rejected_is_dropped(refusing_store):
+    worksheet, store = refusing_store
+    worksheet.refusals, worksheet.status = 1, 400
+    future = store.add([["2026-02-10", 3.0, "BAKERY", "Food", "new1"]])
+    with pytest.raises(gspread.exceptions.APIError):
+        store.flush()
+    assert worksheet.calls["append_rows"] == 1
+    assert store.conn.write_queue.pending() == 0
+    assert isinstance(future.exception(), gspread.exceptions.APIError)
+    assert "new1" not in sheet_ids(worksheet)
+    assert "new1" not in set(store.get_all()["id"])
+
+def test_delete_while_its_append_is_refused():
+    worksheet = DeleteDuringAppendWorksheet([sheets.HEADERS] + [row + [f"id{i}"] for i, row in enumerate(ROWS)])
+    fake_sheets.install(worksheet)
+    store = sheets.SheetsStore({"type": "test"})
+    store.connect()
+    worksheet.store, worksheet.expense_id, worksheet.errors = store, "new1", []
+    # As if the delete had looked up the worksheet just before the flush took the lock
+    sheet = store.worksheet()
+    store.worksheet = lambda: sheet
+    # A timeout is requeued for the retry timer rather than retried right away
+    worksheet.refusals, worksheet.status = 1, 408
+    store.add([["2026-02-10", 3.0, "BAKERY", "Food", "new1"]])
+    with pytest.raises(WritesPending):
+        store.flush()
+    worksheet.deleter.join()
+
+    # The delete waited for the refused append to be put back, then took it out of the queue
+    assert worksheet.errors == []
+    store.flush()
+    assert "new1" not in sheet_ids(worksheet)
+    assert "new1" not in set(store.get_all()["id"])
+    store.close()
+
+def test_amounts_formatted_in_the_sheet():
+    _, store = fake_sheets.fake_store([
+        ["2026-01-05", "$1,234.00", "RENT", "Home"],
+        ["2026-01-09", "(3.00)", "REFUND", "Food"],
+        ["2026-01-10", "€7,50", "CAFE", "Food"],
+    ])
+    # The first page is read straight from the sheet, before the ledger is downloaded
+    page, _ = store.get_page(limit=3)
+    assert sorted(page["Amount"]) == [-3.0, 7.5, 1234.0]
+    assert store.monthly_total(2026, 1) == 1238.5
+    assert sorted(store.get_all()["Amount"]) == [-3.0, 7.5, 1234.0]
+    store.close()
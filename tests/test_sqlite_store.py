@@ -0,0 +1,104 @@
+"""SQLiteStore: schema migration, rollups and full-text search."""
+import sqlite3
+
+import pytest
+
+from storage.sqlite import SQLiteStore
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteStore(str(tmp_path / "expenses.db"))
+    yield store
+    store.close()
+
+def add(store, *rows):
+    store.add([list(row) for row in rows])
+
+def test_database_from_before_ids_rollups_and_search(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE expenses (id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT NOT NULL, "
+        "amount REAL NOT NULL, raw_text TEXT, category TEXT DEFAULT 'Uncategorized')"
+    )
+    conn.executemany(
+        "INSERT INTO expenses (date, amount, raw_text, category) VALUES (?, ?, ?, ?)",
+        [("2026-01-05", 12.5, "COSTCO\nmilk", "Food"), ("2026-01-09", 40.0, "SHELL\nfuel", "Transport")],
+    )
+    conn.commit()
+    conn.close()
+
+    store = SQLiteStore(path)
+    df = store.get_all()
+    assert df["id"].notna().all() and df["id"].is_unique
+    assert store.monthly_total(2026, 1) == 52.5
+    assert store.verify_rollups().empty
+    found, total = store.search("costco")
+    assert total == 1 and found["id"].item() == df["id"].iloc[0]
+    store.close()
+
+    # Opening it again changes nothing
+    store = SQLiteStore(path)
+    assert list(store.get_all()["id"]) == list(df["id"])
+    store.close()
+
+def test_rollups_follow_every_write(store):
+    add(store, ["2026-01-05", 10.0, "a", "Food", "e1"], ["2026-01-20", 5.0, "b", "Food", "e2"],
+        ["2026-02-01", 7.0, "c", "", "e3"])
+    assert store.monthly_total(2026, 1) == 15.0
+
+    # Moved to another month and category
+    store.update([("e2", ["2026-02-03", 6.0, None, "Transport"])])
+    store.delete("e1")
+    assert store.monthly_total(2026, 1) == 0.0
+    assert store.monthly_total(2026, 2) == 13.0
+    rollups = store.rollups()
+    assert list(zip(rollups["month"], rollups["category"], rollups["count"])) == [
+        ("2026-02", "Transport", 1), ("2026-02", "Uncategorized", 1)]
+    assert store.verify_rollups().empty
+
+def test_rollup_drift_is_reported_and_repaired(store):
+    add(store, ["2026-01-05", 10.0, "a", "Food", "e1"])
+    with store._transaction() as conn:
+        conn.execute("UPDATE rollups SET total = 99")
+    drift = store.verify_rollups()
+    assert list(drift["total_stored"]) == [99.0] and list(drift["total_actual"]) == [10.0]
+    assert store.rebuild_rollups() == 1
+    assert store.verify_rollups().empty
+
+def test_search_ranks_and_filters(store):
+    add(store,
+        ["2026-01-05", 30.0, "COSTCO WHOLESALE\nmilk 4.99\neggs 3.49", "Food", "e1"],
+        ["2026-01-09", 12.0, "SAFEWAY\nmilk 4.49 [NOTES: costco was closed]", "Food", "e2"],
+        ["2026-02-02", 80.0, "SHELL\nfuel", "Transport", "e3"])
+    found, total = store.search("costco")
+    # The merchant line outweighs a mention in the notes
+    assert total == 2 and list(found["id"]) == ["e1", "e2"]
+    found, total = store.search("milk", min_amount=20)
+    assert list(found["id"]) == ["e1"]
+    found, total = store.search("mil", start_date="2026-01-06", end_date="2026-01-31")
+    assert list(found["id"]) == ["e2"]
+    found, total = store.search("", category="Transport")
+    assert (list(found["id"]), total) == (["e3"], 1)
+
+def test_search_index_follows_writes(store):
+    add(store, ["2026-01-05", 30.0, "COSTCO\nmilk", "Food", "e1"], ["2026-01-09", 12.0, "CAFE\nlatte", "Food", "e2"])
+    store.update([("e1", ["2026-01-05", 30.0, "COSTCO\nbread", "Food"])])
+    # No raw text in the change: the indexed text stays
+    store.update([("e2", ["2026-01-09", 13.0, None, "Food"])])
+    assert store.search("milk")[1] == 0
+    assert list(store.search("bread")[0]["id"]) == ["e1"]
+    assert list(store.search("latte")[0]["id"]) == ["e2"]
+    store.delete("e1")
+    assert store.search("bread")[1] == 0
+    assert store.rebuild_search_index() == 1
+    assert list(store.search("latte")[0]["id"]) == ["e2"]
+
+def test_version_sees_writes_from_other_connections(store):
+    before = store.version()
+    assert store.version() == before
+    other = sqlite3.connect(store.path)
+    with other:
+        other.execute("INSERT INTO expenses (date, amount, raw_text, category, uid) VALUES ('2026-01-01', 1, 'x', 'Food', 'e9')")
+    other.close()
+    assert store.version() != before
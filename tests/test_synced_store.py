@@ -0,0 +1,113 @@
+"""SyncedStore: the local mirror against the fake worksheet."""
+import pytest
+
+from storage import sheets
+from storage.sync import SyncedStore
+from tests import fake_sheets
+
+def synced_store(tmp_path, rows, policy="local"):
+    worksheet = fake_sheets.FakeWorksheet([sheets.HEADERS] + [list(row) for row in rows])
+    fake_sheets.install(worksheet)
+    store = SyncedStore({"type": "test"}, path=str(tmp_path / "mirror.db"), conflict_policy=policy, start=False)
+    store.sync_now()
+    return worksheet, store
+
+def amounts(store):
+    df = store.get_all()
+    return dict(zip(df["id"], df["Amount"]))
+
+def sheet_amounts(worksheet):
+    return {row[4]: float(row[1]) for row in worksheet.rows[1:]}
+
+ROWS = [
+    ["2026-01-01", 5, "a", "Food", "r1"],
+    ["2026-01-02", 7, "b", "Food", "r2"],
+    ["2026-01-03", 9, "c", "Food", "r3"],
+]
+
+@pytest.mark.parametrize("policy", ["local", "remote"])
+def test_local_edit_survives_remote_inserts_and_deletes(tmp_path, policy):
+    worksheet, store = synced_store(tmp_path, ROWS, policy)
+    store.update([("r2", ["2026-01-02", 70.0, "b", "Food"])])
+    # Meanwhile the sheet gains a row and loses another one, so the next cycle compares everything
+    worksheet.rows.append(["2026-01-04", 11, "d", "Food", "r4"])
+    del worksheet.rows[1]
+    store.sync_now()
+
+    assert amounts(store) == {"r2": 70.0, "r3": 9.0, "r4": 11.0}
+    assert sheet_amounts(worksheet) == {"r2": 70.0, "r3": 9.0, "r4": 11.0}
+    assert store.sync_status()["conflicts"] == 0
+    store.close()
+
+@pytest.mark.parametrize("policy, winner", [("local", 70.0), ("remote", 8.0)])
+def test_edited_on_both_sides_is_a_conflict(tmp_path, policy, winner):
+    worksheet, store = synced_store(tmp_path, ROWS, policy)
+    store.update([("r2", ["2026-01-02", 70.0, "b", "Food"])])
+    worksheet.rows[2][1] = 8
+    # Force the full compare that picks up edits made in the sheet
+    with store._transaction() as conn:
+        store._set_state(conn, "last_full_sync", 0)
+    store.sync_now()
+
+    assert amounts(store)["r2"] == winner
+    assert sheet_amounts(worksheet)["r2"] == winner
+    assert store.sync_status()["conflicts"] == 1
+    # Resolved: the next full compare does not log it again
+    with store._transaction() as conn:
+        store._set_state(conn, "last_full_sync", 0)
+    store.sync_now()
+    assert store.sync_status()["conflicts"] == 1
+    store.close()
+
+def test_remote_edit_is_pulled_without_conflict(tmp_path):
+    worksheet, store = synced_store(tmp_path, ROWS)
+    worksheet.rows[1][1] = 6
+    with store._transaction() as conn:
+        store._set_state(conn, "last_full_sync", 0)
+    store.sync_now()
+    assert amounts(store)["r1"] == 6.0
+    assert store.sync_status()["conflicts"] == 0
+    store.close()
+
+def test_formatted_amounts(tmp_path):
+    rows = ROWS + [["2026-01-04", "$1,234.50", "d", "Food", "r4"], ["2026-01-05", "n/a", "e", "Food", "r5"]]
+    worksheet, store = synced_store(tmp_path, rows)
+    assert amounts(store) == {"r1": 5.0, "r2": 7.0, "r3": 9.0, "r4": 1234.5}
+    assert store.sync_status()["rejected"] == 1
+
+    # Edits elsewhere go out without touching the rejected row, and it does not force a full compare
+    store.update([("r1", ["2026-01-01", 6.0, "a", "Food"])])
+    worksheet.reset_calls()
+    store.sync_now()
+    assert worksheet.rows[5][1] == "n/a"
+    assert worksheet.rows[4][1] == "$1,234.50"
+    assert worksheet.calls["get_values"] == 0
+    store.close()
+
+def test_local_writes_are_pushed_in_batches(tmp_path):
+    worksheet, store = synced_store(tmp_path, ROWS)
+    store.add([["2026-01-04", 11.0, "d", "Food", "r4"], ["2026-01-05", 13.0, "e", "Food", "r5"]])
+    store.update([("r1", ["2026-01-01", 6.0, "a", "Food"]), ("r3", ["2026-01-03", 10.0, "c", "Food"])])
+    store.delete("r2")
+    worksheet.reset_calls()
+    store.sync_now()
+
+    assert worksheet.calls["append_rows"] == 1
+    assert worksheet.calls["batch_update"] == 1
+    assert worksheet.calls["delete_rows"] == 1
+    assert sheet_amounts(worksheet) == {"r1": 6.0, "r3": 10.0, "r4": 11.0, "r5": 13.0}
+    assert store.sync_status()["pending"] == 0
+
+def test_rows_appended_in_the_sheet_are_fetched_alone(tmp_path):
+    worksheet, store = synced_store(tmp_path, ROWS)
+    worksheet.rows.append(["2026-01-04", "11.00", "d", "Food", "r4"])
+    worksheet.rows.append(["2026-01-05", 13, "e", "", ""])
+    worksheet.reset_calls()
+    store.sync_now()
+
+    # The ID column, then just the new rows; the row without an id gets one written back
+    assert worksheet.calls["get_values"] == 1
+    assert worksheet.calls["batch_update"] == 1
+    assert amounts(store)["r4"] == 11.0
+    assert worksheet.rows[5][4] and worksheet.rows[5][4] in amounts(store)
+    assert store.get_all().set_index("id").loc[worksheet.rows[5][4], "Category"] == "Uncategorized"